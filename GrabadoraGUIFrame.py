@@ -67,7 +67,7 @@ class GrabadoraGUIFrame(wx.Frame):
 
     def __init__(self, parent):
         wx.Frame.__init__(self, parent, id=wx.ID_ANY, title=u"Grabadora", pos=wx.DefaultPosition,
-                          size=wx.Size(500, 400), style=wx.DEFAULT_FRAME_STYLE | wx.TAB_TRAVERSAL)
+                          size=wx.Size(500, 660), style=wx.DEFAULT_FRAME_STYLE | wx.TAB_TRAVERSAL)
 
         self.SetSizeHints(wx.DefaultSize, wx.DefaultSize)
 
@@ -92,6 +92,22 @@ class GrabadoraGUIFrame(wx.Frame):
         # Add the horizontal sizer to the vertical sizer
         bSizerVertical.Add(bSizerHorizontal_0, 0, wx.EXPAND, 5)
 
+        # Input / output device selection
+        fgSizerDevices = wx.FlexGridSizer(2, 2, 0, 0)
+        fgSizerDevices.AddGrowableCol(1)
+
+        self.m_staticTextInput = wx.StaticText(self, wx.ID_ANY, u"      Entrada", wx.DefaultPosition, wx.DefaultSize, 0)
+        fgSizerDevices.Add(self.m_staticTextInput, 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 5)
+        self.m_choiceInput = wx.Choice(self, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize, [])
+        fgSizerDevices.Add(self.m_choiceInput, 1, wx.ALL | wx.EXPAND, 5)
+
+        self.m_staticTextOutput = wx.StaticText(self, wx.ID_ANY, u"      Salida", wx.DefaultPosition, wx.DefaultSize, 0)
+        fgSizerDevices.Add(self.m_staticTextOutput, 0, wx.ALL | wx.ALIGN_CENTER_VERTICAL, 5)
+        self.m_choiceOutput = wx.Choice(self, wx.ID_ANY, wx.DefaultPosition, wx.DefaultSize, [])
+        fgSizerDevices.Add(self.m_choiceOutput, 1, wx.ALL | wx.EXPAND, 5)
+
+        bSizerVertical.Add(fgSizerDevices, 0, wx.EXPAND, 5)
+
         bSizerHorizontal_2 = wx.BoxSizer(wx.HORIZONTAL)
 
         self.m_buttonMonitor = wx.Button(self, wx.ID_ANY, u"Iniciar monitor", wx.Point(-1, -1), wx.Size(150,30), 0)
@@ -101,6 +117,14 @@ class GrabadoraGUIFrame(wx.Frame):
         self.m_buttonMonitor.SetForegroundColour(wx.Colour(255, 255, 255))  # White text
         bSizerHorizontal_2.Add(self.m_buttonMonitor, 0, 0, 5)
 
+        self.m_checkBoxAutoPause = wx.CheckBox(self, wx.ID_ANY, u"Pausa automática en silencio", wx.DefaultPosition,
+                                               wx.DefaultSize, 0)
+        bSizerHorizontal_2.Add(self.m_checkBoxAutoPause, 0, wx.LEFT | wx.ALIGN_CENTER_VERTICAL, 15)
+
+        self.m_checkBoxNormalize = wx.CheckBox(self, wx.ID_ANY, u"Normalizar volumen", wx.DefaultPosition,
+                                               wx.DefaultSize, 0)
+        bSizerHorizontal_2.Add(self.m_checkBoxNormalize, 0, wx.LEFT | wx.ALIGN_CENTER_VERTICAL, 10)
+
         bSizerVertical.Add(bSizerHorizontal_2, 0, wx.ALIGN_CENTER_HORIZONTAL, 5)
 
         # Add space between the two horizontal sizers (20px spacer)
@@ -145,6 +169,11 @@ class GrabadoraGUIFrame(wx.Frame):
         self.m_gaugeMicLevel.SetValue(0)
         bSizerVertical.Add(self.m_gaugeMicLevel, 0, wx.ALL | wx.EXPAND, 5)
 
+        # Live waveform and spectrum (a LiveScopePanel is placed here once the engine is loaded)
+        self.m_panelScope = wx.Panel(self, wx.ID_ANY, wx.DefaultPosition, wx.Size(-1, 150), wx.TAB_TRAVERSAL)
+        self.m_panelScope.SetBackgroundColour(wx.Colour(20, 20, 20))
+        bSizerVertical.Add(self.m_panelScope, 0, wx.ALL | wx.EXPAND, 5)
+
         self.m_staticText12 = wx.StaticText(self, wx.ID_ANY, u"      Amplificacion del microfono", wx.DefaultPosition,
                                             wx.DefaultSize, 0)
         self.m_staticText12.Wrap(-1)
@@ -160,6 +189,17 @@ class GrabadoraGUIFrame(wx.Frame):
         bSizerVertical.Add(self.m_gain_slider, 0, wx.ALL | wx.EXPAND, 5)
         bSizerVertical.Add(self.m_slider_label, flag=wx.CENTER | wx.ALL, border=10)
 
+        # Status of the background conversions (WAV -> MP3)
+        self.m_staticTextExport = wx.StaticText(self, wx.ID_ANY, u"", wx.DefaultPosition, wx.DefaultSize, 0)
+        self.m_staticTextExport.Wrap(-1)
+        bSizerVertical.Add(self.m_staticTextExport, 0, wx.LEFT | wx.RIGHT | wx.EXPAND, 10)
+
+        # Live audio callback statistics (duration, latency, overflows)
+        self.m_staticTextStats = wx.StaticText(self, wx.ID_ANY, u"", wx.DefaultPosition, wx.DefaultSize, 0)
+        self.m_staticTextStats.Wrap(-1)
+        self.m_staticTextStats.SetForegroundColour(wx.Colour(96, 96, 96))  # Grey text
+        bSizerVertical.Add(self.m_staticTextStats, 0, wx.LEFT | wx.RIGHT | wx.EXPAND, 10)
+
         # Create a horizontal sizer
         bSizerHorizontal_3 = wx.BoxSizer(wx.HORIZONTAL)
         self.m_buttonExit = wx.Button(self, wx.ID_ANY, u"Salir!", wx.DefaultPosition, wx.DefaultSize, 0)
@@ -167,6 +207,9 @@ class GrabadoraGUIFrame(wx.Frame):
         # Add the button to the horizontal sizer
         bSizerHorizontal_3.Add(self.m_buttonExit, 0, wx.ALL, 5)
 
+        self.m_buttonWaveform = wx.Button(self, wx.ID_ANY, u"Forma de onda", wx.DefaultPosition, wx.DefaultSize, 0)
+        bSizerHorizontal_3.Add(self.m_buttonWaveform, 0, wx.ALL, 5)
+
         # Add a stretchable space to push the text to the right
         bSizerHorizontal_3.AddStretchSpacer(1)
 
@@ -190,9 +233,14 @@ class GrabadoraGUIFrame(wx.Frame):
         self.m_buttonStartRec.Bind(wx.EVT_BUTTON, self.onStartRec)
         self.m_buttonStopRec.Bind(wx.EVT_BUTTON, self.onStopRec)
         self.m_gain_slider.Bind(wx.EVT_SLIDER, self.onGainChange)
+        self.m_choiceInput.Bind(wx.EVT_CHOICE, self.onDeviceSelect)
+        self.m_choiceOutput.Bind(wx.EVT_CHOICE, self.onDeviceSelect)
+        self.m_checkBoxAutoPause.Bind(wx.EVT_CHECKBOX, self.onAutoPause)
+        self.m_checkBoxNormalize.Bind(wx.EVT_CHECKBOX, self.onNormalize)
 
         #self.m_sliderVolumeOutput.Bind(wx.EVT_SCROLL, self.onVolumeUpdate)
         self.m_buttonExit.Bind(wx.EVT_BUTTON, self.onFrameExit)
+        self.m_buttonWaveform.Bind(wx.EVT_BUTTON, self.onWaveform)
 
         # Determine the correct path to the icon file
         icon_path = self.get_icon_path("grabadora.ico")
@@ -257,5 +305,17 @@ class GrabadoraGUIFrame(wx.Frame):
     def onGainChange(self, event):
         event.Skip()
 
+    def onDeviceSelect(self, event):
+        event.Skip()
+
+    def onAutoPause(self, event):
+        event.Skip()
+
+    def onNormalize(self, event):
+        event.Skip()
+
+    def onWaveform(self, event):
+        event.Skip()
+
     def onFrameExit(self, event):
         event.Skip()
@@ -0,0 +1,191 @@
+"""
+Live Analyzer
+=============
+
+Description:
+    Background analysis for the live display: scrolling waveform envelope
+    and FFT spectrum of the monitored input.
+
+    The audio callback only copies the first channel of each processed
+    block into a lock-free ring buffer (see RecorderEngine.scope_tap). This
+    thread wakes up at the display rate, takes everything that arrived,
+    decimates it to one min/max pair per waveform column and computes the
+    spectrum of all the FFT frames of the batch in one numpy call. The
+    result is published as an immutable snapshot the GUI picks up from its
+    timer, so neither the callback nor the wx event loop does any analysis.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import time
+import logging
+import threading
+
+import numpy as np
+
+from ringbuffer import AudioRingBuffer
+
+FLOOR_DB = -100.0
+FULL_SCALE = 32768.0
+
+
+class LiveAnalyzer(threading.Thread):
+    """
+    Waveform envelope and spectrum of the last few seconds of input.
+
+    Attributes:
+        ring (AudioRingBuffer): Mono int16 samples written by the audio
+            callback.
+        snapshot (dict | None): Latest result, replaced (never modified)
+            after each batch: sequence, waveform_min, waveform_max (int16,
+            oldest column first), spectrum_db (float32), freqs, rate.
+    """
+    def __init__(self, rate, columns=600, history_seconds=5.0, fft_size=2048, fps=25.0,
+                 decay_db_per_s=30.0, ring_seconds=2):
+        """
+        Args:
+            rate (int): Sample rate of the capture stream.
+            columns (int): Waveform columns over `history_seconds`.
+            history_seconds (float): Span of the scrolling waveform.
+            fft_size (int): FFT length (frames overlap by half).
+            fps (float): Maximum analysis (and display) rate.
+            decay_db_per_s (float): Fall rate of the spectrum peaks.
+            ring_seconds (int): Audio the thread may fall behind; older
+                audio is dropped, never blocked on.
+        """
+        super().__init__(name="LiveAnalyzer", daemon=True)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.rate = rate
+        self.columns = columns
+        self.bucket = max(1, int(rate * history_seconds / columns))
+        self.fft_size = fft_size
+        self.hop = fft_size // 2
+        self.interval = 1.0 / fps
+        self.decay_db_per_s = decay_db_per_s
+        self.ring = AudioRingBuffer(int(rate * ring_seconds), 1)
+
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # dBFS of a full-scale sine in one bin with this window
+        self._db_offset = 20 * np.log10(FULL_SCALE * self.window.sum() / 2)
+        self.freqs = np.fft.rfftfreq(fft_size, 1.0 / rate).astype(np.float32)
+
+        self._env_min = np.zeros(columns, dtype=np.int16)
+        self._env_max = np.zeros(columns, dtype=np.int16)
+        self._env_pos = 0                                   # Next column to overwrite
+        self._bucket_rest = np.empty(0, dtype=np.int16)     # Samples of an unfinished column
+        self._fft_rest = np.empty(0, dtype=np.float32)      # Samples not yet in a full FFT frame
+        self._spectrum = np.full(self.freqs.size, FLOOR_DB, dtype=np.float32)
+        self._last_batch = None
+
+        self.snapshot = None
+        self.sequence = 0
+        self.batches = 0
+        self.fft_frames = 0
+        self.max_batch_ms = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        Thread body: one batch per display interval.
+        """
+        while not self._stop_event.wait(self.interval):
+            block = self.ring.read()
+            if not block.shape[0]:
+                continue
+            t0 = time.perf_counter()
+            try:
+                self.process(block[:, 0])
+            except Exception as e:
+                self.logger.error(f"Analysis failed: {e}", exc_info=True)
+                return
+            self.max_batch_ms = max(self.max_batch_ms, (time.perf_counter() - t0) * 1000)
+
+    def process(self, samples):
+        """
+        Fold a batch of samples into the waveform and the spectrum and
+        publish a new snapshot.
+
+        Args:
+            samples (np.ndarray): int16 mono samples.
+        """
+        now = time.monotonic()
+        self._add_envelope(samples)
+        self._add_spectrum(samples, now)
+        self.batches += 1
+        self.sequence += 1
+
+        pos = self._env_pos
+        self.snapshot = {
+            "sequence": self.sequence,
+            "waveform_min": np.concatenate((self._env_min[pos:], self._env_min[:pos])),
+            "waveform_max": np.concatenate((self._env_max[pos:], self._env_max[:pos])),
+            "spectrum_db": self._spectrum.copy(),
+            "freqs": self.freqs,
+            "rate": self.rate,
+        }
+
+    def _add_envelope(self, samples):
+        """
+        Decimate to one min/max pair per `bucket` samples into the circular
+        column arrays.
+        """
+        data = np.concatenate((self._bucket_rest, samples)) if self._bucket_rest.size else samples
+        count = data.size // self.bucket
+        self._bucket_rest = data[count * self.bucket:].copy()
+        if not count:
+            return
+        buckets = data[:count * self.bucket].reshape(count, self.bucket)
+        mins, maxs = buckets.min(axis=1), buckets.max(axis=1)
+        if count > self.columns:
+            mins, maxs, count = mins[-self.columns:], maxs[-self.columns:], self.columns
+
+        index = (self._env_pos + np.arange(count)) % self.columns
+        self._env_min[index] = mins
+        self._env_max[index] = maxs
+        self._env_pos = (self._env_pos + count) % self.columns
+
+    def _add_spectrum(self, samples, now):
+        """
+        Power spectrum of every complete FFT frame of the batch (one rfft
+        call), peak-held with a linear decay in dB.
+        """
+        data = np.concatenate((self._fft_rest, samples.astype(np.float32)))
+        if data.size < self.fft_size:
+            self._fft_rest = data
+            return
+        count = (data.size - self.fft_size) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(data, self.fft_size)[::self.hop][:count]
+        self._fft_rest = data[count * self.hop:].copy()
+        self.fft_frames += count
+
+        power = np.mean(np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2, axis=0)
+        spectrum = (10 * np.log10(np.maximum(power, 1e-12)) - self._db_offset).astype(np.float32)
+        np.maximum(spectrum, FLOOR_DB, out=spectrum)
+
+        elapsed = now - self._last_batch if self._last_batch is not None else 0.0
+        self._last_batch = now
+        decayed = self._spectrum - self.decay_db_per_s * elapsed
+        self._spectrum = np.maximum(spectrum, decayed)
+
+    def stop(self):
+        """
+        Stop the thread and wait for it.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Batches, FFT frames, slowest batch and ring counters.
+        """
+        stats = self.ring.stats()
+        stats.update({
+            "batches": self.batches,
+            "fft_frames": self.fft_frames,
+            "max_batch_ms": round(self.max_batch_ms, 3),
+        })
+        return stats
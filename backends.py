@@ -0,0 +1,573 @@
+"""
+Audio Backends
+==============
+
+Description:
+    Pluggable audio I/O for the RecorderEngine.
+
+    PyAudioBackend is the real sound card through PortAudio. SimulatedBackend
+    is a synthetic or WAV-file driven device that calls the stream callback
+    from its own thread on a real-time clock, like PortAudio does, so the
+    whole capture -> writer -> encoder chain can be exercised without audio
+    hardware. It can inject scheduling jitter to reproduce busy machines and
+    reports dropped frames and callback timing.
+
+    Both backends speak the PyAudio callback protocol:
+        callback(in_data, frame_count, time_info, status) -> (out_data, flag)
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import time
+import bisect
+import random
+import logging
+import threading
+
+import numpy as np
+
+from wavreader import WavReader
+
+# Callback return flags (same values as pyaudio.paContinue / paComplete / paAbort)
+CONTINUE = 0
+COMPLETE = 1
+ABORT = 2
+
+# Callback status flags (same values as pyaudio.paInputUnderflow ... paPrimingOutput)
+INPUT_UNDERFLOW = 0x1
+INPUT_OVERFLOW = 0x2
+OUTPUT_UNDERFLOW = 0x4
+OUTPUT_OVERFLOW = 0x8
+PRIMING_OUTPUT = 0x10
+
+# Timing histogram bin upper edges in ms: 10 per decade from 1 us to 10 s (last bin catches the rest)
+TIMING_EDGES_MS = [round(10 ** (k / 10.0), 6) for k in range(-30, 41)]
+
+
+class TimingStats:
+    """
+    Running statistics of a duration measured once per block: count, mean,
+    maximum and a fixed-bin histogram for the percentiles, in constant
+    memory however long the stream runs (like instrumentation.CallbackStats).
+    """
+    def __init__(self):
+        self._edges = [edge / 1000.0 for edge in TIMING_EDGES_MS]
+        self.hist = np.zeros(len(TIMING_EDGES_MS) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.hist[bisect.bisect_left(self._edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def mean_ms(self):
+        return round(self.total / self.count * 1000, 3) if self.count else 0.0
+
+    def max_ms(self):
+        return round(self.max * 1000, 3)
+
+    def percentile_ms(self, fraction):
+        """
+        Upper edge of the bin where the cumulative count reaches `fraction`,
+        capped by the exact maximum.
+
+        Returns:
+            float: Estimated percentile in ms (0.0 without data).
+        """
+        if not self.count:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.hist), fraction * self.count))
+        if index >= len(TIMING_EDGES_MS):
+            return self.max_ms()
+        return min(round(TIMING_EDGES_MS[index], 3), self.max_ms())
+
+
+class AudioBackend:
+    """
+    Interface of an audio backend. Samples are always interleaved signed
+    integers of `sample_width` bytes.
+    """
+    def open_stream(self, rate, channels, frames_per_buffer, input, output, callback, sample_width=2,
+                    input_device_index=None, output_device_index=None):
+        """
+        Open a callback stream. The stream is created stopped.
+
+        Args:
+            input_device_index, output_device_index (int, optional): Devices
+                to use; None selects the default device.
+
+        Returns:
+            An object with start_stream(), stop_stream(), close() and is_active().
+        """
+        raise NotImplementedError
+
+    def default_input_info(self):
+        """
+        Returns:
+            dict: PortAudio-style device info of the default input.
+        """
+        raise NotImplementedError
+
+    def default_output_info(self):
+        """
+        Returns:
+            dict: PortAudio-style device info of the default output.
+        """
+        raise NotImplementedError
+
+    def device_count(self):
+        raise NotImplementedError
+
+    def device_info(self, index):
+        raise NotImplementedError
+
+    def host_api_name(self, index):
+        """
+        Returns:
+            str: Name of the host API (MME, WASAPI, ALSA...) with this index.
+        """
+        return ""
+
+    def is_format_supported(self, rate, device, channels, input, sample_width=2):
+        """
+        Whether `device` can open a stream with this format.
+
+        Returns:
+            bool: True if supported.
+        """
+        return True
+
+    def refresh(self):
+        """
+        Re-enumerate the devices, to notice hot-plugged ones. Only allowed
+        while no stream is open.
+        """
+        pass
+
+    def terminate(self):
+        """
+        Release the backend.
+        """
+        pass
+
+
+class PyAudioBackend(AudioBackend):
+    """
+    Real audio devices through PyAudio / PortAudio.
+    """
+    def __init__(self):
+        import pyaudio  # Only needed when real hardware is used
+
+        self.pyaudio = pyaudio
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info("Start pyaudio.PyAudio()")
+        self.pya = pyaudio.PyAudio()
+
+    def open_stream(self, rate, channels, frames_per_buffer, input, output, callback, sample_width=2,
+                    input_device_index=None, output_device_index=None):
+        return self.pya.open(
+            format=self.pya.get_format_from_width(sample_width),
+            channels=channels,
+            rate=rate,
+            input=input,
+            output=output,
+            input_device_index=input_device_index,
+            output_device_index=output_device_index,
+            frames_per_buffer=frames_per_buffer,
+            stream_callback=callback,
+            start=False
+        )
+
+    def default_input_info(self):
+        return self.pya.get_default_input_device_info()
+
+    def default_output_info(self):
+        return self.pya.get_default_output_device_info()
+
+    def device_count(self):
+        return self.pya.get_device_count()
+
+    def device_info(self, index):
+        return self.pya.get_device_info_by_index(index)
+
+    def host_api_name(self, index):
+        return self.pya.get_host_api_info_by_index(index)['name']
+
+    def is_format_supported(self, rate, device, channels, input, sample_width=2):
+        sample_format = self.pya.get_format_from_width(sample_width)
+        try:
+            if input:
+                return self.pya.is_format_supported(rate, input_device=device, input_channels=channels,
+                                                    input_format=sample_format)
+            return self.pya.is_format_supported(rate, output_device=device, output_channels=channels,
+                                                output_format=sample_format)
+        except ValueError:
+            return False
+
+    def refresh(self):
+        # PortAudio only enumerates devices when it is initialized
+        self.pya.terminate()
+        self.pya = self.pyaudio.PyAudio()
+
+    def terminate(self):
+        self.pya.terminate()
+
+
+class SineSource:
+    """
+    Synthetic input: a sine tone plus optional white noise, continuous
+    across blocks.
+    """
+    def __init__(self, rate, channels=1, frequency=440.0, amplitude=0.25, noise=0.0, seed=0):
+        """
+        Args:
+            rate (int): Sample rate.
+            channels (int): Interleaved channels (same signal on each).
+            frequency (float): Tone frequency in Hz.
+            amplitude (float): Tone amplitude, fraction of full scale.
+            noise (float): Noise amplitude, fraction of full scale.
+            seed (int): Random seed, for reproducible runs.
+        """
+        self.rate = rate
+        self.channels = channels
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self._position = 0
+
+    def read(self, frames):
+        """
+        Returns:
+            bytes: `frames` frames of int16 samples.
+        """
+        t = (self._position + np.arange(frames)) / self.rate
+        self._position += frames
+        signal = self.amplitude * np.sin(2 * np.pi * self.frequency * t)
+        if self.noise:
+            signal += self.noise * self._rng.uniform(-1.0, 1.0, frames)
+        samples = np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+        if self.channels > 1:
+            samples = np.repeat(samples, self.channels)
+        return samples.tobytes()
+
+
+class ClockedSineSource:
+    """
+    Sine tone computed from the absolute capture time of each sample, so
+    several simulated devices "hear" the same signal at the same instant
+    whatever their clock skew. Used to check multi-track alignment.
+    """
+    def __init__(self, channels=1, frequency=441.0, amplitude=0.25):
+        self.channels = channels
+        self.frequency = frequency
+        self.amplitude = amplitude
+
+    def read_at(self, frames, start_time, sample_rate):
+        """
+        Args:
+            frames (int): Frames to produce.
+            start_time (float): Capture time of the first frame (seconds).
+            sample_rate (float): True sample rate of the device clock.
+
+        Returns:
+            bytes: int16 frames.
+        """
+        t = start_time + np.arange(frames) / sample_rate
+        samples = (self.amplitude * 32767 * np.sin(2 * np.pi * self.frequency * t)).astype(np.int16)
+        if self.channels > 1:
+            samples = np.repeat(samples, self.channels)
+        return samples.tobytes()
+
+
+class WavFileSource:
+    """
+    Input read from a 16-bit WAV (or RF64) file, looped when it ends.
+    """
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str): 16-bit PCM WAV file.
+        """
+        self._wav = WavReader(filename)
+        if self._wav.sample_width != 2 or not self._wav.frames:
+            raise ValueError("Only non-empty 16-bit WAV files are supported as simulated input")
+        self.rate = self._wav.rate
+        self.channels = self._wav.channels
+
+    def read(self, frames):
+        """
+        Returns:
+            bytes: `frames` frames, wrapping around at the end of the file.
+        """
+        parts = [self._wav.read(frames)]
+        missing = frames - parts[0].shape[0]
+        while missing > 0:
+            self._wav.seek(0)
+            parts.append(self._wav.read(missing))
+            missing -= parts[-1].shape[0]
+        return b''.join(part.tobytes() for part in parts)
+
+
+class SimulatedStream:
+    """
+    Stream driven by a thread on a real-time clock.
+
+    Block k is "captured" at t0 + k * period. The thread waits for that
+    instant (plus the injected jitter) and calls the callback. If the thread
+    is late by more than `buffer_blocks` periods, the simulated driver has
+    overwritten the oldest blocks: they are dropped and the next callback
+    gets the INPUT_OVERFLOW status, like a real device.
+
+    A clock skew makes the device deliver samples slightly faster or slower
+    than its nominal rate, as real sound cards do.
+    """
+    def __init__(self, backend, rate, channels, frames_per_buffer, input, output, callback,
+                 source=None, skew_ppm=0.0):
+        self.backend = backend
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.input = input
+        self.output = output
+        self.callback = callback
+        self.source = source if source is not None else backend.source
+        self.true_rate = rate * (1.0 + skew_ppm * 1e-6)
+        self.period = frames_per_buffer / self.true_rate
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self._thread = None
+        self._running = False
+
+        # Statistics
+        self.blocks = 0
+        self.dropped_blocks = 0
+        self.overflows = 0
+        self.callback_times = TimingStats()    # Seconds spent inside the callback
+        self.latencies = TimingStats()         # Seconds from capture instant to callback start
+
+    def _run(self):
+        """
+        Clock thread body.
+        """
+        backend = self.backend
+        silence = bytes(2 * self.channels * self.frames_per_buffer)
+        t0 = time.perf_counter()
+        block_index = 0
+        status = 0
+
+        while self._running:
+            adc_time = t0 + block_index * self.period
+            wake = adc_time + self.period + backend.next_jitter()
+            delay = wake - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            now = time.perf_counter()
+            late_blocks = int((now - adc_time) / self.period) - 1
+            if late_blocks > backend.buffer_blocks:
+                # The driver buffer wrapped: these blocks are gone
+                lost = late_blocks - backend.buffer_blocks
+                self.dropped_blocks += lost
+                self.overflows += 1
+                block_index += lost
+                adc_time = t0 + block_index * self.period
+                status |= INPUT_OVERFLOW
+
+            if not self.input:
+                in_data = silence
+            elif hasattr(self.source, "read_at"):
+                in_data = self.source.read_at(self.frames_per_buffer, adc_time, self.true_rate)
+            else:
+                in_data = self.source.read(self.frames_per_buffer)
+            time_info = {
+                "input_buffer_adc_time": adc_time + backend.next_timestamp_jitter(),
+                "current_time": now,
+                "output_buffer_dac_time": now + self.period,
+            }
+
+            start = time.perf_counter()
+            _, flag = self.callback(in_data, self.frames_per_buffer, time_info, status)
+            end = time.perf_counter()
+
+            self.callback_times.add(end - start)
+            self.latencies.add(start - adc_time)
+            self.blocks += 1
+            block_index += 1
+            status = 0
+
+            if flag != CONTINUE:
+                self._running = False
+
+    def start_stream(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="SimulatedStream", daemon=True)
+        self._thread.start()
+
+    def stop_stream(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def close(self):
+        self.stop_stream()
+
+    def is_active(self):
+        return self._running
+
+    def stats(self):
+        """
+        Returns:
+            dict: Blocks delivered, dropped blocks/frames, overflow events and
+                callback duration / latency statistics in milliseconds
+                (p99 is the upper edge of its histogram bin, see TimingStats).
+        """
+        return {
+            "blocks": self.blocks,
+            "dropped_blocks": self.dropped_blocks,
+            "dropped_frames": self.dropped_blocks * self.frames_per_buffer,
+            "overflows": self.overflows,
+            "callback_ms_mean": self.callback_times.mean_ms(),
+            "callback_ms_p99": self.callback_times.percentile_ms(0.99),
+            "callback_ms_max": self.callback_times.max_ms(),
+            "latency_ms_mean": self.latencies.mean_ms(),
+            "latency_ms_p99": self.latencies.percentile_ms(0.99),
+            "latency_ms_max": self.latencies.max_ms(),
+        }
+
+
+class SimulatedBackend(AudioBackend):
+    """
+    Simulated sound card for soak and latency testing without hardware.
+
+    Attributes:
+        source: Object with read(frames) -> bytes (SineSource, WavFileSource).
+        jitter_ms (float): Maximum extra delay added before each callback.
+        spike_probability (float): Chance per block of a long scheduling stall.
+        spike_ms (float): Length of such a stall.
+        buffer_blocks (int): Blocks the simulated driver can hold before it
+            overwrites unread input (PortAudio host buffer).
+        clock_skew_ppm (float | list): Clock error of the device(s), in parts
+            per million; a list gives one value per device index.
+        timestamp_jitter_ms (float): Random error of the reported ADC times.
+        source_factory (callable | None): Builds the source of each stream
+            from its device index (default: the shared `source`).
+        devices (list): Simulated device names; edit it and call refresh()
+            to simulate hot-plugging.
+        streams (list): Every stream opened, for collecting statistics.
+    """
+    def __init__(self, rate=44100, channels=1, source=None, jitter_ms=0.0,
+                 spike_probability=0.0, spike_ms=0.0, buffer_blocks=2, seed=0,
+                 clock_skew_ppm=0.0, timestamp_jitter_ms=0.0, source_factory=None):
+        self.rate = rate
+        self.channels = channels
+        self.source = source if source is not None else SineSource(rate, channels)
+        self.jitter_ms = jitter_ms
+        self.spike_probability = spike_probability
+        self.spike_ms = spike_ms
+        self.buffer_blocks = buffer_blocks
+        self.clock_skew_ppm = clock_skew_ppm
+        self.timestamp_jitter_ms = timestamp_jitter_ms
+        self.source_factory = source_factory
+        self.devices = ["Simulated device"]
+        self.streams = []
+        self._rng = random.Random(seed)
+        self._device_names = list(self.devices)
+
+    def next_jitter(self):
+        """
+        Returns:
+            float: Scheduling delay in seconds for the next callback.
+        """
+        delay = self._rng.uniform(0.0, self.jitter_ms) if self.jitter_ms else 0.0
+        if self.spike_probability and self._rng.random() < self.spike_probability:
+            delay += self.spike_ms
+        return delay / 1000.0
+
+    def next_timestamp_jitter(self):
+        """
+        Returns:
+            float: Error added to the next reported ADC time, in seconds.
+        """
+        if not self.timestamp_jitter_ms:
+            return 0.0
+        return self._rng.uniform(-self.timestamp_jitter_ms, self.timestamp_jitter_ms) / 1000.0
+
+    def open_stream(self, rate, channels, frames_per_buffer, input, output, callback, sample_width=2,
+                    input_device_index=None, output_device_index=None):
+        for index in (input_device_index, output_device_index):
+            if index is not None and not 0 <= index < len(self._device_names):
+                raise OSError(f"Invalid device index {index}")
+        if sample_width != 2:
+            raise ValueError("The simulated backend only produces 16-bit samples")
+        device = input_device_index if input_device_index is not None else 0
+        skew = self.clock_skew_ppm
+        if isinstance(skew, (list, tuple)):
+            skew = skew[device] if device < len(skew) else 0.0
+        source = self.source_factory(device) if self.source_factory is not None else None
+        stream = SimulatedStream(self, rate, channels, frames_per_buffer, input, output, callback,
+                                 source=source, skew_ppm=skew)
+        self.streams.append(stream)
+        return stream
+
+    def _info(self, name, max_in, max_out, index=0):
+        return {
+            "index": index,
+            "name": name,
+            "hostApi": 0,
+            "maxInputChannels": max_in,
+            "maxOutputChannels": max_out,
+            "defaultSampleRate": float(self.rate),
+        }
+
+    def default_input_info(self):
+        return self._info("Simulated input", self.channels, 0)
+
+    def default_output_info(self):
+        return self._info("Simulated output", 0, self.channels)
+
+    def device_count(self):
+        return len(self._device_names)
+
+    def device_info(self, index):
+        return self._info(self._device_names[index], self.channels, self.channels, index)
+
+    def host_api_name(self, index):
+        return "Simulated"
+
+    def refresh(self):
+        self._device_names = list(self.devices)
+
+
+class SlowDiskSink:
+    """
+    Sink wrapper that stalls some writes, to reproduce slow disk flushes.
+    """
+    def __init__(self, sink, stall_probability=0.01, stall_ms=200.0, seed=0):
+        """
+        Args:
+            sink: Wrapped object with writeframes(bytes).
+            stall_probability (float): Chance per write of a stall.
+            stall_ms (float): Length of each stall.
+            seed (int): Random seed, for reproducible runs.
+        """
+        self.sink = sink
+        self.stall_probability = stall_probability
+        self.stall_ms = stall_ms
+        self.stalls = 0
+        self._rng = random.Random(seed)
+
+    def writeframes(self, data):
+        if self._rng.random() < self.stall_probability:
+            self.stalls += 1
+            time.sleep(self.stall_ms / 1000.0)
+        self.sink.writeframes(data)
@@ -0,0 +1,332 @@
+"""
+Batch Transcoder
+================
+
+Description:
+    Converts the WAV recordings left in the audio folder to MP3 (or any
+    format of the encoder registry, see encoders.py), several files at a
+    time (takes made while ffmpeg was missing, conversions that
+    failed or were interrupted...).
+
+    - One worker per CPU core, each driving its own ffmpeg process (LAME is
+      single threaded, so the cores are the limit).
+    - A content-hash cache (`batch_cache.json` in the folder) remembers
+      which WAV contents were already converted, per format. The hash of a
+      file is reused while its size and modification time do not change,
+      so a re-run over an already converted folder only stats the files.
+    - The WAV file is deleted only after its output decodes completely and
+      lasts as long as the recording (encoders.verify_export), also when
+      the cache says it was converted before.
+    - With a loudness target each file is measured and normalized on the
+      way to ffmpeg (normalize.py); normalized outputs are cached apart
+      from plain conversions.
+
+    Files still being recorded (modified in the last SETTLE_SECONDS) and
+    files queued in the recorder's export queue are left alone.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from encoders import get_encoder, export_wav, verify_export
+from normalize import export_normalized
+
+CACHE_FILENAME = 'batch_cache.json'
+QUEUE_FILENAME = 'export_queue.json'    # ExportQueue of the recorder, see engine.py
+SETTLE_SECONDS = 30.0   # A WAV modified more recently may still be recording
+HASH_BLOCK = 1 << 20
+
+# Result states
+CONVERTED = "converted"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def content_hash(filename):
+    """
+    Args:
+        filename (str): File to hash.
+
+    Returns:
+        str: BLAKE2b digest (hex) of the whole file.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def queued_inputs(queue_file):
+    """
+    Inputs of the pending and running jobs of the recorder's export queue.
+
+    Args:
+        queue_file (str): ExportQueue persistence file.
+
+    Returns:
+        set: Absolute paths (empty if the file is missing or unreadable).
+    """
+    try:
+        with open(queue_file, 'r', encoding='utf-8') as f:
+            jobs = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    return {os.path.abspath(job["input"]) for job in jobs if job.get("status") in ("pending", "running")}
+
+
+def pending_wavs(folder, recursive=False, settle_seconds=SETTLE_SECONDS):
+    """
+    WAV files of a folder that may be converted.
+
+    Args:
+        folder (str): Audio folder.
+        recursive (bool): Also scan the subfolders.
+        settle_seconds (float): Skip files modified more recently.
+
+    Returns:
+        list: Absolute paths, sorted.
+    """
+    busy = queued_inputs(os.path.join(folder, QUEUE_FILENAME))
+    now = time.time()
+    filenames = []
+    for root, dirs, names in os.walk(folder):
+        if not recursive:
+            dirs[:] = []
+        for name in names:
+            if not name.lower().endswith('.wav'):
+                continue
+            path = os.path.abspath(os.path.join(root, name))
+            try:
+                recent = now - os.path.getmtime(path) < settle_seconds
+            except OSError:
+                continue
+            if not recent and path not in busy:
+                filenames.append(path)
+    return sorted(filenames)
+
+
+class TranscodeCache:
+    """
+    Persistent record of the conversions, keyed by content hash.
+
+    The JSON file holds:
+        files: path -> size, mtime_ns and hash of the last time it was hashed
+        done: hash + output extension (+ loudness target) -> output path
+            and size of its verified conversion
+    """
+    def __init__(self, filename):
+        """
+        Args:
+            filename (str): JSON file (created on the first save).
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.filename = filename
+        self._lock = threading.Lock()
+        self.files = {}
+        self.done = {}
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.done = data.get("done", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not read batch cache {filename}: {e}")
+
+    def hash_of(self, filename):
+        """
+        Content hash of a file, computed only if the file changed since it
+        was last hashed.
+
+        Args:
+            filename (str): Absolute path.
+
+        Returns:
+            str: Content hash.
+        """
+        stat = os.stat(filename)
+        with self._lock:
+            entry = self.files.get(filename)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["hash"]
+        digest = content_hash(filename)
+        with self._lock:
+            self.files[filename] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest}
+        return digest
+
+    def converted(self, digest, output_filename, variant=""):
+        """
+        Args:
+            digest (str): Content hash of the source.
+            output_filename (str): Expected output.
+            variant (str): Processing applied on top of the format (e.g.
+                the loudness target), part of the key.
+
+        Returns:
+            bool: True if this content was converted to `output_filename`
+                and that file is still there, unchanged in size.
+        """
+        with self._lock:
+            entry = self.done.get(self._done_key(digest, output_filename, variant))
+        if not entry or entry["output"] != output_filename:
+            return False
+        try:
+            return os.path.getsize(output_filename) == entry["size"]
+        except OSError:
+            return False
+
+    @staticmethod
+    def _done_key(digest, output_filename, variant=""):
+        return digest + os.path.splitext(output_filename)[1].lower() + variant
+
+    def mark_done(self, digest, output_filename, variant=""):
+        with self._lock:
+            self.done[self._done_key(digest, output_filename, variant)] = {"output": output_filename, "size": os.path.getsize(output_filename)}
+
+    def forget_file(self, filename):
+        with self._lock:
+            self.files.pop(filename, None)
+
+    def save(self):
+        """
+        Write the cache atomically, dropping entries of deleted files.
+        """
+        with self._lock:
+            self.files = {path: entry for path, entry in self.files.items() if os.path.exists(path)}
+            data = {"files": self.files, "done": self.done}
+            tmp_filename = self.filename + '.tmp'
+            try:
+                with open(tmp_filename, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=1)
+                os.replace(tmp_filename, self.filename)
+            except OSError as e:
+                self.logger.error(f"Could not save batch cache {self.filename}: {e}")
+
+
+class BatchTranscoder:
+    """
+    Converts a list of WAV files in parallel.
+
+    Attributes:
+        encoder (AudioEncoder): Output format.
+        workers (int): Concurrent conversions.
+        delete_source (bool): Remove each WAV once its output is verified.
+        normalize (float | None): Loudness target in LUFS, or None to keep
+            the recorded level.
+        on_result (callable | None): Called with each result dict as soon
+            as a file is finished (on a worker thread).
+    """
+    def __init__(self, folder, workers=None, delete_source=True, encoder=None, on_result=None, normalize=None):
+        """
+        Args:
+            folder (str): Audio folder (where the cache is kept).
+            workers (int, optional): Concurrent conversions; defaults to
+                the number of CPU cores.
+            delete_source (bool): Remove each WAV once its output is verified.
+            encoder (str | AudioEncoder, optional): Output format, see
+                encoders.get_encoder(). Defaults to MP3.
+            on_result (callable, optional): Per-file notification.
+            normalize (float, optional): Loudness target in LUFS.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.folder = folder
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.delete_source = delete_source
+        self.encoder = get_encoder(encoder)
+        self.on_result = on_result
+        self.normalize = normalize
+        self._variant = f"@{normalize:g}LUFS" if normalize is not None else ""
+        self.cache = TranscodeCache(os.path.join(folder, CACHE_FILENAME))
+
+    def run(self, filenames=None):
+        """
+        Convert the files, `workers` at a time.
+
+        Args:
+            filenames (list, optional): WAV files; defaults to
+                pending_wavs(folder).
+
+        Returns:
+            list: One dict per file, in input order: input, output, status
+                (converted, skipped or failed), deleted, seconds, error.
+        """
+        if filenames is None:
+            filenames = pending_wavs(self.folder)
+        self.logger.info(f"Batch of {len(filenames)} files with {self.workers} workers")
+        t0 = time.monotonic()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="BatchWorker") as pool:
+                results = list(pool.map(self._process, filenames))
+        finally:
+            self.cache.save()
+        self.logger.info(f"Batch finished in {time.monotonic() - t0:.1f} s")
+        return results
+
+    def _process(self, filename):
+        """
+        Convert (or skip) one file. Never raises.
+        """
+        t0 = time.monotonic()
+        base, _ = os.path.splitext(filename)
+        result = {"input": filename, "output": f"{base}{self.encoder.extension}", "status": FAILED, "deleted": False,
+                  "seconds": 0.0, "error": ""}
+        try:
+            self._convert(filename, result)
+        except Exception as e:
+            self.logger.error(f"Could not convert {filename}: {e}", exc_info=True)
+            result["error"] = str(e)
+        result["seconds"] = round(time.monotonic() - t0, 3)
+        if self.on_result:
+            self.on_result(result)
+        return result
+
+    def _convert(self, filename, result):
+        output_filename = result["output"]
+        digest = self.cache.hash_of(filename)
+
+        cached = self.cache.converted(digest, output_filename, self._variant)
+        broken = cached and self.delete_source and not verify_export(filename, output_filename)
+        if broken:
+            # Same name and size is not enough to delete the source: convert it again
+            self.logger.warning(f"{output_filename} failed the integrity check, converting {filename} again")
+
+        if cached and not broken:
+            result["status"] = SKIPPED
+        elif not broken and self.normalize is None and os.path.exists(output_filename) \
+                and verify_export(filename, output_filename):
+            # Converted by the recorder while the WAV copy was kept
+            self.cache.mark_done(digest, output_filename)
+            result["status"] = SKIPPED
+        else:
+            # ffmpeg picks the container from the extension: keep it last
+            tmp_filename = f"{os.path.splitext(output_filename)[0]}.partial{self.encoder.extension}"
+            if self.normalize is not None:
+                ok = export_normalized(filename, tmp_filename, self.normalize, encoder=self.encoder)
+            else:
+                ok = export_wav(filename, tmp_filename, encoder=self.encoder)
+            ok = ok and verify_export(filename, tmp_filename)
+            if not ok:
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+                result["error"] = "ffmpeg failed or the output failed the integrity check"
+                return
+            os.replace(tmp_filename, output_filename)
+            self.cache.mark_done(digest, output_filename, self._variant)
+            result["status"] = CONVERTED
+
+        if self.delete_source:
+            self.logger.info(f"delete wave {filename}")
+            os.remove(filename)
+            self.cache.forget_file(filename)
+            result["deleted"] = True
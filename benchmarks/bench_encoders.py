@@ -0,0 +1,142 @@
+"""
+Encoder Benchmark
+=================
+
+Description:
+    Encodes the same recording with every registered export format (see
+    encoders.py) and reports, per format:
+        - encode time and speed (x real time) and real-time factor
+          (encode time / audio duration; lower is better)
+        - output size and size ratio against the WAV file
+        - whether the output passes the integrity check used before a WAV
+          is deleted (full decode, same duration)
+
+    Without --source a speech-like test signal is generated: syllable-rate
+    bursts of harmonics and noise separated by pauses, which is closer to
+    the recorder's real input than a pure tone.
+
+Usage:
+    python benchmarks/bench_encoders.py [--source FILE.wav] [--seconds 120] [--format opus ...]
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from encoders import FFMPEG, ENCODERS, export_wav, verify_export
+from wavio import CrashSafeWavWriter, read_wav_info
+
+
+def write_speech_like(filename, seconds, rate=engine.RATE, channels=engine.CHANNELS, seed=0):
+    """
+    Write a WAV file with a speech-like test signal.
+
+    Args:
+        filename (str): Output WAV file.
+        seconds (float): Duration.
+        rate (int): Sample rate.
+        channels (int): Channels (same signal on each).
+        seed (int): Random seed, for reproducible runs.
+    """
+    rng = np.random.default_rng(seed)
+    writer = CrashSafeWavWriter(filename, channels, 2, rate, fsync=False)
+    block = rate  # One second per step
+    t_block = np.arange(block) / float(rate)
+    for start in range(0, int(seconds * rate), block):
+        t = start / float(rate) + t_block
+        pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)            # Slow intonation
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voice = sum(np.sin(k * phase) / k for k in range(1, 12))   # Harmonic-rich glottal tone
+        envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)     # About 4 syllables per second
+        envelope *= (np.sin(2 * np.pi * 0.15 * t) > -0.5)          # Pauses between phrases
+        signal = 0.2 * voice * envelope + 0.02 * rng.standard_normal(block) * envelope
+        samples = np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+        writer.writeframes(np.repeat(samples, channels).tobytes())
+    writer.close()
+
+
+def bench(wav_filename, encoder, output_dir):
+    """
+    Encode once with a registered format.
+
+    Returns:
+        dict: Timings, sizes and integrity check of the output.
+    """
+    duration = read_wav_info(wav_filename).duration
+    output_filename = os.path.join(output_dir, f"bench{encoder.extension}")
+    t0 = time.perf_counter()
+    ok = export_wav(wav_filename, output_filename, encoder=encoder)
+    elapsed = time.perf_counter() - t0
+    if not ok:
+        return {"format": encoder.name, "error": "ffmpeg failed (codec not built in?)"}
+
+    size = os.path.getsize(output_filename)
+    return {
+        "format": encoder.name,
+        "settings": " ".join(encoder.ffmpeg_args()),
+        "encode_s": round(elapsed, 3),
+        "speed_x": round(duration / elapsed, 1) if elapsed else None,
+        "rtf": round(elapsed / duration, 4) if duration else None,
+        "bytes": size,
+        "size_ratio": round(size / float(os.path.getsize(wav_filename)), 4),
+        "kbps": round(size * 8 / duration / 1000, 1) if duration else None,
+        "verified": verify_export(wav_filename, output_filename),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Encode speed and size of each export format")
+    parser.add_argument("--source", help="16-bit WAV file to encode (default: generated speech-like signal)")
+    parser.add_argument("--seconds", type=float, default=120.0, help="Length of the generated signal")
+    parser.add_argument("--format", action="append", choices=sorted(ENCODERS),
+                        help="Format to test (repeatable, default: all)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    if shutil.which(FFMPEG) is None:
+        print("ffmpeg not found in PATH", file=sys.stderr)
+        return 2
+
+    output_dir = tempfile.mkdtemp(prefix="grabadora_encoders_")
+    try:
+        wav_filename = args.source
+        if not wav_filename:
+            wav_filename = os.path.join(output_dir, "source.wav")
+            write_speech_like(wav_filename, args.seconds)
+        info = read_wav_info(wav_filename)
+
+        report = {
+            "source": args.source or "speech-like",
+            "duration_s": round(info.duration, 3),
+            "rate": info.rate,
+            "channels": info.channels,
+            "cpu_count": os.cpu_count(),
+            "formats": [bench(wav_filename, ENCODERS[name], output_dir)
+                        for name in (args.format or sorted(ENCODERS))],
+        }
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0 if all(result.get("verified") for result in report["formats"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
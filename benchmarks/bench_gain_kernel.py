@@ -0,0 +1,94 @@
+"""
+Gain Kernel Benchmark
+=====================
+
+Description:
+    Compares the original callback processing
+        np.clip(audio_data * gain, -32768, 32767).astype(np.int16) + np.abs peak
+    with dsp.GainKernel at CHUNK = 64, 256 and 1024.
+
+    Reports the mean and 99th percentile time per block and the memory
+    allocated per call (tracemalloc), which is what causes jitter in the
+    audio callback.
+
+Usage:
+    python benchmarks/bench_gain_kernel.py [iterations]
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dsp import GainKernel
+
+CHUNKS = (64, 256, 1024)
+GAIN = 2.0
+
+
+def original(in_data, gain):
+    """
+    Processing as done by the callbacks before GainKernel.
+    """
+    audio_data = np.frombuffer(in_data, dtype=np.int16)
+    amplified_data = np.clip(audio_data * gain, -32768, 32767).astype(np.int16)
+    peak_level = np.max(np.abs(amplified_data))
+    return amplified_data, peak_level
+
+
+def measure(func, in_data, iterations):
+    """
+    Time `iterations` calls and measure the bytes allocated per call.
+
+    Returns:
+        tuple: (mean us, p99 us, bytes allocated per call)
+    """
+    for _ in range(100):  # warm up
+        func(in_data)
+
+    times = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        func(in_data)
+        times[i] = time.perf_counter() - t0
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func(in_data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return times.mean() * 1e6, np.percentile(times, 99) * 1e6, peak
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = np.random.default_rng(0)
+
+    print(f"{'CHUNK':>6} {'variant':>9} {'mean us':>9} {'p99 us':>9} {'alloc B':>9}")
+    for chunk in CHUNKS:
+        in_data = rng.integers(-20000, 20000, chunk, dtype=np.int16).tobytes()
+        kernel = GainKernel(chunk)
+
+        # Both variants must agree (up to the rounding of the fixed-point gain)
+        ref, ref_peak = original(in_data, GAIN)
+        new, new_peak, _ = kernel.process(in_data, GAIN)
+        assert np.max(np.abs(ref.astype(np.int32) - new)) <= 1
+        assert abs(int(ref_peak) - new_peak) <= 1
+
+        for name, func in (("original", lambda d: original(d, GAIN)),
+                           ("kernel", lambda d: kernel.process(d, GAIN))):
+            mean_us, p99_us, alloc = measure(func, in_data, iterations)
+            print(f"{chunk:>6} {name:>9} {mean_us:>9.2f} {p99_us:>9.2f} {alloc:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Startup Benchmark
+=================
+
+Description:
+    Measures the startup path as numbers, so regressions are visible:
+        - import time of the modules each front end loads, in a fresh
+          interpreter (median of several runs)
+        - RecorderEngine construction: time until the constructor returns
+          and until the engine is ready, with the probe inline and in the
+          background (simulated device, so only the engine's own cost)
+        - ffmpeg check, without and with the on-disk cache
+        - GUI time to first paint and to ready, when wxPython is installed
+          (opens the main frame in a fresh interpreter and closes it as soon
+          as the engine is ready)
+
+    The GUI also appends its own timings to startup_timings.json in the
+    recordings folder at every launch.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--json FILE]
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODULES = ("filenames", "grabadora_cli", "engine")
+
+# Runs the GUI like grabadora.py does, printing its timings and quitting once the engine is ready
+GUI_SCRIPT = """
+import json
+import wx
+import grabadora
+
+class StartupBenchGUI(grabadora.GUI):
+    def on_engine_ready(self):
+        super().on_engine_ready()
+        print(json.dumps(self.startup_timings), flush=True)
+        self.onFrameExit(None)
+
+app = wx.App(False)
+frame = StartupBenchGUI(None)
+frame.update_display()
+app.MainLoop()
+"""
+
+
+def import_ms(module, runs):
+    """
+    Median import time of `module` in a fresh interpreter.
+
+    Returns:
+        float | None: Milliseconds, None if the import fails.
+    """
+    code = (f"import time; t0 = time.perf_counter(); import {module}; "
+            f"print((time.perf_counter() - t0) * 1000)")
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return round(statistics.median(samples), 1)
+
+
+def engine_ms(background_probe):
+    """
+    Build a RecorderEngine on the simulated device.
+
+    Returns:
+        dict: Milliseconds until the constructor returned and until ready.
+    """
+    import engine
+    from backends import SimulatedBackend
+
+    t0 = time.perf_counter()
+    recorder = engine.RecorderEngine(tempfile.mkdtemp(prefix="grabadora_startup_"), export=False,
+                                     backend=SimulatedBackend(), background_probe=background_probe)
+    returned = time.perf_counter() - t0
+    recorder.wait_ready()
+    ready = time.perf_counter() - t0
+    recorder.shutdown()
+    return {"constructor_ms": round(returned * 1000, 2), "ready_ms": round(ready * 1000, 2)}
+
+
+def ffmpeg_check_ms():
+    """
+    Returns:
+        dict: ffmpeg check time without cache and with a warm cache.
+    """
+    import engine
+
+    cache_file = os.path.join(tempfile.mkdtemp(prefix="grabadora_startup_"), "ffmpeg_probe.json")
+    t0 = time.perf_counter()
+    installed = engine.check_ffmpeg_installed(cache_file)
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    engine.check_ffmpeg_installed(cache_file)
+    warm = time.perf_counter() - t0
+    return {"installed": installed, "cold_ms": round(cold * 1000, 2), "cached_ms": round(warm * 1000, 2)}
+
+
+def gui_ms():
+    """
+    Launch the GUI until its engine is ready.
+
+    Returns:
+        dict | None: The GUI's startup timings, None without wxPython.
+    """
+    try:
+        import wx  # noqa: F401
+    except ImportError:
+        return None
+    t0 = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", GUI_SCRIPT], cwd=ROOT,
+                            capture_output=True, text=True, timeout=120)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup time of the recorder")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per import measurement")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = {
+        "import_ms": {module: import_ms(module, args.runs) for module in MODULES},
+        "engine_inline": engine_ms(background_probe=False),
+        "engine_background": engine_ms(background_probe=True),
+        "ffmpeg_check": ffmpeg_check_ms(),
+        "gui": gui_ms(),
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Multi-Track Alignment Test
+==========================
+
+Description:
+    Records N simulated devices at once through RecorderEngine.start_multitrack()
+    and measures how well the tracks line up. Every device has its own clock
+    skew (ppm) and all of them "hear" the same sine tone at the same instant
+    (ClockedSineSource), so on perfectly aligned tracks the tone has the same
+    phase everywhere. Reports, per track and per time window:
+        - time offset against track 1, from the phase of the tone
+        - the clock rate estimated by the aligner against the simulated skew
+        - frames dropped anywhere in the chain
+
+    With --stall-track the stream of that device is stopped halfway through
+    the take (unplugged device): the other tracks must keep recording, the
+    stalled one is padded with silence, and stop_multitrack() must return
+    promptly with tracks of equal length.
+
+    No sound card is needed.
+
+Usage:
+    python benchmarks/multitrack_test.py --devices 8 --duration 60 --max-skew-ppm 100 \
+        --timestamp-jitter-ms 1 [--poly]
+    python benchmarks/multitrack_test.py --devices 2 --duration 10 --stall-track 2 --ring-seconds 1
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from wavreader import WavReader
+from backends import SimulatedBackend, ClockedSineSource
+
+FREQUENCY = 441.0
+WINDOW_SECONDS = 1.0
+STOP_TIMEOUT = 5.0      # stop_multitrack() must return within this many seconds
+
+
+def read_tracks(files, polyphonic, channels):
+    """
+    Returns:
+        list: One float array (frames, channels) per track.
+    """
+    tracks = []
+    for filename in files:
+        with WavReader(filename) as wav:
+            data = wav.samples
+            if polyphonic:
+                tracks.extend(data[:, i:i + channels].astype(np.float64)
+                              for i in range(0, wav.channels, channels))
+            else:
+                tracks.append(data.astype(np.float64))
+    return tracks
+
+
+def tone_phase(samples, start, rate):
+    """
+    Phase of the FREQUENCY tone in `samples` (least squares fit of a sine
+    and a cosine), relative to the absolute frame index `start`.
+    """
+    n = start + np.arange(samples.shape[0])
+    w = 2 * np.pi * FREQUENCY / rate
+    basis = np.stack((np.sin(w * n), np.cos(w * n)), axis=1)
+    (a, b), *_ = np.linalg.lstsq(basis, samples, rcond=None)
+    return np.arctan2(b, a)
+
+
+def offsets_us(tracks, rate):
+    """
+    Time offset of each track against track 1, per window.
+
+    Returns:
+        list: Per track, the offsets (microseconds) of every window.
+    """
+    frames = min(track.shape[0] for track in tracks)
+    window = int(WINDOW_SECONDS * rate)
+    period_us = 1e6 / FREQUENCY
+    result = [[] for _ in tracks]
+    for start in range(0, frames - window + 1, window):
+        reference = tone_phase(tracks[0][start:start + window, 0], start, rate)
+        for i, track in enumerate(tracks):
+            if not np.any(track[start:start + window, 0]):
+                continue    # Silence written for a stalled device
+            delta = tone_phase(track[start:start + window, 0], start, rate) - reference
+            delta = (delta + np.pi) % (2 * np.pi) - np.pi
+            result[i].append(delta / (2 * np.pi) * period_us)
+    return result
+
+
+def run(args):
+    """
+    Run one multi-track session.
+
+    Returns:
+        dict: Collected measurements.
+    """
+    rng = random.Random(args.seed)
+    skews = [rng.uniform(-args.max_skew_ppm, args.max_skew_ppm) for _ in range(args.devices)]
+    backend = SimulatedBackend(
+        rate=args.device_rate,
+        channels=args.device_channels,
+        jitter_ms=args.jitter_ms,
+        clock_skew_ppm=skews,
+        timestamp_jitter_ms=args.timestamp_jitter_ms,
+        source_factory=lambda index: ClockedSineSource(args.device_channels, FREQUENCY),
+        seed=args.seed,
+    )
+    backend.devices = [f"Simulated device {i + 1}" for i in range(args.devices)]
+    backend.refresh()
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="grabadora_multitrack_")
+    recorder = engine.RecorderEngine(output_dir, export=False, backend=backend, chunk=args.chunk)
+    keys = [device["key"] for device in recorder.devices.inputs()]
+    engine.RING_SECONDS = args.ring_seconds
+    recorder.start_multitrack("multitrack", keys, polyphonic=args.poly)
+
+    start = time.monotonic()
+    deadline = start + args.duration
+    stalled = False
+    while time.monotonic() < deadline:
+        if args.stall_track and not stalled and time.monotonic() - start >= args.duration / 2:
+            # The device stops delivering audio; its stream object stays open
+            recorder.multitrack.captures[args.stall_track - 1].stream.stop_stream()
+            stalled = True
+        time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+
+    t0 = time.perf_counter()
+    result = recorder.stop_multitrack()
+    stop_lag = time.perf_counter() - t0
+    recorder.shutdown()
+
+    tracks = read_tracks(result["files"], args.poly, engine.CHANNELS)
+    offsets = offsets_us(tracks, engine.RATE)
+    # The first windows are skipped: the clock fit is still settling
+    settled = [values[len(values) // 4:] or values for values in offsets]
+
+    report = {
+        "devices": args.devices,
+        "device_format": f"{args.device_channels} ch @ {args.device_rate} Hz",
+        "polyphonic": args.poly,
+        "duration_s": args.duration,
+        "frames_per_track": [track.shape[0] for track in tracks],
+        "stop_lag_s": round(stop_lag, 3),
+        "stall_track": args.stall_track,
+        "tracks": [],
+        "output_dir": output_dir,
+    }
+    for i, track in enumerate(result["tracks"]):
+        values = settled[i]
+        report["tracks"].append({
+            "device": track["device"],
+            "skew_ppm": round(skews[i], 2),
+            "estimated_ppm": track["drift_ppm"],
+            "start_offset_ms": track["start_offset_ms"],
+            "offset_us_mean": round(float(np.mean(values)), 2) if values else None,
+            "offset_us_max": round(float(np.max(np.abs(values))), 2) if values else None,
+            "ring_dropped_frames": track["ring_dropped_frames"],
+            "overflows": track["overflows"],
+            "padded_frames": track["padded_frames"],
+            "dropped_frames": track["dropped_frames"],
+        })
+    report["max_offset_us"] = max((t["offset_us_max"] or 0.0) for t in report["tracks"])
+    report["max_ppm_error"] = round(max(abs(t["estimated_ppm"] - t["skew_ppm"]) for t in report["tracks"]), 2)
+    report["ok"] = len(set(report["frames_per_track"])) == 1 and stop_lag < STOP_TIMEOUT
+    if args.stall_track:
+        # The other tracks kept recording past the stall
+        report["ok"] = report["ok"] and report["frames_per_track"][0] > engine.RATE * args.duration * 0.75 \
+            and report["tracks"][args.stall_track - 1]["padded_frames"] > 0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-device alignment test on simulated devices")
+    parser.add_argument("--devices", type=int, default=8, help="Simulated input devices")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to record")
+    parser.add_argument("--max-skew-ppm", type=float, default=100.0, help="Clock skew range of the devices")
+    parser.add_argument("--timestamp-jitter-ms", type=float, default=0.5, help="Error of the reported ADC times")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Callback scheduling jitter")
+    parser.add_argument("--device-rate", type=int, default=48000, help="Native rate of the devices")
+    parser.add_argument("--device-channels", type=int, default=2, help="Native channels of the devices")
+    parser.add_argument("--chunk", type=int, default=engine.CHUNK, help="Frames per callback")
+    parser.add_argument("--poly", action="store_true", help="One polyphonic WAV instead of one per device")
+    parser.add_argument("--ring-seconds", type=int, default=engine.RING_SECONDS, help="Buffering per stage")
+    parser.add_argument("--stall-track", type=int, default=0,
+                        help="Stop this device (1-based) halfway through the take")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the skews and jitter")
+    parser.add_argument("--output-dir", help="Keep the files here (default: a temporary folder)")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
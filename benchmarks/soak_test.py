@@ -0,0 +1,138 @@
+"""
+Soak Test
+=========
+
+Description:
+    Runs the RecorderEngine against the SimulatedBackend for a given time,
+    optionally with scheduling jitter and slow disk writes, and reports:
+        - frames dropped by the simulated device (callback too late)
+        - frames dropped by the recording ring buffer (writer too slow)
+        - callback duration and ADC-to-callback latency
+        - end-of-recording lag (time spent in stop_recording())
+        - whether the WAV file holds every frame the writer received
+        - live analyzer batches and drops (compare with --no-live-view)
+
+    No sound card is needed, so it can run for hours on a CI-style Linux box.
+
+Usage:
+    python benchmarks/soak_test.py --duration 3600 --jitter-ms 5 \
+        --spike-prob 0.001 --spike-ms 80 --disk-stall-prob 0.01 --disk-stall-ms 300
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import engine
+from wavio import read_wav_info
+from backends import SimulatedBackend, SineSource, WavFileSource, SlowDiskSink
+
+
+def run(args):
+    """
+    Run one soak session.
+
+    Returns:
+        dict: Collected measurements.
+    """
+    if args.source:
+        source = WavFileSource(args.source)
+    else:
+        source = SineSource(args.device_rate, args.device_channels, noise=0.05)
+
+    backend = SimulatedBackend(
+        rate=source.rate,
+        channels=source.channels,
+        source=source,
+        jitter_ms=args.jitter_ms,
+        spike_probability=args.spike_prob,
+        spike_ms=args.spike_ms,
+    )
+
+    output_dir = args.output_dir or tempfile.mkdtemp(prefix="grabadora_soak_")
+    recorder = engine.RecorderEngine(output_dir, export=args.export, backend=backend, chunk=args.chunk)
+    recorder.live_view = not args.no_live_view
+    if args.disk_stall_prob:
+        recorder.sink_wrapper = lambda sink: SlowDiskSink(sink, args.disk_stall_prob, args.disk_stall_ms)
+
+    recorder.start_monitor(playback=False)
+    wav_filename = recorder.start_recording("soak")
+
+    deadline = time.monotonic() + args.duration
+    while time.monotonic() < deadline:
+        time.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+
+    t0 = time.perf_counter()
+    result = recorder.stop_recording()
+    stop_lag = time.perf_counter() - t0
+
+    stream_stats = recorder.capture_stream.stats()
+    analyzer_stats = recorder.analyzer.stats() if recorder.analyzer is not None else None
+    recorder.shutdown()
+
+    writer = result["writer"] or {}
+    report = {
+        "duration_s": args.duration,
+        "chunk": args.chunk,
+        "capture_format": [recorder.capture_rate, recorder.capture_channels],
+        "device": stream_stats,
+        "ring_overruns": writer.get("overruns", 0),
+        "ring_dropped_frames": writer.get("dropped_frames", 0),
+        "ring_high_water": writer.get("high_water", 0),
+        "max_write_ms": writer.get("max_write_ms", 0.0),
+        "stop_lag_ms": round(stop_lag * 1000, 3),
+        "live_view": analyzer_stats,
+        "output": result["export"] or result["wav"],
+    }
+
+    if result["wav"]:
+        report["wav_frames"] = read_wav_info(wav_filename).frames
+        report["wav_complete"] = report["wav_frames"] == writer.get("frames_written")
+
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test of the recorder on a simulated device")
+    parser.add_argument("--duration", type=float, default=60.0, help="Recording length in seconds")
+    parser.add_argument("--chunk", type=int, default=engine.CHUNK, help="Frames per callback")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Max random delay per callback")
+    parser.add_argument("--spike-prob", type=float, default=0.0, help="Chance per block of a long stall")
+    parser.add_argument("--spike-ms", type=float, default=0.0, help="Length of a long stall")
+    parser.add_argument("--disk-stall-prob", type=float, default=0.0, help="Chance per write of a disk stall")
+    parser.add_argument("--disk-stall-ms", type=float, default=200.0, help="Length of a disk stall")
+    parser.add_argument("--device-rate", type=int, default=engine.RATE, help="Native rate of the simulated device")
+    parser.add_argument("--device-channels", type=int, default=engine.CHANNELS,
+                        help="Native channels of the simulated device")
+    parser.add_argument("--source", help="16-bit WAV file used as input (default: sine + noise)")
+    parser.add_argument("--export", action="store_true", help="Encode while recording (needs ffmpeg)")
+    parser.add_argument("--output-dir", help="Where to write the recording (default: temp dir)")
+    parser.add_argument("--no-live-view", action="store_true", help="Do not run the live analyzer")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    dropped = report["device"]["dropped_frames"] + report["ring_dropped_frames"]
+    return 0 if dropped == 0 and report.get("wav_complete", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
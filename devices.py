@@ -0,0 +1,247 @@
+"""
+Device Manager
+==============
+
+Description:
+    Audio device list with cached capabilities and hot-plug detection.
+
+    Probing which sample rates and channel counts a device accepts opens
+    a test stream per format and device, which is the slow part of the
+    enumeration on Windows. The results are cached in a JSON file keyed
+    by the device identity (host API + name + channel counts), so later
+    launches only list the devices and probe the new ones.
+
+    Devices are selected by identity rather than by PortAudio index,
+    because indexes shift when a device is plugged in or removed.
+
+    PortAudio only enumerates devices when it is initialized, so the
+    hot-plug watcher re-initializes the backend periodically, and only
+    while no stream is open. Selecting a device never re-initializes it.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import json
+import logging
+import threading
+
+# Formats probed for each device and cached
+PROBE_RATES = (44100, 48000, 88200, 96000)
+PROBE_CHANNELS = (1, 2)
+
+
+def device_key(info, host_api):
+    """
+    Identity of a device across launches and re-enumerations.
+
+    Args:
+        info (dict): PortAudio device info.
+        host_api (str): Host API name.
+
+    Returns:
+        str: e.g. "WASAPI|Microphone (USB Audio)|2|0"
+    """
+    return f"{host_api}|{info['name']}|{info['maxInputChannels']}|{info['maxOutputChannels']}"
+
+
+class DeviceManager:
+    """
+    Enumerates the backend's devices and keeps their capabilities.
+
+    Each device is a dict with: index, key, name, host_api,
+    max_input_channels, max_output_channels, default_rate, input_rates,
+    output_rates, channels (list of channel counts accepted).
+
+    Attributes:
+        devices (list): Devices of the last scan.
+        lock (threading.Lock): Held while the backend is re-initialized;
+            hold it while opening streams.
+    """
+    def __init__(self, backend, cache_file=None, sample_width=2):
+        """
+        Load the capability cache. No device is touched until scan().
+
+        Args:
+            backend (AudioBackend): Audio I/O to enumerate.
+            cache_file (str, optional): JSON capability cache.
+            sample_width (int): Sample width probed.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.backend = backend
+        self.cache_file = cache_file
+        self.sample_width = sample_width
+        self.devices = []
+        self.lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self._cache = {}
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring device cache {cache_file}: {e}")
+
+        self._watch_thread = None
+        self._watch_stop = threading.Event()
+
+    def _probe_capabilities(self, index, info):
+        """
+        Ask PortAudio which of the PROBE_RATES / PROBE_CHANNELS formats the
+        device accepts (slow: one test per format).
+        """
+        input_rates, output_rates, channels = [], [], []
+        for rate in PROBE_RATES:
+            if info['maxInputChannels'] and self.backend.is_format_supported(
+                    rate, index, min(info['maxInputChannels'], 1), True, self.sample_width):
+                input_rates.append(rate)
+            if info['maxOutputChannels'] and self.backend.is_format_supported(
+                    rate, index, min(info['maxOutputChannels'], 1), False, self.sample_width):
+                output_rates.append(rate)
+        rate = int(info['defaultSampleRate'])
+        for count in PROBE_CHANNELS:
+            if info['maxInputChannels'] >= count and self.backend.is_format_supported(
+                    rate, index, count, True, self.sample_width):
+                channels.append(count)
+        return {"input_rates": input_rates, "output_rates": output_rates, "channels": channels}
+
+    def _save_cache(self):
+        if not self.cache_file:
+            return
+        tmp_filename = self.cache_file + '.tmp'
+        try:
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f, indent=1)
+            os.replace(tmp_filename, self.cache_file)
+        except OSError as e:
+            self.logger.error(f"Could not save device cache: {e}")
+
+    def scan(self):
+        """
+        List the backend's devices, probing only those not in the cache.
+
+        Returns:
+            list: The devices (also kept in `devices`).
+        """
+        devices = []
+        cache_changed = False
+        for index in range(self.backend.device_count()):
+            info = self.backend.device_info(index)
+            host_api = self.backend.host_api_name(info.get('hostApi', 0))
+            key = device_key(info, host_api)
+
+            capabilities = self._cache.get(key)
+            if capabilities is None:
+                self.cache_misses += 1
+                capabilities = self._probe_capabilities(index, info)
+                self._cache[key] = capabilities
+                cache_changed = True
+            else:
+                self.cache_hits += 1
+
+            devices.append({
+                "index": index,
+                "key": key,
+                "name": info['name'],
+                "host_api": host_api,
+                "max_input_channels": info['maxInputChannels'],
+                "max_output_channels": info['maxOutputChannels'],
+                "default_rate": int(info['defaultSampleRate']),
+                **capabilities,
+            })
+
+        if cache_changed:
+            self._save_cache()
+        self.devices = devices
+        self.logger.info(f"{len(devices)} devices ({self.cache_hits} cached, {self.cache_misses} probed)")
+        return devices
+
+    def inputs(self):
+        """
+        Returns:
+            list: Devices with at least one input channel.
+        """
+        return [device for device in self.devices if device["max_input_channels"] > 0]
+
+    def outputs(self):
+        """
+        Returns:
+            list: Devices with at least one output channel.
+        """
+        return [device for device in self.devices if device["max_output_channels"] > 0]
+
+    def find(self, key):
+        """
+        Args:
+            key (str): Device identity (see device_key()).
+
+        Returns:
+            dict | None: The device, or None if it is not connected.
+        """
+        for device in self.devices:
+            if device["key"] == key:
+                return device
+        return None
+
+    def refresh(self, can_refresh=None):
+        """
+        Re-initialize the backend and scan again (no stream may be open).
+
+        Args:
+            can_refresh (callable, optional): Checked while holding `lock`;
+                nothing is done if it returns False.
+
+        Returns:
+            tuple: (added, removed) device keys.
+        """
+        with self.lock:
+            if can_refresh is not None and not can_refresh():
+                return [], []
+            before = {device["key"] for device in self.devices}
+            self.backend.refresh()
+            self.scan()
+            after = {device["key"] for device in self.devices}
+        return sorted(after - before), sorted(before - after)
+
+    def start_watch(self, interval, can_refresh, on_change):
+        """
+        Poll for hot-plugged devices on a background thread.
+
+        Args:
+            interval (float): Seconds between two polls.
+            can_refresh (callable): Returns True when no stream is open and
+                the backend may be re-initialized.
+            on_change (callable): Called with (added, removed) device keys
+                when the device list changed. Runs on the watcher thread.
+        """
+        if self._watch_thread is not None:
+            return
+
+        def watch():
+            while not self._watch_stop.wait(interval):
+                try:
+                    added, removed = self.refresh(can_refresh)
+                except Exception as e:
+                    self.logger.error(f"Device refresh failed: {e}", exc_info=True)
+                    continue
+                if added or removed:
+                    self.logger.info(f"Devices added: {added}, removed: {removed}")
+                    on_change(added, removed)
+
+        self._watch_stop.clear()
+        self._watch_thread = threading.Thread(target=watch, name="DeviceWatcher", daemon=True)
+        self._watch_thread.start()
+
+    def stop_watch(self):
+        """
+        Stop the hot-plug watcher and wait for it.
+        """
+        if self._watch_thread is None:
+            return
+        self._watch_stop.set()
+        self._watch_thread.join()
+        self._watch_thread = None
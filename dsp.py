@@ -0,0 +1,865 @@
+"""
+Audio Processing Kernels
+========================
+
+Description:
+    Real-time safe processing used by the audio callback.
+
+    GainKernel applies the input gain with integer fixed-point arithmetic
+    and a saturating clip, working entirely in buffers preallocated per
+    stream. After construction a call allocates no sample arrays, so the
+    callback does not produce garbage whose collection shows up as jitter
+    at small CHUNK sizes.
+
+    LevelMeter collects linear peak / energy / clip statistics per block in
+    the callback and turns them into dB values once per UI frame, with a
+    decaying peak hold so short peaks and clips are never lost between two
+    display refreshes.
+
+    FormatConverter turns blocks captured in the device's native format
+    (rate and channel count) into the file format: channel mixdown and
+    polyphase resampling with vectorized numpy. It allocates per block and
+    runs on the writer thread, never in the callback.
+
+    DriftResampler reads a stream at a fractional, slowly varying step
+    (cubic interpolation), to follow a sound card whose clock runs a few
+    ppm fast or slow against a reference clock.
+
+    VoiceGate drops the silent parts of a take (automatic pause/resume)
+    on the writer thread.
+
+    LoudnessMeter measures the integrated loudness (ITU-R BS.1770, LUFS)
+    of a stream in fixed blocks, for loudness normalization at export.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import math
+import bisect
+import time
+
+import numpy as np
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+# Bound ufunc reductions skip the ndarray.max() wrapper overhead
+_max_reduce = np.maximum.reduce
+_min_reduce = np.minimum.reduce
+
+
+class GainKernel:
+    """
+    Fixed-point gain + saturating clip for int16 audio.
+
+    The gain is quantized to Q`FRACTION_BITS` (1/4096 steps). Samples are
+    multiplied in an int32 accumulator (32768 * MAX_GAIN * 4096 < 2**31),
+    scaled back by an arithmetic shift and copied into a preallocated int16
+    output buffer. Only blocks that exceed the int16 range are clipped,
+    in place; the peak comes from the extremes of the accumulator either
+    way.
+
+    The block energy would overflow int32 (one full-scale sample squared is
+    already 2**30), so it is a float64 dot product on a preallocated
+    scratch copy; the sums stay far below 2**53, so it is exact.
+
+    The returned block is a read-only view of the kernel's own buffer: it
+    is only valid until the next call, so consumers that keep it must
+    copy it.
+    """
+    FRACTION_BITS = 12
+    MAX_GAIN = 15.0  # Keeps sample * gain inside the int32 accumulator
+
+    def __init__(self, max_frames, channels=1):
+        """
+        Preallocate the work buffers.
+
+        Args:
+            max_frames (int): Largest expected block, in frames (e.g. CHUNK).
+            channels (int): Interleaved channels per frame.
+        """
+        self.channels = channels
+        self._gain = None
+        # 0-d operands: cheaper for the ufuncs than converting a Python int per call
+        self._gain_q = np.zeros((), dtype=np.int32)
+        self._shift = np.array(self.FRACTION_BITS, dtype=np.int32)
+        self._allocate(max_frames * channels)
+
+    def _allocate(self, samples):
+        """
+        (Re)allocate the work buffers for `samples` interleaved samples.
+        """
+        self._acc = np.empty(samples, dtype=np.int32)
+        self._out = np.empty(samples, dtype=np.int16)
+        self._energy = np.empty(samples, dtype=np.float64)
+        self._views = {}  # block size -> (acc, out, read-only out, energy) views, built once per size
+
+    @classmethod
+    def quantize_gain(cls, gain):
+        """
+        Convert a linear gain into the fixed-point multiplier.
+
+        Args:
+            gain (float): Linear gain, clamped to [0, MAX_GAIN].
+
+        Returns:
+            int: Gain in Q`FRACTION_BITS`.
+        """
+        gain = min(max(gain, 0.0), cls.MAX_GAIN)
+        return int(gain * (1 << cls.FRACTION_BITS) + 0.5)
+
+    def process(self, in_data, gain):
+        """
+        Apply gain and clip to one block.
+
+        Args:
+            in_data (bytes): Raw int16 input samples.
+            gain (float): Linear gain.
+
+        Returns:
+            tuple: (read-only np.ndarray int16 view of the processed block,
+                    int peak absolute sample value,
+                    int sum of squared samples, for RMS metering)
+        """
+        samples = np.frombuffer(in_data, dtype=np.int16)
+        n = samples.shape[0]
+        if n > self._acc.shape[0]:
+            # Host delivered a bigger block than announced: grow once
+            self._allocate(n)
+
+        views = self._views.get(n)
+        if views is None:
+            shared = self._out[:n].view()
+            shared.flags.writeable = False
+            views = self._views[n] = (self._acc[:n], self._out[:n], shared, self._energy[:n])
+        acc, out, shared, energy = views
+
+        # Widen into the accumulator first so the multiply needs no cast buffer
+        np.copyto(acc, samples, casting='unsafe')
+        if gain != self._gain:
+            self._gain = gain
+            self._gain_q[...] = self.quantize_gain(gain)
+        np.multiply(acc, self._gain_q, out=acc)
+        np.right_shift(acc, self._shift, out=acc)
+
+        # argmax/argmin index the extremes without the reduction machinery
+        # of max()/min(), which allocates about 1 KB per call
+        if n:
+            high = int(acc[acc.argmax()])
+            low = int(acc[acc.argmin()])
+            if high > INT16_MAX or low < INT16_MIN:
+                # Saturating clip, in place: only blocks that overflow pay for it
+                np.minimum(acc, INT16_MAX, out=acc)
+                np.maximum(acc, INT16_MIN, out=acc)
+                high = min(high, INT16_MAX)
+                low = max(low, INT16_MIN)
+            peak = max(high, -low)
+            np.copyto(energy, acc)
+            sum_squares = int(np.dot(energy, energy))
+        else:
+            peak = sum_squares = 0
+
+        np.copyto(out, acc, casting='unsafe')
+        return shared, peak, sum_squares
+
+
+class LevelMeter:
+    """
+    Peak / RMS / clip metering split between the callback and the UI.
+
+    `accumulate` runs on the audio callback: it stores the linear block
+    statistics into small preallocated history arrays and advances a block
+    counter (single producer, no locks, no transcendental math).
+
+    `read` runs once per UI frame: it combines every block written since
+    the previous read, converts to dB and updates the decaying display
+    level and the peak hold. If more than HISTORY blocks arrive between two
+    reads the oldest ones are skipped, but the peak hold still sees the
+    loudest of the retained blocks.
+    """
+    HISTORY = 512           # Blocks kept between two reads (~0.75 s at CHUNK=64)
+    FLOOR_DB = -100.0       # Reported level for digital silence
+    HOLD_SECONDS = 1.5      # Time the peak hold stays before decaying
+    DECAY_DB_PER_S = 20.0   # Fall rate of the display level and of the hold
+
+    def __init__(self, full_scale=INT16_MAX):
+        """
+        Args:
+            full_scale (int): Sample value that corresponds to 0 dBFS.
+        """
+        self.full_scale = full_scale
+        self._peaks = np.zeros(self.HISTORY, dtype=np.int64)
+        self._energy = np.zeros(self.HISTORY, dtype=np.float64)
+        self._samples = np.zeros(self.HISTORY, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear history, counters and hold. Call while the stream is stopped.
+        """
+        self._blocks = 0        # Written by the callback only
+        self._read_blocks = 0   # Written by the UI only
+        self.clips = 0          # Blocks that reached full scale (callback only)
+        self.peak_db = self.FLOOR_DB
+        self.rms_db = self.FLOOR_DB
+        self.display_db = self.FLOOR_DB
+        self.hold_db = self.FLOOR_DB
+        self._hold_time = 0.0
+        self._last_read = None
+        self._last_clips = 0
+
+    def accumulate(self, peak, sum_squares, samples):
+        """
+        Record one block's statistics (audio callback side).
+
+        Args:
+            peak (int): Peak absolute sample value of the block.
+            sum_squares (int): Sum of squared samples of the block.
+            samples (int): Number of samples in the block.
+        """
+        i = self._blocks % self.HISTORY
+        self._peaks[i] = peak
+        self._energy[i] = sum_squares
+        self._samples[i] = samples
+        if peak >= self.full_scale:
+            self.clips += 1
+        # Publish only after the slot is complete
+        self._blocks += 1
+
+    def _to_db(self, value):
+        """
+        Linear amplitude to dBFS, floored for silence.
+        """
+        if value <= 0:
+            return self.FLOOR_DB
+        return max(self.FLOOR_DB, 20.0 * math.log10(value / self.full_scale))
+
+    def read(self, now=None):
+        """
+        Fold all blocks since the previous read into dB levels (UI side).
+
+        Args:
+            now (float, optional): time.monotonic() of this frame.
+
+        Returns:
+            dict: peak_db and rms_db of the blocks since the last read,
+                display_db (peak with decay, for the gauge), hold_db (peak
+                hold), clips (total clipped blocks) and clipped (True if a
+                clip happened since the last read).
+        """
+        if now is None:
+            now = time.monotonic()
+        dt = 0.0 if self._last_read is None else now - self._last_read
+        self._last_read = now
+
+        end = self._blocks
+        start = max(self._read_blocks, end - self.HISTORY)
+        self._read_blocks = end
+
+        if end > start:
+            idx = np.arange(start, end) % self.HISTORY
+            samples = int(self._samples[idx].sum())
+            self.peak_db = self._to_db(int(self._peaks[idx].max()))
+            rms = math.sqrt(float(self._energy[idx].sum()) / samples) if samples else 0.0
+            self.rms_db = self._to_db(rms)
+        else:
+            # No new audio: levels fall with the decay
+            self.peak_db = self.FLOOR_DB
+            self.rms_db = self.FLOOR_DB
+
+        decay = self.DECAY_DB_PER_S * dt
+        self.display_db = max(self.peak_db, self.display_db - decay)
+
+        if self.peak_db >= self.hold_db:
+            self.hold_db = self.peak_db
+            self._hold_time = now
+        elif now - self._hold_time > self.HOLD_SECONDS:
+            self.hold_db = max(self.peak_db, self.hold_db - decay)
+
+        clips = self.clips
+        clipped = clips != self._last_clips
+        self._last_clips = clips
+
+        return {
+            "peak_db": self.peak_db,
+            "rms_db": self.rms_db,
+            "display_db": self.display_db,
+            "hold_db": self.hold_db,
+            "clips": clips,
+            "clipped": clipped,
+        }
+
+
+class FormatConverter:
+    """
+    Streaming channel mixdown / upmix and rational-ratio resampling of
+    int16 audio.
+
+    Downmixing happens before resampling and upmixing after it, so the
+    filter always runs on the smaller channel count. The resampler is a
+    Kaiser-windowed sinc polyphase filter (`taps` input samples per output
+    sample) whose delay is compensated: output frame m is the signal at
+    input time m * in_rate / out_rate, and after flush() exactly
+    ceil(frames_in * out_rate / in_rate) frames have been produced.
+    """
+    TAPS = 64           # Shorter filters leave a wide transition band: aliases above 20 kHz leak through
+    KAISER_BETA = 8.6   # About 80 dB stopband attenuation
+    BANDWIDTH = 0.92    # Passband edge, as a fraction of the lower Nyquist frequency
+
+    def __init__(self, in_rate, in_channels, out_rate, out_channels, taps=TAPS):
+        """
+        Args:
+            in_rate (int): Capture sample rate.
+            in_channels (int): Capture channels.
+            out_rate (int): File sample rate.
+            out_channels (int): File channels.
+            taps (int): Filter length per output sample.
+        """
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.out_rate = out_rate
+        self.out_channels = out_channels
+        self.work_channels = min(in_channels, out_channels)
+        self.taps = taps
+
+        divisor = math.gcd(in_rate, out_rate)
+        self.up = out_rate // divisor
+        self.down = in_rate // divisor
+        self.resampling = in_rate != out_rate
+        self.passthrough = not self.resampling and in_channels == out_channels
+        if self.resampling:
+            self._design_filter()
+        self.reset()
+
+    def _design_filter(self):
+        """
+        Split the anti-aliasing low-pass filter into `up` phases of `taps`
+        coefficients: phase p holds h[p], h[p + up], h[p + 2 up]...
+        """
+        up, taps = self.up, self.taps
+        length = up * taps
+        cutoff = self.BANDWIDTH * 0.5 / max(up, self.down)  # Cycles per upsampled sample
+        # Centered on a whole upsampled sample so the delay compensation is exact
+        self._delay = length // 2
+        n = np.arange(length) - self._delay
+        window = np.i0(self.KAISER_BETA * np.sqrt(np.clip(1 - (n / (length / 2.0)) ** 2, 0, 1)))
+        window /= np.i0(self.KAISER_BETA)
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * window * up
+        self._phases = np.ascontiguousarray(h.reshape(taps, up).T, dtype=np.float32)
+        self._tap_offsets = np.arange(taps)
+
+    def reset(self):
+        """
+        Forget the stream history (start of a new take).
+        """
+        self.frames_in = 0
+        self.frames_out = 0
+        if self.resampling:
+            self._history = np.zeros((self.taps - 1, self.work_channels), dtype=np.float32)
+
+    def _resample(self, x):
+        """
+        Produce every output frame whose filter support is available.
+
+        Args:
+            x (np.ndarray): float32 (frames, work_channels), next input frames.
+
+        Returns:
+            np.ndarray: float32 (frames, work_channels).
+        """
+        ext = np.concatenate((self._history, x))
+        base = self.frames_in - (self.taps - 1)  # Absolute input index of ext[0]
+        self.frames_in += x.shape[0]
+        self._history = ext[-(self.taps - 1):].copy()
+
+        # Last output whose newest input sample (u // up) is already here
+        end = ((self.frames_in - 1) * self.up + self.up - 1 - self._delay) // self.down + 1
+        if end <= self.frames_out:
+            return np.empty((0, self.work_channels), dtype=np.float32)
+
+        u = np.arange(self.frames_out, end, dtype=np.int64) * self.down + self._delay
+        newest = u // self.up - base
+        gathered = ext[newest[:, None] - self._tap_offsets]  # (frames, taps, channels)
+        y = np.einsum('nk,nkc->nc', self._phases[u % self.up], gathered)
+        self.frames_out = end
+        return y
+
+    def _to_int16(self, y):
+        if self.out_channels > self.work_channels:
+            y = np.repeat(y, self.out_channels // self.work_channels, axis=1)[:, :self.out_channels]
+        return np.clip(np.rint(y), INT16_MIN, INT16_MAX).astype(np.int16)
+
+    def process(self, block):
+        """
+        Convert one block.
+
+        Args:
+            block (np.ndarray): int16 (frames, in_channels).
+
+        Returns:
+            np.ndarray: int16 (frames, out_channels); the frame count
+                differs from the input when resampling.
+        """
+        if self.passthrough:
+            return block
+
+        if self.work_channels < self.in_channels:
+            if self.work_channels == 1:
+                x = block.mean(axis=1, dtype=np.float32, keepdims=True)
+            else:
+                x = block[:, :self.work_channels].astype(np.float32)
+        else:
+            x = block.astype(np.float32)
+
+        if self.resampling:
+            x = self._resample(x)
+        return self._to_int16(x)
+
+    def flush(self):
+        """
+        Output the frames still held back by the filter delay (end of take).
+
+        Returns:
+            np.ndarray: int16 (frames, out_channels).
+        """
+        if not self.resampling:
+            return np.empty((0, self.out_channels), dtype=np.int16)
+
+        expected = -(-self.frames_in * self.up // self.down)  # ceil
+        before = self.frames_out
+        frames_in = self.frames_in
+        y = self._resample(np.zeros((self.taps, self.work_channels), dtype=np.float32))
+        y = y[:max(0, expected - before)]
+        self.frames_in = frames_in
+        self.frames_out = before + y.shape[0]
+        return self._to_int16(y)
+
+
+class DriftResampler:
+    """
+    Streaming resampler with a step close to 1.0 that may change between
+    blocks, for clock drift compensation (not for rate conversion: it has
+    no anti-aliasing filter).
+
+    Output frame n is the input interpolated (Catmull-Rom cubic) at
+    `position`, which advances by the `ratio` given to each process() call.
+    """
+    def __init__(self, channels, start_position=1.0):
+        """
+        Args:
+            channels (int): Interleaved channels.
+            start_position (float): Input frame of the first output frame
+                (at least 1.0, the interpolator needs one frame before it).
+        """
+        self.channels = channels
+        self.position = max(float(start_position), 1.0)
+        self.frames_out = 0
+        self._buf = np.empty((0, channels), dtype=np.float32)
+        self._start = 0  # Absolute input index of _buf[0]
+
+    def process(self, block, ratio):
+        """
+        Append input frames and interpolate every output frame they allow.
+
+        Args:
+            block (np.ndarray): int16 (frames, channels).
+            ratio (float): Input frames per output frame.
+
+        Returns:
+            np.ndarray: int16 (frames, channels).
+        """
+        self._buf = np.concatenate((self._buf, block.astype(np.float32)))
+        end = self._start + self._buf.shape[0]
+        # Frames i-1 .. i+2 must exist: position < end - 2
+        if self.position >= end - 2:
+            return np.empty((0, self.channels), dtype=np.int16)
+
+        count = int((end - 2 - self.position) / ratio)
+        if self.position + count * ratio >= end - 2:
+            count -= 1
+        count += 1
+        positions = self.position + ratio * np.arange(count)
+        index = np.floor(positions).astype(np.int64)
+        frac = (positions - index).astype(np.float32)[:, None]
+        local = index - self._start
+        xm1, x0, x1, x2 = (self._buf[local + k] for k in (-1, 0, 1, 2))
+        y = x0 + 0.5 * frac * (x1 - xm1 + frac * (2 * xm1 - 5 * x0 + 4 * x1 - x2
+                                                   + frac * (3 * (x0 - x1) + x2 - xm1)))
+
+        self.position += count * ratio
+        self.frames_out += count
+        keep_from = int(self.position) - 1 - self._start
+        if keep_from > 0:
+            self._buf = self._buf[keep_from:]
+            self._start += keep_from
+        return np.clip(np.rint(y), INT16_MIN, INT16_MAX).astype(np.int16)
+
+
+class VoiceGate:
+    """
+    Energy-based voice activity gate for automatic pause/resume.
+
+    The audio is cut into FRAME_MS analysis frames whose energy is computed
+    in one vectorized pass per block; only the open/closed decision runs
+    per frame (about 100 per second of audio). The gate:
+        - opens after `attack_ms` of consecutive frames above the threshold,
+          and keeps the `lookback_ms` before the opening (which covers the
+          attack), so the first syllable is never cut;
+        - closes after `hangover_ms` without a frame above the threshold,
+          so short pauses between words are kept.
+
+    It runs on the writer thread: the closed parts are simply not written,
+    the stream never stops.
+
+    Attributes:
+        is_open (bool): Audio is currently passed through.
+        frames_in, frames_out (int): Frames received and kept.
+        pauses (int): Times the gate closed.
+        resumes (list): (output frame, input frame) of every reopening.
+        closes (list): (output frame, input frame) of every closing.
+    """
+    FRAME_MS = 10.0
+    MAX_RESUMES = 10000  # Reopenings (and closings) kept in `resumes` and `closes`
+
+    def __init__(self, rate, channels, threshold_db=-45.0, attack_ms=30.0, hangover_ms=1500.0,
+                 lookback_ms=300.0, full_scale=INT16_MAX):
+        """
+        Args:
+            rate (int): Sample rate.
+            channels (int): Interleaved channels.
+            threshold_db (float): RMS level (dBFS) of a frame with voice.
+            attack_ms (float): Voice needed before the gate opens.
+            hangover_ms (float): Silence needed before the gate closes.
+            lookback_ms (float): Audio kept before the opening (at least
+                the attack time).
+            full_scale (int): Sample value of 0 dBFS.
+        """
+        self.rate = rate
+        self.channels = channels
+        self.frame_len = max(1, int(rate * self.FRAME_MS / 1000))
+        self.attack_frames = max(1, int(round(attack_ms / self.FRAME_MS)))
+        self.hangover_frames = max(1, int(round(hangover_ms / self.FRAME_MS)))
+        self.lookback_frames = max(self.attack_frames, int(round(lookback_ms / self.FRAME_MS)))
+        # Compare mean squares, no log per frame
+        self.threshold_energy = (full_scale * 10 ** (threshold_db / 20.0)) ** 2
+
+        self.is_open = False
+        self.frames_in = 0
+        self.frames_out = 0
+        self.pauses = 0
+        self.resumes = []
+        self.closes = []
+        self._attack = 0
+        self._hang = 0
+        self._rest = np.empty((0, channels), dtype=np.int16)     # Partial analysis frame
+        self._history = np.empty((0, channels), dtype=np.int16)  # Closed audio kept for lookback
+
+    def process(self, block):
+        """
+        Gate a block.
+
+        Args:
+            block (np.ndarray): int16 (frames, channels).
+
+        Returns:
+            np.ndarray: int16 (frames, channels) to write; may be empty.
+        """
+        self.frames_in += block.shape[0]
+        data = np.concatenate((self._rest, block)) if self._rest.shape[0] else block
+        count = data.shape[0] // self.frame_len
+        usable = count * self.frame_len
+        self._rest = data[usable:].copy()
+        if not count:
+            return data[:0]
+
+        x = data[:usable].reshape(count, self.frame_len * self.channels).astype(np.float32)
+        loud = np.einsum('ij,ij->i', x, x) / x.shape[1] > self.threshold_energy
+
+        # Decide per frame on [history + block] so an opening can reach back
+        held = self._history.shape[0] // self.frame_len
+        ext = np.concatenate((self._history, data[:usable])) if held else data[:usable]
+        keep = np.zeros(held + count, dtype=bool)
+        ext_start = self.frames_in - self._rest.shape[0] - ext.shape[0]  # Input frame of ext[0]
+        for i in range(count):
+            j = held + i
+            if self.is_open:
+                keep[j] = True
+                if loud[i]:
+                    self._hang = self.hangover_frames
+                else:
+                    self._hang -= 1
+                    if self._hang <= 0:
+                        self.is_open = False
+                        self._attack = 0
+                        self.pauses += 1
+                        if len(self.closes) < self.MAX_RESUMES:
+                            self.closes.append((self.frames_out + int(keep[:j + 1].sum()) * self.frame_len,
+                                                ext_start + (j + 1) * self.frame_len))
+            else:
+                self._attack = self._attack + 1 if loud[i] else 0
+                if self._attack >= self.attack_frames:
+                    self.is_open = True
+                    self._hang = self.hangover_frames
+                    first = max(0, j - self.lookback_frames + 1)
+                    keep[first:j + 1] = True
+                    if len(self.resumes) < self.MAX_RESUMES:
+                        self.resumes.append((self.frames_out + int(keep[:first].sum()) * self.frame_len,
+                                             ext_start + first * self.frame_len))
+
+        mask = np.repeat(keep, self.frame_len)
+        out = ext[mask]
+
+        # Closed audio after the last kept frame stays available for the next opening
+        if self.is_open:
+            self._history = ext[:0]
+        else:
+            last_kept = np.flatnonzero(keep)
+            tail_from = last_kept[-1] + 1 if last_kept.size else 0
+            tail_from = max(tail_from, held + count - self.lookback_frames)
+            self._history = ext[tail_from * self.frame_len:].copy()
+
+        self.frames_out += out.shape[0]
+        return out
+
+    def output_frame(self, input_frame):
+        """
+        Where an input frame ended up in the output.
+
+        Args:
+            input_frame (int): Frame of the gate input.
+
+        Returns:
+            int: Its output frame, or the output frame of the cut that
+                replaced it if it was left out.
+        """
+        index = bisect.bisect_right([resume[1] for resume in self.resumes], input_frame) - 1
+        if index < 0:
+            return 0
+        out_frame, in_frame = self.resumes[index]
+        if index < len(self.closes) and self.closes[index][1] <= input_frame:
+            return self.closes[index][0]
+        return out_frame + input_frame - in_frame
+
+    def flush(self):
+        """
+        Returns:
+            np.ndarray: The last partial analysis frame if the gate is open.
+        """
+        rest, self._rest = self._rest, self._rest[:0]
+        if not self.is_open:
+            return rest[:0]
+        self.frames_out += rest.shape[0]
+        return rest
+
+    def stats(self):
+        """
+        Returns:
+            dict: Frames in and kept, pause count and the ratio kept.
+        """
+        return {
+            "frames_in": self.frames_in,
+            "frames_kept": self.frames_out,
+            "kept_ratio": round(self.frames_out / self.frames_in, 4) if self.frames_in else None,
+            "pauses": self.pauses,
+            "resumes": len(self.resumes),
+        }
+
+
+class LoudnessMeter:
+    """
+    Integrated loudness of a stream (ITU-R BS.1770-4 / EBU R128), in
+    bounded memory.
+
+    The K-weighting filter (high shelf + high pass, two biquads) is applied
+    as its impulse response truncated to IMPULSE_SECONDS, by FFT overlap-add
+    on blocks of `block_frames`: no per-sample loop runs in Python. Only
+    the energy of each 100 ms step is kept (10 values per second and
+    channel); result() sums them into the 400 ms gating blocks (75%
+    overlap) and applies the absolute and relative gates.
+
+    Implements the `writeframes(bytes)` / `close()` sink interface, so the
+    writer thread can measure a take while recording it.
+
+    Attributes:
+        frames (int): Frames measured.
+        peak (int): Highest absolute sample value.
+    """
+    STEP_MS = 100.0
+    GATE_STEPS = 4              # Steps per gating block (400 ms)
+    ABSOLUTE_GATE = -70.0       # LUFS
+    RELATIVE_GATE = -10.0       # LU below the loudness of the blocks above the absolute gate
+    IMPULSE_SECONDS = 0.1       # The K-weighting response has decayed by over 100 dB by then
+    BLOCK_FRAMES = 65536
+
+    def __init__(self, rate, channels, block_frames=BLOCK_FRAMES, full_scale=INT16_MAX + 1):
+        """
+        Args:
+            rate (int): Sample rate.
+            channels (int): Interleaved channels (all weighted 1.0: the
+                surround weights of BS.1770 do not apply to mono/stereo).
+            block_frames (int): Frames filtered per FFT.
+            full_scale (int): Sample value of 0 dBFS.
+        """
+        self.rate = rate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.full_scale = full_scale
+        self.step = max(1, int(round(rate * self.STEP_MS / 1000)))
+        self.frames = 0
+        self.peak = 0
+
+        taps = max(1, int(rate * self.IMPULSE_SECONDS))
+        self.fft_size = 1 << (block_frames + taps - 2).bit_length()  # Holds a whole linear convolution
+        self._response = np.fft.rfft(self._k_weighting(rate, taps), self.fft_size)[:, None]
+        self._tail = np.zeros((taps - 1, channels))                 # Overlap-add carry
+        self._buf = np.empty((block_frames, channels), dtype=np.float32)
+        self._fill = 0
+        self._steps = []                                            # (n, channels) step energies
+        self._step_energy = np.zeros(channels)
+        self._step_fill = 0
+        self._closed = False
+
+    @staticmethod
+    def _k_weighting(rate, taps):
+        """
+        Impulse response of the K-weighting filter at `rate`, from the
+        BS.1770 biquads re-derived for any sample rate (bilinear
+        transform, as in libebur128).
+
+        Returns:
+            np.ndarray: float64 FIR coefficients, `taps` long.
+        """
+        # High shelf (+4 dB above ~1.7 kHz, the head's acoustic effect)
+        k = math.tan(math.pi * 1681.974450955533 / rate)
+        q = 0.7071752369554196
+        vh = 10 ** (3.999843853973347 / 20.0)
+        vb = vh ** 0.4996667741545416
+        a0 = 1 + k / q + k * k
+        shelf = ([(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0],
+                 [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+        # High pass (RLB weighting, ~38 Hz)
+        k = math.tan(math.pi * 38.13547087602444 / rate)
+        q = 0.5003270373238773
+        a0 = 1 + k / q + k * k
+        highpass = ([1.0, -2.0, 1.0], [1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0])
+
+        # Sample the frequency response densely enough for the impulse
+        # response to have died out before it wraps around
+        size = 1 << max(16, (8 * taps).bit_length())
+        z = np.exp(-2j * np.pi * np.arange(size // 2 + 1) / size)
+        response = np.ones(z.size, dtype=complex)
+        for b, a in (shelf, highpass):
+            response *= np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+        return np.fft.irfft(response, size)[:taps]
+
+    def writeframes(self, data):
+        """
+        Measure a block.
+
+        Args:
+            data (bytes): Interleaved int16 samples (whole frames).
+        """
+        self.add(np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels))
+
+    def add(self, block):
+        """
+        Measure a block given as samples.
+
+        Args:
+            block (np.ndarray): int16 (frames, channels), e.g. a WavReader view.
+        """
+        if not block.shape[0]:
+            return
+        self.frames += block.shape[0]
+        flat = block.reshape(-1)
+        self.peak = max(self.peak, int(_max_reduce(flat)), -int(_min_reduce(flat)))
+
+        pos = 0
+        while pos < block.shape[0]:
+            count = min(block.shape[0] - pos, self.block_frames - self._fill)
+            self._buf[self._fill:self._fill + count] = block[pos:pos + count]
+            self._fill += count
+            pos += count
+            if self._fill == self.block_frames:
+                self._filter(self._buf)
+                self._fill = 0
+
+    def _filter(self, x):
+        """
+        K-weight a block (overlap-add) and fold its energy into the steps.
+
+        Args:
+            x (np.ndarray): (frames, channels), at most `block_frames`.
+        """
+        n = x.shape[0]
+        y = np.fft.irfft(np.fft.rfft(x, self.fft_size, axis=0) * self._response, self.fft_size, axis=0)
+        taps = self._tail.shape[0]
+        y[:taps] += self._tail
+        self._tail = y[n:n + taps].copy()
+        squares = y[:n]
+        squares *= squares
+
+        # Complete the open step, then whole steps in one reduction
+        need = self.step - self._step_fill
+        if n < need:
+            self._step_energy += squares.sum(axis=0)
+            self._step_fill += n
+            return
+        steps = [(self._step_energy + squares[:need].sum(axis=0))[None, :]]
+        rest = squares[need:]
+        count = rest.shape[0] // self.step
+        if count:
+            steps.append(rest[:count * self.step].reshape(count, self.step, self.channels).sum(axis=1))
+        self._steps.append(np.concatenate(steps))
+        self._step_energy = rest[count * self.step:].sum(axis=0)
+        self._step_fill = rest.shape[0] - count * self.step
+
+    def close(self):
+        """
+        Measure the frames still buffered (end of the stream).
+
+        Returns:
+            dict: See result().
+        """
+        if not self._closed:
+            self._closed = True
+            if self._fill:
+                self._filter(self._buf[:self._fill])
+                self._fill = 0
+        return self.result()
+
+    def result(self):
+        """
+        Integrated loudness of the complete gating blocks measured so far
+        (the audio still buffered counts after close()).
+
+        Returns:
+            dict: integrated_lufs (None if every block is below the
+                absolute gate), peak_dbfs (None for digital silence),
+                gated_blocks (blocks above both gates), frames.
+        """
+        integrated = None
+        gated = 0
+        steps = np.concatenate(self._steps) if self._steps else np.zeros((0, self.channels))
+        if steps.shape[0] >= self.GATE_STEPS:
+            # Mean square per 400 ms block, channels summed (all weights 1.0)
+            energy = steps.sum(axis=1)
+            cumulative = np.concatenate(([0.0], np.cumsum(energy)))
+            power = (cumulative[self.GATE_STEPS:] - cumulative[:-self.GATE_STEPS]) \
+                / (self.GATE_STEPS * self.step * float(self.full_scale) ** 2)
+            with np.errstate(divide='ignore'):
+                loudness = -0.691 + 10 * np.log10(power)
+            above = power[loudness > self.ABSOLUTE_GATE]
+            if above.size:
+                threshold = -0.691 + 10 * np.log10(above.mean()) + self.RELATIVE_GATE
+                kept = above[-0.691 + 10 * np.log10(above) > threshold]
+                gated = int(kept.size)
+                integrated = round(-0.691 + 10 * math.log10(kept.mean()), 2)
+        return {
+            "integrated_lufs": integrated,
+            "peak_dbfs": round(20 * math.log10(self.peak / float(self.full_scale)), 2) if self.peak else None,
+            "gated_blocks": gated,
+            "frames": self.frames,
+        }
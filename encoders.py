@@ -0,0 +1,607 @@
+"""
+FFmpeg Encoders
+===============
+
+Description:
+    Helpers to drive FFmpeg as an external encoder process.
+
+    The output formats live in a registry (ENCODERS): each AudioEncoder
+    holds the file extension and the ffmpeg codec settings of one format.
+    MP3 stays the default; Opus at 32 kbps is a fraction of its size for
+    speech, and FLAC is lossless. More formats can be added with
+    register_encoder().
+
+    FfmpegStreamEncoder keeps one ffmpeg process alive for the whole take and
+    feeds it raw PCM through stdin, so the compressed file is complete a few
+    hundred milliseconds after the recording stops instead of requiring a
+    full WAV conversion afterwards.
+
+    export_wav converts an existing WAV file in constant memory and reports
+    real progress parsed from ffmpeg's `-progress` output.
+
+    verify_export decodes a converted file completely before its source WAV
+    may be deleted.
+
+    Markers (the pause cues of a take) are carried into the compressed
+    files as chapters, through an `;FFMETADATA1` file: export_wav reads
+    them from the WAV's cue chunk, and add_chapters remuxes a file encoded
+    while recording, whose markers are only known at the end.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import re
+import struct
+import logging
+import tempfile
+import threading
+import subprocess
+
+from wavio import read_wav_info, read_cues
+
+FFMPEG = "ffmpeg"
+MP3_BITRATE = "192k"
+DEFAULT_FORMAT = "mp3"
+
+# Raw PCM formats understood by ffmpeg, by sample width in bytes
+PCM_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+STDERR_TAIL_BYTES = 8192    # Last part of ffmpeg's error output kept for the log
+
+
+class AudioEncoder:
+    """
+    Output format: file extension plus ffmpeg codec and settings.
+
+    Attributes:
+        name (str): Registry key ("mp3", "opus", "flac"...).
+        extension (str): File extension, with the dot.
+        codec (str): ffmpeg audio encoder.
+        settings (dict): ffmpeg output options without the dash, e.g.
+            {"b:a": "32k"}.
+        lossless (bool): Decoding gives back the exact samples.
+    """
+    def __init__(self, name, extension, codec, settings=None, lossless=False):
+        self.name = name
+        self.extension = extension
+        self.codec = codec
+        self.settings = dict(settings or {})
+        self.lossless = lossless
+
+    def ffmpeg_args(self):
+        """
+        Returns:
+            list: ffmpeg output options selecting this codec.
+        """
+        args = ["-codec:a", self.codec]
+        for option, value in self.settings.items():
+            args += [f"-{option}", str(value)]
+        return args
+
+    def with_settings(self, settings):
+        """
+        Args:
+            settings (dict): ffmpeg options to add or replace, e.g.
+                {"b:a": "24k"}.
+
+        Returns:
+            AudioEncoder: Copy with the settings applied, leaving the
+                registered encoder untouched.
+        """
+        merged = dict(self.settings)
+        merged.update(settings)
+        return AudioEncoder(self.name, self.extension, self.codec, merged, self.lossless)
+
+    def __repr__(self):
+        return f"AudioEncoder({self.name}, {' '.join(self.ffmpeg_args())})"
+
+
+ENCODERS = {}
+
+
+def register_encoder(encoder):
+    """
+    Add (or replace) an output format.
+
+    Args:
+        encoder (AudioEncoder): Format to register under `encoder.name`.
+    """
+    ENCODERS[encoder.name] = encoder
+
+
+def get_encoder(encoder=None):
+    """
+    Args:
+        encoder (str | AudioEncoder | None): Registry name, an encoder
+            (returned as is) or None for DEFAULT_FORMAT.
+
+    Returns:
+        AudioEncoder: The format.
+
+    Raises:
+        ValueError: If the name is not registered.
+    """
+    if isinstance(encoder, AudioEncoder):
+        return encoder
+    name = encoder or DEFAULT_FORMAT
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown export format '{name}' (known: {', '.join(sorted(ENCODERS))})")
+    return ENCODERS[name]
+
+
+def encoder_for(filename):
+    """
+    Args:
+        filename (str): Output file.
+
+    Returns:
+        AudioEncoder: Registered format with the file's extension.
+
+    Raises:
+        ValueError: If no format uses that extension.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    for encoder in ENCODERS.values():
+        if encoder.extension == extension:
+            return encoder
+    raise ValueError(f"No export format writes '{extension}' files")
+
+
+register_encoder(AudioEncoder("mp3", ".mp3", "libmp3lame", {"b:a": MP3_BITRATE}))
+# Speech at 32 kbps; ffmpeg resamples to 48 kHz, the only rate Opus decodes to
+register_encoder(AudioEncoder("opus", ".opus", "libopus", {"b:a": "32k", "application": "voip"}))
+register_encoder(AudioEncoder("flac", ".flac", "flac", {"compression_level": 5}, lossless=True))
+
+
+def chapters_metadata(cues, rate, frames):
+    """
+    ffmpeg metadata text with one chapter per marker: a chapter starts at
+    each marker and lasts until the next one (the audio before the first
+    marker is the "Inicio" chapter).
+
+    Args:
+        cues (list): (frame, label) pairs.
+        rate (int): Sample rate of the frames.
+        frames (int): Length of the recording in frames.
+
+    Returns:
+        str: `;FFMETADATA1` file contents.
+    """
+    starts = sorted((min(max(int(frame), 0), frames), label) for frame, label in cues)
+    if not starts or starts[0][0] > 0:
+        starts.insert(0, (0, "Inicio"))
+    lines = [";FFMETADATA1"]
+    for i, (start, label) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else frames
+        if end <= start:
+            continue
+        title = re.sub(r'([=;#\\\n])', r'\\\1', label)
+        lines += ["[CHAPTER]", f"TIMEBASE=1/{rate}", f"START={start}", f"END={end}", f"title={title}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_metadata_file(text):
+    """
+    Args:
+        text (str): ffmpeg metadata.
+
+    Returns:
+        str: Temporary file holding it (the caller removes it).
+    """
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.ffmeta', delete=False) as f:
+        f.write(text)
+    return f.name
+
+
+def metadata_input_args(metadata_filename):
+    """
+    Args:
+        metadata_filename (str | None): `;FFMETADATA1` file.
+
+    Returns:
+        list: ffmpeg options adding it as the second input and taking its
+            chapters (empty without a file).
+    """
+    if not metadata_filename:
+        return []
+    return ["-f", "ffmetadata", "-i", metadata_filename, "-map", "0:a", "-map_chapters", "1"]
+
+
+def wav_chapters(filename):
+    """
+    Chapters of a WAV file's markers.
+
+    Args:
+        filename (str): WAV/RF64 file.
+
+    Returns:
+        str | None: `;FFMETADATA1` text, or None if the file has no markers.
+    """
+    try:
+        cues = read_cues(filename)
+        info = read_wav_info(filename)
+    except (ValueError, struct.error, OSError):
+        return None
+    return chapters_metadata(cues, info.rate, info.frames) if cues else None
+
+
+def no_window_flags():
+    """
+    Process creation flags that keep ffmpeg from opening a console window
+    when running from the windowed executable (Windows only).
+
+    Returns:
+        int: Flags for subprocess.Popen `creationflags`.
+    """
+    return getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+class StderrTail:
+    """
+    Reads a process's stderr pipe to EOF on a daemon thread, keeping only
+    its last bytes. A pipe nobody reads fills up (64 KiB on Linux) and
+    blocks ffmpeg, while we wait for it on stdout.
+    """
+    def __init__(self, pipe, limit=STDERR_TAIL_BYTES):
+        """
+        Start draining.
+
+        Args:
+            pipe: Binary stderr pipe of the process.
+            limit (int): Bytes kept from the end of the output.
+        """
+        self.pipe = pipe
+        self.limit = limit
+        self.total_bytes = 0
+        self._tail = bytearray()
+        self._thread = threading.Thread(target=self._drain, name="FfmpegStderr", daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        for chunk in iter(lambda: self.pipe.read1(4096), b""):
+            self.total_bytes += len(chunk)
+            self._tail += chunk
+            del self._tail[:-self.limit]
+        self.pipe.close()
+
+    def text(self, timeout=5.0):
+        """
+        Wait for the end of the output (the process has exited or is
+        exiting) and return its tail.
+
+        Args:
+            timeout (float): Maximum seconds to wait for EOF.
+
+        Returns:
+            str: Last `limit` bytes of the output, decoded and stripped.
+        """
+        self._thread.join(timeout)
+        return bytes(self._tail).decode(errors='replace').strip()
+
+
+class FfmpegStreamEncoder:
+    """
+    Long-lived ffmpeg process that encodes raw PCM written to its stdin.
+
+    Implements the `writeframes(bytes)` sink interface used by
+    FileWriterThread, so it can replace or accompany the WAV file.
+    """
+    def __init__(self, output_filename, rate, channels, sample_width=2, encoder=None, metadata=None):
+        """
+        Spawn the encoder process.
+
+        Args:
+            output_filename (str): Destination file (overwritten if present).
+            rate (int): Sample rate of the incoming PCM.
+            channels (int): Interleaved channels of the incoming PCM.
+            sample_width (int): Bytes per sample of the incoming PCM.
+            encoder (str | AudioEncoder, optional): Output format, see
+                get_encoder(). Defaults to MP3.
+            metadata (str, optional): `;FFMETADATA1` text whose chapters go
+                into the output (see chapters_metadata()).
+
+        Raises:
+            OSError: If ffmpeg cannot be started.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.output_filename = output_filename
+        self.bytes_written = 0
+        self.metadata_filename = write_metadata_file(metadata) if metadata else None
+
+        cmd = [
+            FFMPEG, "-hide_banner", "-y",
+            "-loglevel", "error",
+            "-f", PCM_FORMATS[sample_width], "-ar", str(rate), "-ac", str(channels),
+            "-i", "pipe:0",
+            *metadata_input_args(self.metadata_filename),
+            *get_encoder(encoder).ffmpeg_args(),
+            output_filename,
+        ]
+        self.logger.info(f"Start encoder: {' '.join(cmd)}")
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                creationflags=no_window_flags(),
+            )
+        except OSError:
+            self._remove_metadata()
+            raise
+        # Drained for the whole take: a warning flood must never stall the writer thread
+        self.stderr = StderrTail(self.process.stderr)
+
+    def writeframes(self, data):
+        """
+        Pipe a block of PCM bytes into the encoder.
+
+        Args:
+            data (bytes): Interleaved PCM samples.
+        """
+        self.process.stdin.write(data)
+        self.bytes_written += len(data)
+
+    def close(self, timeout=30):
+        """
+        Close stdin so ffmpeg flushes the last frames, and wait for it.
+
+        Args:
+            timeout (float): Maximum seconds to wait for ffmpeg to exit.
+
+        Returns:
+            bool: True if ffmpeg finished successfully.
+        """
+        try:
+            try:
+                self.process.stdin.close()
+            except (BrokenPipeError, ValueError) as e:
+                # stdin already broken: ffmpeg died during the take
+                self.logger.error(f"Encoder pipe error: {e}")
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.error(f"Encoder did not finish in {timeout} s, killing it")
+            self.process.kill()
+            self.process.wait()
+            return False
+        finally:
+            self._remove_metadata()
+
+        if self.process.returncode != 0:
+            self.logger.error(f"ffmpeg exited with {self.process.returncode}: {self.stderr.text()}")
+            return False
+
+        self.logger.info(f"Encoder finished {self.output_filename} ({self.bytes_written} PCM bytes)")
+        return True
+
+    def abort(self):
+        """
+        Kill the encoder and delete its partial output (the take was
+        abandoned before it started).
+        """
+        self.process.kill()
+        self.process.wait()
+        self._remove_metadata()
+        if os.path.exists(self.output_filename):
+            try:
+                os.remove(self.output_filename)
+            except OSError as e:
+                self.logger.error(f"Could not delete {self.output_filename}: {e}")
+
+    def _remove_metadata(self):
+        if self.metadata_filename:
+            try:
+                os.remove(self.metadata_filename)
+            except OSError:
+                pass
+            self.metadata_filename = None
+
+
+def wav_duration(filename):
+    """
+    Duration of a WAV file, read from its header only.
+
+    Args:
+        filename (str): Path of the WAV file.
+
+    Returns:
+        float: Duration in seconds (0.0 if the header cannot be read).
+    """
+    try:
+        return read_wav_info(filename).duration
+    except (ValueError, struct.error, OSError):
+        return 0.0
+
+
+def export_wav(input_filename, output_filename, progress_callback=None, encoder=None):
+    """
+    Convert a WAV file by streaming it through ffmpeg.
+
+    ffmpeg reads the file itself, so memory use does not depend on the
+    recording length. Progress is taken from ffmpeg's `-progress` output
+    (encoded position vs. WAV duration) and reported as a percentage. The
+    markers of the WAV file become chapters of the output.
+
+    Args:
+        input_filename (str): Source WAV file.
+        output_filename (str): Destination file (overwritten if present).
+        progress_callback (callable, optional): Called with an int 0-100.
+        encoder (str | AudioEncoder, optional): Output format; defaults to
+            the registered format of the output's extension.
+
+    Returns:
+        bool: True if ffmpeg finished successfully.
+
+    Raises:
+        ValueError: If the format is unknown.
+    """
+    logger = logging.getLogger("export_wav")
+    encoder = get_encoder(encoder) if encoder is not None else encoder_for(output_filename)
+    duration_us = wav_duration(input_filename) * 1e6
+    chapters = wav_chapters(input_filename)
+    metadata_filename = write_metadata_file(chapters) if chapters else None
+
+    cmd = [
+        FFMPEG, "-hide_banner", "-y", "-nostdin",
+        "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+        "-i", input_filename,
+        *metadata_input_args(metadata_filename),
+        *encoder.ffmpeg_args(),
+        output_filename,
+    ]
+    logger.info(f"Start export: {' '.join(cmd)}")
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            creationflags=no_window_flags(),
+        )
+        stderr = StderrTail(process.stderr)
+
+        last_percent = -1
+        for raw_line in process.stdout:
+            key, _, value = raw_line.decode(errors='replace').strip().partition('=')
+
+            # out_time_ms is also in microseconds (historic ffmpeg naming)
+            if key in ("out_time_us", "out_time_ms") and duration_us > 0:
+                try:
+                    percent = min(99, int(int(value) * 100 / duration_us))
+                except ValueError:
+                    continue
+            elif key == "progress" and value == "end":
+                percent = 100
+            else:
+                continue
+
+            if percent != last_percent and progress_callback:
+                progress_callback(percent)
+            last_percent = percent
+
+        process.wait()
+    finally:
+        if metadata_filename:
+            os.remove(metadata_filename)
+    if process.returncode != 0:
+        logger.error(f"ffmpeg exited with {process.returncode}: {stderr.text()}")
+        return False
+
+    logger.info(f"Exported {input_filename} to {output_filename}")
+    return True
+
+
+def add_chapters(filename, cues, rate, frames):
+    """
+    Put markers into an already encoded file as chapters, by remuxing it
+    (no re-encoding) into a temporary file that then replaces it.
+
+    Args:
+        filename (str): Compressed file.
+        cues (list): (frame, label) pairs.
+        rate (int): Sample rate of the frames.
+        frames (int): Length of the recording in frames.
+
+    Returns:
+        bool: True if the file now has the chapters.
+    """
+    logger = logging.getLogger("add_chapters")
+    base, extension = os.path.splitext(filename)
+    tmp_filename = f"{base}.chapters{extension}"   # ffmpeg picks the container from the extension
+    metadata_filename = write_metadata_file(chapters_metadata(cues, rate, frames))
+    cmd = [
+        FFMPEG, "-hide_banner", "-y", "-nostdin", "-loglevel", "error",
+        "-i", filename,
+        *metadata_input_args(metadata_filename),
+        "-codec", "copy",
+        tmp_filename,
+    ]
+    try:
+        process = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 creationflags=no_window_flags())
+        if process.returncode != 0:
+            logger.error(f"ffmpeg exited with {process.returncode}: "
+                         f"{process.stderr.decode(errors='replace').strip()}")
+            return False
+        os.replace(tmp_filename, filename)
+    except OSError as e:
+        logger.error(f"Could not add chapters to {filename}: {e}")
+        return False
+    finally:
+        os.remove(metadata_filename)
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+    logger.info(f"{len(cues)} chapters added to {filename}")
+    return True
+
+
+def decoded_duration(filename):
+    """
+    Decode a compressed file completely (to ffmpeg's null output) as an
+    integrity check. A truncated or corrupt file makes ffmpeg report
+    decoding errors or stop early.
+
+    Args:
+        filename (str): MP3 (or any format ffmpeg reads).
+
+    Returns:
+        float | None: Seconds of audio decoded, or None if ffmpeg reported
+            an error.
+    """
+    logger = logging.getLogger("decoded_duration")
+    cmd = [
+        FFMPEG, "-hide_banner", "-nostdin",
+        "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+        "-i", filename,
+        "-f", "null", "-",
+    ]
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        creationflags=no_window_flags(),
+    )
+    stderr_tail = StderrTail(process.stderr)
+    out_time_us = 0
+    for raw_line in process.stdout:
+        key, _, value = raw_line.decode(errors='replace').strip().partition('=')
+        if key in ("out_time_us", "out_time_ms"):
+            try:
+                out_time_us = max(out_time_us, int(value))
+            except ValueError:
+                continue
+
+    process.wait()
+    stderr = stderr_tail.text()
+    if process.returncode != 0 or stderr:
+        logger.error(f"{filename} does not decode cleanly ({process.returncode}): {stderr}")
+        return None
+    return out_time_us / 1e6
+
+
+def verify_export(input_filename, output_filename, tolerance=0.5):
+    """
+    Check that a conversion is complete before its source is deleted: the
+    output decodes without errors and lasts as long as the WAV file.
+
+    Args:
+        input_filename (str): Source WAV file.
+        output_filename (str): Converted file.
+        tolerance (float): Allowed difference in seconds (encoder padding).
+
+    Returns:
+        bool: True if the output can replace the source.
+    """
+    expected = wav_duration(input_filename)
+    if not os.path.exists(output_filename) or not os.path.getsize(output_filename):
+        return False
+    decoded = decoded_duration(output_filename)
+    if decoded is None:
+        return False
+    if abs(decoded - expected) > tolerance:
+        logging.getLogger("verify_export").error(
+            f"{output_filename} lasts {decoded:.2f} s, {input_filename} lasts {expected:.2f} s")
+        return False
+    return True
@@ -0,0 +1,1355 @@
+"""
+Recorder Engine
+===============
+
+Description:
+    GUI-free audio capture and recording engine.
+
+    Owns the capture stream (through a pluggable audio backend, see
+    backends.py), the recording state machine
+    (idle -> monitoring -> recording <-> pause_rec -> monitoring, and
+    idle -> multitrack -> idle for several devices at once), the
+    output files, the streaming encoder and the background export queue.
+    The wx GUI (grabadora.py) and the command line (grabadora_cli.py) are
+    thin clients on top of it. This module must never import wx, so it can
+    run on servers without a display.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+import datetime
+import threading
+import subprocess
+from pathlib import Path
+from time import perf_counter
+
+from filenames import default_audio_dir, timestamp_filename, is_valid_windows_filename  # noqa: F401 (re-exported)
+from backends import PyAudioBackend, CONTINUE
+from devices import DeviceManager
+from ringbuffer import AudioRingBuffer, PrerollBuffer
+from filewriter import FileWriterThread, TeeSink
+from encoders import FFMPEG, FfmpegStreamEncoder, get_encoder
+from wavio import CrashSafeWavWriter
+from segments import SegmentedWavSink
+from multitrack import MultiTrackSession
+from export_queue import ExportQueue
+from peaks import PeakIndexWriter, peaks_filename
+from analyzer import LiveAnalyzer
+from dsp import GainKernel, LevelMeter, FormatConverter, VoiceGate, LoudnessMeter
+from instrumentation import CallbackStats, write_session_summary
+
+# Stream parameters. RATE and CHANNELS are the format of the recorded files; with
+# NATIVE_CAPTURE the device is opened at its own rate and channel count and the
+# writer thread converts, so neither PortAudio nor the driver resamples or downmixes.
+SAMPLE_WIDTH = 2  # int16
+CHANNELS = 1
+RATE = 44100
+NATIVE_CAPTURE = True
+MAX_CAPTURE_CHANNELS = 8
+CHUNK = 1024
+GAIN = 2.0
+RING_SECONDS = 10  # Audio the writer thread may fall behind before overruns
+
+# Recording mode: encode while recording (needs ffmpeg); WAV becomes an optional safety copy
+STREAM_ENCODE = True
+KEEP_WAV_COPY = False
+
+# Compressed format of the takes: "mp3", "opus" (speech, smallest) or "flac" (lossless), see encoders.py
+EXPORT_FORMAT = "mp3"
+
+# Loudness normalization of the exported files: target in LUFS (e.g. normalize.TARGET_LUFS), None = off.
+# Takes are measured while recording and normalized by the export job (no streaming encode then).
+NORMALIZE_LUFS = None
+
+# Background WAV -> compressed conversions running at the same time
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Seconds between two WAV header commits: at most this much audio is lost if the process dies
+WAV_COMMIT_SECONDS = 5.0
+
+# Pre-roll: seconds of monitored audio kept and prepended to the next take (0 = off)
+PREROLL_SECONDS = 10.0
+PREROLL_MARGIN_SECONDS = 1.0  # Extra history so the copy at record start never races the callback
+
+# Automatic pause: silent parts of a take are not written (the stream keeps running)
+AUTO_PAUSE = False
+VAD_THRESHOLD_DB = -45.0    # RMS level (dBFS, after the gain) that counts as voice
+VAD_ATTACK_MS = 30.0        # Voice needed to resume
+VAD_HANGOVER_MS = 1500.0    # Silence needed to pause
+VAD_LOOKBACK_MS = 300.0     # Audio kept before each resume
+
+# Rollover: cut takes into WAV segments of this many minutes, exported while recording (0 = one file)
+SEGMENT_MINUTES = 0
+
+# Seconds between two hot-plug checks while idle (0 = never re-enumerate)
+DEVICE_POLL_SECONDS = 5.0
+
+# Live waveform/spectrum analysis while monitoring (read by the GUI display)
+LIVE_VIEW = True
+LIVE_VIEW_FPS = 25.0
+
+# Build the waveform peak index (<recording>.peaks) while recording
+WRITE_PEAK_INDEX = True
+
+# Save callback/writer statistics as <recording>.stats.json after each take
+WRITE_SESSION_SUMMARY = True
+
+
+def check_ffmpeg_installed(cache_file=None):
+    """
+    Check whether FFmpeg is installed and accessible in the system PATH.
+
+    The executable is first looked up in PATH (no process started). If it is
+    found, `ffmpeg -version` is run once and the result is cached in
+    `cache_file`, keyed by the executable's path, size and modification
+    time, so later launches skip the subprocess until ffmpeg changes.
+
+    Args:
+        cache_file (str, optional): JSON file holding the cached result.
+
+    Returns:
+        bool: True if FFmpeg is installed and executable, False otherwise.
+    """
+    executable = shutil.which(FFMPEG)
+    if executable is None:
+        return False
+
+    try:
+        st = os.stat(executable)
+        key = f"{executable}|{st.st_size}|{st.st_mtime_ns}"
+    except OSError:
+        return False
+
+    if cache_file:
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return bool(cached.get("ok"))
+        except (OSError, ValueError):
+            pass
+
+    try:
+        # Try to run 'ffmpeg -version' to check if it's installed
+        subprocess.run([executable, '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        logging.info("ffmpeg instalado correctamente")
+        ok = True
+    except (subprocess.CalledProcessError, OSError):
+        # Return False if ffmpeg is either not installed or fails to run
+        ok = False
+
+    if cache_file:
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump({"key": key, "ok": ok}, f)
+        except OSError:
+            pass
+    return ok
+
+
+class RecorderEngine:
+    """
+    Headless recorder: capture stream, state machine and output files.
+
+    States (`state_fsm`):
+        idle        No stream open.
+        monitoring  Capture stream running, nothing written.
+        recording   Processed blocks go to the output file(s).
+        pause_rec   Recording open but blocks are dropped.
+        multitrack  Several input devices recorded at once (see multitrack.py).
+        error       A transition failed; the client decides how to recover.
+
+    All methods are called from one control thread (the wx main loop or
+    the CLI); only the audio callback and the writer/export threads run
+    concurrently, and they communicate through lock-free buffers.
+    """
+    def __init__(self, output_dir, export=None, on_export_update=None, backend=None, chunk=CHUNK,
+                 background_probe=False, on_ready=None):
+        """
+        Initialize the audio backend, probe the default devices and, when
+        ffmpeg is available, start the background export queue.
+
+        The probing (ffmpeg subprocess, PortAudio initialization and device
+        enumeration) can take a second or more. With `background_probe` it
+        runs on a thread and the constructor returns at once; the engine is
+        usable once `ready` is set (see wait_ready()).
+
+        Args:
+            output_dir (str | Path): Folder where recordings are written.
+            export (bool, optional): Force compressed export on/off. Defaults to
+                whether ffmpeg is installed.
+            on_export_update (callable, optional): Called with a job dict
+                whenever a background conversion changes. Runs on a worker
+                thread.
+            backend (AudioBackend, optional): Audio I/O. Defaults to the real
+                sound card (PyAudioBackend); tests pass a SimulatedBackend.
+            chunk (int): Frames per callback block.
+            background_probe (bool): Probe ffmpeg and the devices on a
+                background thread.
+            on_ready (callable, optional): Called with the engine when the
+                probe has finished (successfully or not). Runs on the probe
+                thread when `background_probe` is set.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info("Starting RecorderEngine")
+        t0 = perf_counter()
+
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        self.chunk = chunk
+        self.audioCallback = AudioCallback(self)
+
+        # Single capture stream: feeds the monitor output, the recorder and the meters
+        self.capture_stream = None
+        self.playback = True
+        self.capture_rate = RATE          # Format of the open capture stream
+        self.capture_channels = CHANNELS
+
+        # File handling
+        self.output_wavefile = None
+        self.output_filename = ""
+        self.record_buffer = None   # Ring buffer filled by the record tap
+        self.record_switch = None   # (capture frame, paused) of the last pause/resume, applied by the record tap
+        self.record_frames = 0      # Capture frames the record tap handed to the ring in this take
+        self.pause_marks = []       # record_frames at each pause that was resumed (one cue each)
+        self.file_writer = None     # Thread draining record_buffer to the output sinks
+        self.stream_encoder = None  # ffmpeg process encoding while recording
+        self.export_format = EXPORT_FORMAT  # Registered encoder of the next takes (see encoders.py)
+        self.export_filename = None # Compressed file of the current take
+        self.normalize_lufs = NORMALIZE_LUFS  # Loudness target of the next exports (None = off)
+        self.loudness_meter = None  # LoudnessMeter of the current take (runs on the writer thread)
+        self.take_started = None
+        self.sink_wrapper = None    # Optional callable wrapping the output sink (e.g. SlowDiskSink)
+        self.segment_minutes = SEGMENT_MINUTES  # Rollover length for the next take (0 = off)
+        self.segment_sink = None    # SegmentedWavSink of the current take in rollover mode
+        self.peak_index = None      # PeakIndexWriter of the current take
+        self.live_view = LIVE_VIEW  # Run the live analyzer in the next monitoring session
+        self.analyzer = None        # LiveAnalyzer while monitoring, fed by scope_tap
+        self.multitrack = None      # MultiTrackSession while in the multitrack state
+        self.preroll_seconds = PREROLL_SECONDS  # Pre-roll of the next monitoring session (0 = off)
+        self.preroll_buffer = None  # History filled by the pre-roll tap while monitoring
+        self.preroll_floor = 0      # Pre-roll position where the last take ended (never recorded twice)
+        self.record_start_frame = None  # Pre-roll position of the first recorded frame
+        self.preroll_recorded = 0.0 # Seconds of pre-roll at the head of the current take
+        self.auto_pause = AUTO_PAUSE  # Silence gate for the next take
+        self.vad_threshold_db = VAD_THRESHOLD_DB
+        self.voice_gate = None      # VoiceGate of the current take (runs on the writer thread)
+
+        # FSM and gain
+        self.state_fsm = "idle"
+        self.current_gain = GAIN
+
+        # Devices info. Devices are selected by identity key (see devices.py); None = default device
+        self.devices = None         # DeviceManager, created by the probe
+        self.input_device = None
+        self.output_device = None
+        self.on_devices_changed = None  # Optional callable(added, removed), runs on the watcher thread
+        self.input_channels = None
+        self.output_channels = None
+        self.input_rate = None
+        self.output_rate = None
+
+        # Elapsed recording time
+        self.start_time = None  # When the timer was last started
+        self.rec_elapsed = 0.0  # Total elapsed time before last pause
+        self.timer_running = False
+
+        # Filled by _probe(), possibly on a background thread
+        self.export = False
+        self.export_queue = None
+        self.backend = backend
+        self.ready = threading.Event()
+        self.probe_error = None
+        self.startup_timings = {}   # Milliseconds spent in each startup step
+
+        self.startup_timings["init_ms"] = round((perf_counter() - t0) * 1000, 1)
+        probe_args = (export, on_export_update, on_ready)
+        if background_probe:
+            threading.Thread(target=self._probe, args=probe_args, name="EngineProbe", daemon=True).start()
+        else:
+            self._probe(*probe_args)
+            if self.probe_error is not None:
+                raise self.probe_error
+
+    def _probe(self, export, on_export_update, on_ready):
+        """
+        Slow part of the initialization: ffmpeg check, export queue, audio
+        backend and device enumeration. Sets `ready` when done; a failure is
+        kept in `probe_error`.
+        """
+        timings = self.startup_timings
+        try:
+            t0 = perf_counter()
+            cache_file = os.path.join(self.output_dir, 'ffmpeg_probe.json')
+            self.export = check_ffmpeg_installed(cache_file) if export is None else export
+            timings["ffmpeg_probe_ms"] = round((perf_counter() - t0) * 1000, 1)
+
+            if self.export:
+                # Resumes conversions left unfinished by a previous session
+                self.export_queue = ExportQueue(
+                    os.path.join(self.output_dir, 'export_queue.json'),
+                    workers=EXPORT_WORKERS,
+                    on_update=on_export_update
+                )
+
+            t0 = perf_counter()
+            if self.backend is None:
+                self.backend = PyAudioBackend()
+            timings["backend_init_ms"] = round((perf_counter() - t0) * 1000, 1)
+
+            t0 = perf_counter()
+            self.devices = DeviceManager(self.backend, os.path.join(self.output_dir, 'device_cache.json'),
+                                         sample_width=SAMPLE_WIDTH)
+            self.probe_devices()
+            if DEVICE_POLL_SECONDS:
+                self.devices.start_watch(DEVICE_POLL_SECONDS, self._can_refresh_devices,
+                                         self._devices_changed)
+            timings["device_probe_ms"] = round((perf_counter() - t0) * 1000, 1)
+            self.logger.info(f"Startup timings: {timings}")
+
+        except Exception as e:
+            self.logger.error(f"Engine probe failed: {e}", exc_info=True)
+            self.probe_error = e
+
+        self.ready.set()
+        if on_ready is not None:
+            on_ready(self)
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait for the startup probe.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait.
+
+        Returns:
+            bool: True if the engine is ready to use.
+
+        Raises:
+            OSError: If the probe failed (e.g. no audio device).
+        """
+        if not self.ready.wait(timeout):
+            return False
+        if self.probe_error is not None:
+            raise OSError(f"Audio initialization failed: {self.probe_error}")
+        return True
+
+    def probe_devices(self):
+        """
+        Read the default input/output device capabilities and list every
+        device PortAudio knows about (capabilities come from the device
+        cache when possible).
+        """
+        input_device = self.backend.default_input_info()
+        output_device = self.backend.default_output_info()
+        self.input_channels = input_device['maxInputChannels']
+        self.output_channels = output_device['maxOutputChannels']
+        self.input_rate = int(input_device['defaultSampleRate'])
+        self.output_rate = int(output_device['defaultSampleRate'])
+        self.logger.info(f"Default Input: {self.input_channels} channels at {self.input_rate} Hz")
+        self.logger.info(f"Default Output: {self.output_channels} channels at {self.output_rate} Hz")
+
+        # List all audio devices and their information
+        for device in self.devices.scan():
+            self.logger.debug(f"Device {device['index']}: {device['name']} ({device['host_api']})")
+            self.logger.debug(f"  Input Channels: {device['max_input_channels']} at {device['input_rates']} Hz")
+            self.logger.debug(f"  Output Channels: {device['max_output_channels']} at {device['output_rates']} Hz")
+
+    def _can_refresh_devices(self):
+        """
+        The watcher may re-initialize the backend only without an open stream.
+        """
+        return self.capture_stream is None and self.state_fsm == "idle"
+
+    def _devices_changed(self, added, removed):
+        """
+        Hot-plug notification from the DeviceManager watcher.
+        """
+        for key in (self.input_device, self.output_device):
+            if key in removed:
+                self.logger.warning(f"Selected device disconnected: {key}")
+        if self.on_devices_changed is not None:
+            self.on_devices_changed(added, removed)
+
+    def select_devices(self, input_device=None, output_device=None):
+        """
+        Choose the devices used by the next start_monitor(). PortAudio is
+        not re-initialized.
+
+        Args:
+            input_device (str, optional): Input device key; None = default.
+            output_device (str, optional): Output device key; None = default.
+
+        Raises:
+            ValueError: If not idle, or a device is unknown or has no
+                channels in the needed direction.
+        """
+        if self.state_fsm != "idle":
+            raise ValueError("Invalid state")
+        self.wait_ready()
+        if input_device is not None:
+            self._resolve_device(input_device, "max_input_channels")
+        if output_device is not None:
+            self._resolve_device(output_device, "max_output_channels")
+        self.input_device = input_device
+        self.output_device = output_device
+        self.logger.info(f"Selected devices: input={input_device}, output={output_device}")
+
+    def _resolve_device(self, key, channels_field):
+        """
+        Returns:
+            dict: The connected device with this key.
+
+        Raises:
+            ValueError: If it is not connected or lacks channels.
+        """
+        device = self.devices.find(key)
+        if device is None:
+            raise ValueError(f"El dispositivo no está conectado: {key.split('|')[1]}")
+        if device[channels_field] < CHANNELS:
+            raise ValueError(f"El dispositivo no tiene canales suficientes: {device['name']}")
+        return device
+
+    def capture_format(self, playback):
+        """
+        Rate and channel count to open the input device with.
+
+        With NATIVE_CAPTURE this is the device's default rate and channel
+        count (up to MAX_CAPTURE_CHANNELS, and no more than the output has
+        when playing back, since a duplex stream uses one channel count).
+
+        Returns:
+            tuple: (rate, channels)
+        """
+        if not NATIVE_CAPTURE:
+            return RATE, CHANNELS
+
+        rate, channels = self.input_rate, self.input_channels
+        if self.input_device is not None:
+            device = self._resolve_device(self.input_device, "max_input_channels")
+            rate, channels = device["default_rate"], device["max_input_channels"]
+        channels = min(channels, MAX_CAPTURE_CHANNELS)
+
+        if playback:
+            output_channels = self.output_channels
+            if self.output_device is not None:
+                output_channels = self._resolve_device(self.output_device, "max_output_channels")["max_output_channels"]
+            channels = min(channels, output_channels)
+        return int(rate), max(1, channels)
+
+    def start_monitor(self, playback=True):
+        """
+        Open the capture stream: idle -> monitoring.
+
+        Args:
+            playback (bool): Play the processed input on the default output
+                (headset monitoring). Use False on machines without an
+                output device.
+
+        Raises:
+            ValueError: If not idle, or the selected device is not connected.
+            OSError: If audio initialization failed or the stream cannot be opened.
+        """
+        if self.state_fsm != "idle":
+            raise ValueError("Invalid state")
+        self.wait_ready()
+
+        self.logger.info("Open capture stream for monitoring")
+        self.playback = playback
+        with self.devices.lock:  # No device refresh while the stream opens
+            input_index = output_index = None
+            if self.input_device is not None:
+                input_index = self._resolve_device(self.input_device, "max_input_channels")["index"]
+            if self.output_device is not None and playback:
+                output_index = self._resolve_device(self.output_device, "max_output_channels")["index"]
+            self.capture_rate, self.capture_channels = self.capture_format(playback)
+            self.logger.info(f"Capture format: {self.capture_channels} channels at {self.capture_rate} Hz")
+            self.audioCallback.configure(self.capture_rate, self.capture_channels)
+            self.capture_stream = self.backend.open_stream(
+                rate=self.capture_rate,
+                channels=self.capture_channels,
+                frames_per_buffer=self.chunk,
+                input=True,
+                output=playback,
+                callback=self.audioCallback.capture_callback,
+                sample_width=SAMPLE_WIDTH,
+                input_device_index=input_index,
+                output_device_index=output_index
+            )
+
+        self.current_gain = GAIN  # reset the gain
+        self.audioCallback.meter.reset()
+        self.preroll_buffer = None
+        self.preroll_floor = 0
+        if self.preroll_seconds > 0:
+            capacity = int(self.capture_rate * (self.preroll_seconds + PREROLL_MARGIN_SECONDS))
+            self.preroll_buffer = PrerollBuffer(capacity, self.capture_channels)
+            self.audioCallback.add_tap(self.preroll_tap)
+        if self.live_view:
+            self.analyzer = LiveAnalyzer(self.capture_rate, fps=LIVE_VIEW_FPS)
+            self.analyzer.start()
+            self.audioCallback.add_tap(self.scope_tap)
+        self.capture_stream.start_stream()
+        self.state_fsm = "monitoring"
+
+    def stop_monitor(self):
+        """
+        Close the capture stream: monitoring -> idle.
+
+        Raises:
+            ValueError: If not monitoring.
+        """
+        if self.state_fsm != "monitoring":
+            raise ValueError("Invalid state")
+
+        self.logger.info("Stop monitoring")
+        if self.capture_stream:
+            self.capture_stream.stop_stream()
+            self.capture_stream.close()
+            self.capture_stream = None
+        self.audioCallback.remove_tap(self.preroll_tap)
+        self.audioCallback.remove_tap(self.scope_tap)
+        self.preroll_buffer = None
+        if self.analyzer is not None:
+            self.analyzer.stop()
+            self.analyzer = None
+        self.state_fsm = "idle"
+
+    def start_recording(self, filename):
+        """
+        Start a new take: monitoring -> recording.
+
+        Opens the output sinks (streaming encoder and/or WAV file, or
+        rolling WAV segments when `segment_minutes` is set), attaches the
+        record tap to the running capture stream and starts the writer
+        thread. Up to `preroll_seconds` of the audio monitored before the
+        call are written first, joined to the live audio without a gap.
+        With `auto_pause` the silent parts are left out of the file. With
+        `normalize_lufs` the take is measured while it is written and its
+        export is normalized afterwards (it is not stream-encoded).
+
+        Args:
+            filename (str): File name without path; '.wav' is appended if missing.
+
+        Returns:
+            str: Full path of the WAV file of this take, or of the segment
+                manifest in rollover mode.
+
+        Raises:
+            ValueError: If not monitoring or the filename is invalid.
+            OSError: If the output file cannot be created.
+        """
+        if self.state_fsm != "monitoring":
+            raise ValueError("Invalid state")
+
+        is_valid_filename, error_msg = is_valid_windows_filename(filename)
+        if not is_valid_filename:
+            raise ValueError(error_msg)
+
+        self.logger.info("Start recording")
+        if not filename.endswith('.wav'):
+            filename += '.wav'
+        self.output_filename = os.path.join(self.output_dir, filename)
+        try:
+            sinks = self._open_sinks()
+
+            # The callback only copies into the ring; the writer thread does the disk I/O
+            self.record_buffer = AudioRingBuffer(self.capture_rate * RING_SECONDS, self.capture_channels)
+            sink = sinks[0] if len(sinks) == 1 else TeeSink(sinks)
+            if self.sink_wrapper is not None:
+                sink = self.sink_wrapper(sink)
+            converter = None
+            if (self.capture_rate, self.capture_channels) != (RATE, CHANNELS):
+                # Mixdown/resampling to the file format happens on the writer thread
+                converter = FormatConverter(self.capture_rate, self.capture_channels, RATE, CHANNELS)
+
+            # Attach the recorder to the running capture stream (no second stream).
+            # The ring holds the live audio while the pre-roll is taken.
+            self.logger.info("Attach record tap to capture stream")
+            self.record_switch = None
+            self.record_frames = 0
+            self.pause_marks = []
+            self.record_start_frame = None
+            self.audioCallback.add_tap(self.record_tap)
+            preroll = self._take_preroll()
+
+            self.logger.info("Start writer thread")
+            self.voice_gate = None
+            if self.auto_pause:
+                self.voice_gate = VoiceGate(RATE, CHANNELS, threshold_db=self.vad_threshold_db, attack_ms=VAD_ATTACK_MS,
+                                            hangover_ms=VAD_HANGOVER_MS, lookback_ms=VAD_LOOKBACK_MS)
+            self.file_writer = FileWriterThread(self.record_buffer, sink, converter=converter, head=preroll,
+                                                gate=self.voice_gate)
+            self.file_writer.start()
+        except Exception:
+            self.logger.error("Could not start the take, discarding its outputs")
+            self.audioCallback.remove_tap(self.record_tap)
+            self.file_writer = None
+            self.record_buffer = None
+            self.voice_gate = None
+            self._discard_sinks()
+            raise
+
+        # start elapsed time counter; the pre-roll counts as recorded time
+        self.preroll_recorded = preroll.shape[0] / float(self.capture_rate) if preroll is not None else 0.0
+        self.rec_elapsed = self.preroll_recorded
+        self.start_time = time.monotonic()
+        self.timer_running = True
+
+        # Callback statistics are per take, for the session summary
+        self.audioCallback.stats.reset()
+        self.take_started = datetime.datetime.now().isoformat(timespec='seconds')
+
+        self.state_fsm = "recording"
+        if self.segment_sink is not None:
+            return self.segment_sink.manifest_filename
+        return self.output_filename
+
+    def _open_sinks(self):
+        """
+        Open the outputs of a new take, in the order the writer feeds them.
+        On an error the ones already open are left in their attributes for
+        _discard_sinks().
+
+        Returns:
+            list: Sinks of the take.
+
+        Raises:
+            OSError: If an output file cannot be created.
+        """
+        sample_width = SAMPLE_WIDTH
+        sinks = []
+
+        encoder = get_encoder(self.export_format)
+        self.export_filename = None
+        if self.segment_minutes > 0:
+            # Each finished segment is queued for export while recording goes on
+            base, _ = self.output_filename.rsplit('.', 1)
+            self.logger.info(f"Rollover recording every {self.segment_minutes} min")
+            self.segment_sink = SegmentedWavSink(base, RATE, CHANNELS, sample_width,
+                                                 int(self.segment_minutes * 60 * RATE),
+                                                 on_segment=self.export_segment,
+                                                 commit_interval=WAV_COMMIT_SECONDS,
+                                                 export_extension=encoder.extension,
+                                                 cue_source=self._pause_cues)
+            sinks.append(self.segment_sink)
+
+        elif self.export and STREAM_ENCODE and self.normalize_lufs is None:
+            base, _ = self.output_filename.rsplit('.', 1)
+            self.export_filename = f"{base}{encoder.extension}"
+            self.logger.info(f"Start streaming encoder to {self.export_filename}")
+            try:
+                self.stream_encoder = FfmpegStreamEncoder(self.export_filename, RATE, CHANNELS, sample_width,
+                                                          encoder=encoder)
+                sinks.append(self.stream_encoder)
+            except OSError as e:
+                # Fall back to WAV + conversion after the take
+                self.logger.error(f"Could not start streaming encoder: {e}")
+                self.stream_encoder = None
+
+        if self.segment_sink is None and (self.stream_encoder is None or KEEP_WAV_COPY):
+            self.logger.info("Open output_wavefile")
+            self.output_wavefile = CrashSafeWavWriter(self.output_filename, CHANNELS, sample_width, RATE,
+                                                      commit_interval=WAV_COMMIT_SECONDS)
+            sinks.append(self.output_wavefile)
+
+        if WRITE_PEAK_INDEX:
+            # Waveform overview of the take, built from the same blocks as the file
+            self.peak_index = PeakIndexWriter(peaks_filename(self.output_filename), CHANNELS, RATE, sample_width)
+            sinks.append(self.peak_index)
+
+        self.loudness_meter = None
+        if self.normalize_lufs is not None:
+            if self.segment_sink is not None:
+                self.logger.info("Rollover segments are exported without loudness normalization")
+            else:
+                # Pass 1 of the normalization, done on the blocks written to the file
+                self.loudness_meter = LoudnessMeter(RATE, CHANNELS)
+                sinks.append(self.loudness_meter)
+        return sinks
+
+    def _discard_sinks(self):
+        """
+        Abandon the outputs of a take that failed to start: the encoder is
+        killed and the files already created are deleted, so nothing is
+        left running or announced for export.
+        """
+        if self.segment_sink is not None:
+            self.segment_sink.abort()
+            self.segment_sink = None
+        if self.stream_encoder is not None:
+            self.stream_encoder.abort()
+            self.stream_encoder = None
+        if self.output_wavefile is not None:
+            self.output_wavefile.close()
+            self.output_wavefile = None
+            try:
+                os.remove(self.output_filename)
+            except OSError as e:
+                self.logger.error(f"Could not delete {self.output_filename}: {e}")
+        # Both only write on close()
+        self.peak_index = None
+        self.loudness_meter = None
+
+    def _pause_cues(self):
+        """
+        Position in the file of every cut of the take: manual pauses and
+        the openings of the silence gate.
+
+        The record tap notes manual pauses in capture frames of the live
+        audio; they are moved past the pre-roll, through the format
+        conversion and through the silence gate.
+
+        Returns:
+            list: (file frame, label) pairs in file order.
+        """
+        gate = self.voice_gate
+        preroll_frames = int(round(self.preroll_recorded * self.capture_rate))
+        cues = []
+        for number, frame in enumerate(self.pause_marks, 1):
+            file_frame = -(-(preroll_frames + frame) * RATE // self.capture_rate)  # FormatConverter timing
+            if gate is not None:
+                file_frame = gate.output_frame(file_frame)
+            cues.append((file_frame, f"Pausa {number}"))
+        if gate is not None:
+            manual = {frame for frame, _ in cues}
+            cues.extend((frame, "Pausa automática") for frame, _ in gate.resumes
+                        if frame > 0 and frame not in manual)
+        return sorted(cues)
+
+    def _take_preroll(self):
+        """
+        Copy the pre-roll that ends exactly where the record tap started.
+
+        The record tap notes the pre-roll position of its first block (the
+        pre-roll tap runs first in the same callback), so the history and
+        the live audio join without a gap or an overlap.
+
+        Returns:
+            np.ndarray | None: (frames, channels) capture-format block, or
+                None without pre-roll.
+        """
+        preroll = self.preroll_buffer
+        if preroll is None:
+            return None
+
+        deadline = time.monotonic() + max(0.5, 10 * self.chunk / self.capture_rate)
+        while self.record_start_frame is None:
+            if time.monotonic() > deadline:
+                # No callback arrived (stream stalled): record without pre-roll
+                self.logger.warning("No audio block for the pre-roll handoff; recording without pre-roll")
+                return None
+            time.sleep(0.002)
+
+        end = self.record_start_frame
+        start = max(end - int(self.preroll_seconds * self.capture_rate), self.preroll_floor)
+        block, start = preroll.read_range(start, end)
+        self.logger.info(f"Pre-roll: {block.shape[0] / float(self.capture_rate):.2f} s")
+        return block
+
+    def preroll_tap(self, block):
+        """
+        Capture tap that keeps the monitoring history for the pre-roll.
+
+        Runs on the PortAudio callback thread; always registered before the
+        record tap, so it sees each block first.
+
+        Args:
+            block (np.ndarray): Processed int16 samples in the capture format (read-only).
+        """
+        preroll = self.preroll_buffer
+        if preroll is not None:
+            preroll.write(block)
+
+    def scope_tap(self, block):
+        """
+        Capture tap that feeds the live analyzer with the first channel.
+
+        Runs on the PortAudio callback thread: one strided copy into the
+        analyzer's ring buffer; the analysis runs on the analyzer thread.
+
+        Args:
+            block (np.ndarray): Processed int16 samples in the capture format (read-only).
+        """
+        analyzer = self.analyzer
+        if analyzer is not None:
+            analyzer.ring.write(block[::self.capture_channels])  # Dropped if the analyzer fell behind
+
+    def live_snapshot(self):
+        """
+        Latest live analysis for the display.
+
+        Returns:
+            dict | None: See LiveAnalyzer.snapshot; None when not monitoring
+                or before the first batch.
+        """
+        analyzer = self.analyzer
+        return analyzer.snapshot if analyzer is not None else None
+
+    def capture_frame_now(self):
+        """
+        Capture frame being sampled right now, from the ADC time of the last
+        block. Never earlier than the frames already handed to the taps.
+
+        Returns:
+            int: Position in the capture stream, in frames.
+        """
+        callback = self.audioCallback
+        clock = callback.clock
+        if clock is None:
+            return callback.frames_captured
+        frame, sampled_at = clock
+        now = frame + int(round((time.perf_counter() - sampled_at) * self.capture_rate))
+        return max(now, callback.frames_captured)
+
+    def pause_recording(self):
+        """
+        recording -> pause_rec.
+
+        The stream keeps running: the record tap stops writing at the exact
+        frame being sampled when this is called, in the middle of a block
+        if needed.
+
+        Raises:
+            ValueError: If not recording.
+        """
+        if self.state_fsm != "recording":
+            raise ValueError("Invalid state")
+
+        self.record_switch = (self.capture_frame_now(), True)
+        self.logger.info(f"Pause recording at capture frame {self.record_switch[0]}")
+
+        if self.timer_running:
+            # Add the time from last start to now
+            self.rec_elapsed += time.monotonic() - self.start_time
+            self.timer_running = False
+
+        self.state_fsm = "pause_rec"
+
+    def resume_recording(self):
+        """
+        pause_rec -> recording, from the frame being sampled now (the first
+        words are in the next block). The cut is marked with a cue in the
+        WAV file.
+
+        Raises:
+            ValueError: If not paused.
+        """
+        if self.state_fsm != "pause_rec":
+            raise ValueError("Invalid state")
+
+        switch = self.record_switch
+        if switch[0] >= self.audioCallback.frames_captured:
+            # Resumed before the pause point reached the tap: nothing was left out
+            self.record_switch = None
+        else:
+            # The pause was applied, so record_frames is where the take was cut
+            self.pause_marks.append(self.record_frames)
+            self.record_switch = (self.capture_frame_now(), False)
+        self.logger.info(f"Resume recording at capture frame {self.audioCallback.frames_captured}")
+
+        # start elapsed time counter
+        self.start_time = time.monotonic()
+        self.timer_running = True
+
+        self.state_fsm = "recording"
+
+    def stop_recording(self):
+        """
+        Finish the take: recording/pause_rec -> monitoring.
+
+        Detaches the recorder, drains the writer, closes the output files and
+        lets the streaming encoder finish. If the compressed file was not produced while
+        recording, a conversion job is queued in the background; if it was and
+        the take has markers, a background job adds them as chapters. In
+        rollover mode only the last segment is left to convert.
+
+        Returns:
+            dict: wav (path or None if not kept), export (compressed file
+                in `export_format`, or None), streamed (encoded while
+                recording), job (queued export or chapters
+                job or None), jobs (ids of every export job of this take),
+                segments (manifest path or None), peaks (waveform peak
+                index or None), cues ((frame, label) of every pause point
+                in the file), loudness (measurement of the take when
+                `normalize_lufs` is set, else None), writer (writer thread statistics), summary
+                (path of the session statistics JSON or None).
+
+        Raises:
+            ValueError: If not recording or paused.
+        """
+        if self.state_fsm not in ["recording", "pause_rec"]:
+            raise ValueError("Invalid state")
+
+        self.logger.info("close wavefile")
+        # Detach the recorder; the capture stream keeps running for monitoring
+        self.audioCallback.remove_tap(self.record_tap)
+        # A callback already running may still hold the tap: let it finish its block
+        time.sleep(2 * self.chunk / self.capture_rate)
+        if self.preroll_buffer is not None:
+            self.preroll_floor = self.preroll_buffer.frames_written  # The next pre-roll starts here
+
+        # Drain what is left in the ring buffer before closing the file
+        writer_stats = None
+        if self.file_writer:
+            self.file_writer.stop()
+            writer_stats = self.file_writer.stats()
+            self.logger.info(f"Writer stats: {writer_stats}")
+            self.file_writer = None
+            self.record_buffer = None
+        cues = self._pause_cues()
+
+        # Close WAV file, with the pause points as markers
+        if self.output_wavefile:
+            for frame, label in cues:
+                self.output_wavefile.add_cue(frame, label)
+            self.output_wavefile.close()
+            self.output_wavefile = None
+
+        peaks = None
+        if self.peak_index:
+            self.peak_index.close()
+            peaks = self.peak_index.filename if os.path.exists(self.peak_index.filename) else None
+            self.peak_index = None
+
+        loudness = None
+        if self.loudness_meter:
+            loudness = self.loudness_meter.close()
+            self.logger.info(f"Loudness: {loudness}")
+            self.loudness_meter = None
+
+        # The last segment is announced (and queued) on close, like the others
+        segments_filename = None
+        segment_jobs = []
+        if self.segment_sink:
+            self.segment_sink.close()
+            segments_filename = self.segment_sink.manifest_filename
+            segment_jobs = [entry["job"] for entry in self.segment_sink.manifest["segments"] if entry["job"]]
+            self.segment_sink = None
+        self.voice_gate = None
+
+        # Let ffmpeg flush the last frames; the file is complete once it exits
+        streamed_ok = False
+        streamed_frames = 0
+        if self.stream_encoder:
+            self.logger.info("close streaming encoder")
+            streamed_ok = self.stream_encoder.close()
+            streamed_frames = self.stream_encoder.bytes_written // (CHANNELS * SAMPLE_WIDTH)
+            self.stream_encoder = None
+
+        # Close the elapsed time counter
+        if self.timer_running:
+            # Add the time from last start to now
+            self.rec_elapsed += time.monotonic() - self.start_time
+            self.timer_running = False
+
+        # Convert afterwards only if the file was not produced while recording.
+        # The job runs in the background; the recorder goes back to monitoring right away.
+        job = None
+        wav_filename = self.output_filename if os.path.exists(self.output_filename) else None
+        export_filename = self.export_filename if streamed_ok else None
+        if segments_filename:
+            self.logger.info(f"Rollover take finished: {segments_filename}")
+        elif self.export_queue and not streamed_ok and wav_filename:
+            base, _ = wav_filename.rsplit('.', 1)
+            export_filename = f"{base}{get_encoder(self.export_format).extension}"
+            job = self.export_queue.submit(wav_filename, export_filename, normalize=self.normalize_lufs,
+                                           loudness=loudness)
+        elif streamed_ok:
+            self.logger.info(f"Encoded while recording: {self.export_filename}")
+            if cues and self.export_queue:
+                # The markers are only known now: the remux runs in the background, the file is valid meanwhile
+                job = self.export_queue.submit(self.export_filename, self.export_filename, delete_source=False,
+                                               chapters={"cues": cues, "rate": RATE, "frames": streamed_frames})
+        else:
+            self.logger.info("Conversion was not queued")
+
+        callback_stats = self.get_callback_stats()
+        self.logger.info(f"Callback stats: {callback_stats}")
+        summary_filename = None
+        if WRITE_SESSION_SUMMARY:
+            base, _ = self.output_filename.rsplit('.', 1)
+            summary_filename = f"{base}.stats.json"
+            write_session_summary(summary_filename, {
+                "recording": export_filename or wav_filename or segments_filename,
+                "started": self.take_started,
+                "elapsed_s": round(self.rec_elapsed, 3),
+                "preroll_s": round(self.preroll_recorded, 3),
+                "rate": RATE,
+                "channels": CHANNELS,
+                "capture_rate": self.capture_rate,
+                "capture_channels": self.capture_channels,
+                "chunk": self.chunk,
+                "callback": callback_stats,
+                "writer": writer_stats,
+                "clipped_blocks": self.audioCallback.meter.clips,
+                "cues": [{"time_s": round(frame / float(RATE), 3), "label": label} for frame, label in cues],
+                "loudness": loudness,
+            })
+
+        self.state_fsm = "monitoring"
+        return {
+            "wav": wav_filename,
+            "export": export_filename,
+            "streamed": streamed_ok,
+            "job": job,
+            "jobs": [job["id"]] if job else segment_jobs,
+            "segments": segments_filename,
+            "peaks": peaks,
+            "cues": cues,
+            "loudness": loudness,
+            "writer": writer_stats,
+            "summary": summary_filename,
+        }
+
+    def shutdown(self):
+        """
+        Stop whatever is running and release PortAudio. Pending conversions
+        stay in the queue file and resume on the next launch.
+        """
+        self.logger.info("Shutdown engine")
+        self.ready.wait()  # Never tear down while the probe thread builds things
+        if self.devices is not None:
+            self.devices.stop_watch()
+        try:
+            if self.state_fsm == "multitrack":
+                self.stop_multitrack()
+            if self.state_fsm in ["recording", "pause_rec"]:
+                self.stop_recording()
+            if self.state_fsm == "monitoring":
+                self.stop_monitor()
+        except Exception as e:
+            self.logger.error(f"Error while stopping: {e}", exc_info=True)
+
+        if self.export_queue:
+            self.export_queue.shutdown()
+        if self.backend is not None:
+            self.backend.terminate()
+
+    def start_multitrack(self, filename, device_keys, polyphonic=False):
+        """
+        Record several input devices at once, aligned on a shared clock:
+        idle -> multitrack.
+
+        Each device is opened input-only at its native format; tracks are
+        converted to RATE/CHANNELS and drift-compensated (see multitrack.py).
+
+        Args:
+            filename (str): File name without path; '.wav' is stripped.
+            device_keys (list): Identity keys of the input devices, one per track.
+            polyphonic (bool): Write one WAV file with CHANNELS channels per
+                device instead of one WAV file per device.
+
+        Returns:
+            list: Full paths of the WAV files being written.
+
+        Raises:
+            ValueError: If not idle, the filename is invalid, a device is not
+                connected or is listed twice.
+            OSError: If a file or a stream cannot be opened.
+        """
+        if self.state_fsm != "idle":
+            raise ValueError("Invalid state")
+        self.wait_ready()
+
+        is_valid_filename, error_msg = is_valid_windows_filename(filename)
+        if not is_valid_filename:
+            raise ValueError(error_msg)
+        if not device_keys:
+            raise ValueError("No se seleccionó ningún dispositivo")
+        if len(set(device_keys)) != len(device_keys):
+            raise ValueError("Un dispositivo está repetido")
+
+        if filename.endswith('.wav'):
+            filename = filename[:-4]
+        self.output_filename = os.path.join(self.output_dir, f"{filename}.wav")
+        devices = [self._resolve_device(key, "max_input_channels") for key in device_keys]
+
+        self.logger.info(f"Start multi-track recording of {len(devices)} devices")
+        session = MultiTrackSession(self.backend, devices, os.path.join(self.output_dir, filename),
+                                    polyphonic=polyphonic, rate=RATE, channels=CHANNELS,
+                                    chunk=self.chunk, ring_seconds=RING_SECONDS,
+                                    lock=self.devices.lock, commit_interval=WAV_COMMIT_SECONDS)
+        session.start()
+        self.multitrack = session
+
+        self.rec_elapsed = 0
+        self.start_time = time.monotonic()
+        self.timer_running = True
+        self.take_started = datetime.datetime.now().isoformat(timespec='seconds')
+        self.state_fsm = "multitrack"
+        return session.files
+
+    def stop_multitrack(self):
+        """
+        Finish a multi-track take: multitrack -> idle. Every track file is
+        queued for export when ffmpeg is available.
+
+        Returns:
+            dict: files (WAV paths), jobs (ids of the export jobs), tracks
+                (per-device clock statistics, see MultiTrackSession.stats()),
+                summary (path of the `<name>.tracks.json` summary).
+
+        Raises:
+            ValueError: If not in the multitrack state.
+        """
+        if self.state_fsm != "multitrack":
+            raise ValueError("Invalid state")
+
+        stats = self.multitrack.stop()
+        summary_filename = f"{self.multitrack.base}.tracks.json"
+        self.multitrack = None
+
+        if self.timer_running:
+            self.rec_elapsed += time.monotonic() - self.start_time
+            self.timer_running = False
+
+        jobs = []
+        if self.export_queue:
+            for wav_filename in stats["files"]:
+                base, _ = wav_filename.rsplit('.', 1)
+                jobs.append(self.export_queue.submit(
+                    wav_filename, f"{base}{get_encoder(self.export_format).extension}",
+                    normalize=self.normalize_lufs)["id"])
+
+        self.state_fsm = "idle"
+        return {
+            "files": stats["files"],
+            "jobs": jobs,
+            "tracks": stats["tracks"],
+            "summary": summary_filename,
+        }
+
+    def export_segment(self, entry):
+        """
+        Queue the conversion of a finished rollover segment.
+
+        Runs on the writer thread (or the control thread for the last
+        segment); ExportQueue.submit() is thread safe.
+
+        Args:
+            entry (dict): Segment manifest entry (see SegmentedWavSink).
+
+        Returns:
+            dict | None: The export job, or None without ffmpeg.
+        """
+        if not self.export_queue:
+            return None
+        return self.export_queue.submit(os.path.join(self.output_dir, entry["wav"]),
+                                        os.path.join(self.output_dir, entry["export"]))
+
+    def elapsed(self):
+        """
+        Calculates recording elapsed time
+
+        Returns:
+            float: Seconds recorded in this take, pauses excluded.
+        """
+        if self.timer_running:
+            return self.rec_elapsed + (time.monotonic() - self.start_time)
+        else:
+            return self.rec_elapsed
+
+    def read_levels(self):
+        """
+        Fold the meter statistics gathered since the previous call into dB
+        levels. Call once per display frame.
+
+        Returns:
+            dict: See LevelMeter.read().
+        """
+        return self.audioCallback.meter.read()
+
+    def record_tap(self, block):
+        """
+        Capture tap that feeds the recording ring buffer.
+
+        Runs on the PortAudio callback thread, so it only copies the block
+        (the part before a pause or after a resume point).
+
+        Args:
+            block (np.ndarray): Processed int16 samples in the capture format (read-only).
+        """
+        record_buffer = self.record_buffer
+        channels = self.capture_channels
+        if self.record_start_frame is None and self.preroll_buffer is not None:
+            # Pre-roll position right before this block (see _take_preroll())
+            self.record_start_frame = self.preroll_buffer.frames_written - block.shape[0] // channels
+        if record_buffer is None:
+            return
+        switch = self.record_switch
+        if switch is not None:
+            # Pause/resume at an exact frame, which may fall inside this block
+            cut = min(max(switch[0] - self.audioCallback.block_start, 0), block.shape[0] // channels) * channels
+            block = block[:cut] if switch[1] else block[cut:]
+        if block.shape[0]:
+            record_buffer.write(block)  # Counts an overrun if the writer fell behind
+            self.record_frames += block.shape[0] // channels
+
+    def get_callback_stats(self):
+        """
+        Live snapshot of the callback instrumentation (duration histogram,
+        status flag counters, ADC-to-callback latency).
+
+        Returns:
+            dict: See CallbackStats.snapshot().
+        """
+        return self.audioCallback.stats.snapshot()
+
+    def is_auto_paused(self):
+        """
+        Returns:
+            bool: True while the silence gate of an automatic-pause take is
+                dropping audio.
+        """
+        gate = self.voice_gate
+        return self.state_fsm == "recording" and gate is not None and not gate.is_open
+
+    def get_writer_stats(self):
+        """
+        Current counters of the recording ring buffer and writer thread.
+
+        A growing `overruns` value means the writer thread is falling
+        behind the audio callback and blocks are being dropped.
+
+        Returns:
+            dict | None: Writer statistics, or None when not recording.
+        """
+        if self.file_writer is None:
+            return None
+        return self.file_writer.stats()
+
+
+class AudioCallback:
+    """
+    Helper class that wraps the PyAudio callback function.
+
+    Stores a reference to the engine so that the callback can read
+    state such as the gain, and owns the per-stream processing buffers.
+    """
+    def __init__(self, instance):
+        """
+        Initialize the callback handler.
+
+        Args:
+            instance (RecorderEngine): Reference to the engine that owns
+                                       the recording state and output file.
+        """
+        self.instance = instance  # Store the instance reference
+        self.taps = ()  # Consumers of the processed blocks, see add_tap()
+        self.kernel = GainKernel(instance.chunk, CHANNELS)  # Preallocated buffers for this stream
+        self.meter = LevelMeter()  # Linear stats in the callback, dB once per UI frame
+        self.stats = CallbackStats(instance.chunk / float(RATE))  # Hot-path instrumentation
+        self.rate = RATE
+        self.frames_captured = 0  # Capture frames processed since the stream was opened
+        self.block_start = 0      # Capture frame of the first frame of the block being processed
+        self.clock = None         # (capture frame, perf_counter time it was sampled) of the last block
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.logger.info("Audio callback handler initialized")
+
+    def configure(self, rate, channels):
+        """
+        Size the processing buffers for the format of the stream about to
+        be opened. Must not be called while a stream is running.
+
+        Args:
+            rate (int): Capture sample rate.
+            channels (int): Interleaved capture channels.
+        """
+        if self.kernel.channels != channels:
+            self.kernel = GainKernel(self.instance.chunk, channels)
+        self.stats.block_period = self.instance.chunk / float(rate)
+        self.rate = rate
+        self.frames_captured = 0
+        self.block_start = 0
+        self.clock = None
+
+    def add_tap(self, tap):
+        """
+        Register a consumer of the processed blocks.
+
+        Taps run on the PortAudio callback thread and must only do cheap,
+        non-blocking work (e.g. copy into a ring buffer). The tap list is
+        replaced rather than mutated so the callback never sees it change
+        while iterating.
+
+        Args:
+            tap (callable): Called with each processed block (read-only np.ndarray).
+        """
+        self.taps = self.taps + (tap,)
+
+    def remove_tap(self, tap):
+        """
+        Unregister a consumer added with `add_tap`.
+
+        Args:
+            tap (callable): The tap to remove.
+        """
+        self.taps = tuple(t for t in self.taps if t != tap)
+
+    def capture_callback(self, in_data, frame_count, time_info, status):
+        """
+        PyAudio callback of the single capture stream.
+
+        The gain/clip/peak processing runs once per block and the result is
+        shared with every consumer: it is returned for monitor playback,
+        handed to the registered taps (recorder, ...) and used for the
+        level meter.
+
+        Workflow:
+            - Applies gain from `instance.current_gain` and clips to the
+              int16 range with the GainKernel (preallocated buffers).
+            - Feeds peak/energy/clip statistics to the level meter.
+            - Stamps the capture position and sampling time of the block
+              (used for sample-accurate pause/resume).
+            - Passes the processed block to the taps.
+            - Records duration, status flags and latency of the callback.
+            - Returns processed audio as bytes for playback.
+
+        Args:
+            in_data (bytes): Raw input audio data.
+            frame_count (int): Number of audio frames in this buffer.
+            time_info (dict): Timing information from PyAudio.
+            status (int): Status flag from PyAudio.
+
+        Returns:
+            tuple: (out_data or None without playback, CONTINUE)
+        """
+        start = perf_counter()
+
+        # Apply gain and clip in the kernel's preallocated buffers (no per-block arrays).
+        # The block is read-only and reused on the next callback: taps must copy it.
+        adjusted_gain = self.instance.current_gain  # Use the current gain from the instance
+        amplified_data, peak_level, sum_squares = self.kernel.process(in_data, adjusted_gain)
+
+        # Linear statistics only; the display converts them to dB
+        self.meter.accumulate(peak_level, sum_squares, amplified_data.shape[0])
+
+        # Sampling time of the first frame: ADC time when the host API reports it,
+        # otherwise the block is assumed to have just been filled
+        first = self.frames_captured
+        adc_time = time_info.get("input_buffer_adc_time", 0.0) if time_info else 0.0
+        age = time_info["current_time"] - adc_time if adc_time > 0 else -1.0
+        if not 0 <= age < 1.0:
+            age = frame_count / float(self.rate)
+        self.clock = (first, start - age)
+
+        # Fan out the same block to recorder and other consumers
+        self.block_start = first
+        for tap in self.taps:
+            tap(amplified_data)
+        self.frames_captured = first + frame_count
+
+        # Convert back to bytes
+        out_data = amplified_data.tobytes() if self.instance.playback else None
+
+        self.stats.record(perf_counter() - start, status, time_info)
+        return out_data, CONTINUE
@@ -0,0 +1,278 @@
+"""
+Export Queue
+============
+
+Description:
+    Persistent background queue for WAV -> MP3/Opus/FLAC conversions.
+
+    Jobs are stored in a JSON file next to the recordings and served by a
+    small pool of worker threads, each one driving its own ffmpeg process.
+    The recorder only submits a job and goes straight back to monitoring;
+    pending or interrupted jobs are picked up again on the next launch.
+
+    A job may ask for loudness normalization (see normalize.py); it then
+    carries the loudness measured while recording, if any, so only the
+    gain pass is left for the worker.
+
+    A chapters job adds the markers of a take to a file already encoded
+    while recording (a stream-copy remux, see encoders.add_chapters); its
+    input and output are that same file.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import json
+import time
+import queue
+import logging
+import datetime
+import threading
+
+from encoders import export_wav, verify_export, add_chapters
+from normalize import export_normalized
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ExportQueue:
+    """
+    Persistent job queue served by a pool of worker threads.
+
+    Each job is a plain dict (so it can be saved as JSON) with the keys:
+    id, input, output, delete_source, normalize (target LUFS or None),
+    loudness (measurement taken while recording or None), chapters (markers
+    to remux into the output or None), status, progress, error, created.
+
+    Attributes:
+        queue_file (str): JSON file where jobs are persisted.
+        workers (int): Number of concurrent conversions.
+        on_update (callable | None): Called with the job dict whenever a job
+            changes state or progress. Runs on a worker thread.
+    """
+    def __init__(self, queue_file, workers=2, on_update=None, keep_finished=20):
+        """
+        Load persisted jobs and start the worker pool.
+
+        Jobs left `pending` or `running` by a previous session are queued
+        again; their output file is simply rewritten.
+
+        Args:
+            queue_file (str): Path of the JSON persistence file.
+            workers (int): Number of worker threads.
+            on_update (callable, optional): Job change notification.
+            keep_finished (int): Finished jobs kept in the file for display.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.queue_file = queue_file
+        self.workers = max(1, int(workers))
+        self.on_update = on_update
+        self.keep_finished = keep_finished
+
+        self._lock = threading.Lock()
+        self._jobs = []
+        self._pending = queue.Queue()
+        self._threads = []
+        self._next_id = 1
+        self._stopping = False
+
+        self._load()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"ExportWorker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _load(self):
+        """
+        Read the persistence file and re-queue unfinished jobs.
+        """
+        if not os.path.exists(self.queue_file):
+            return
+
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as f:
+                self._jobs = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Could not read export queue {self.queue_file}: {e}")
+            self._jobs = []
+            return
+
+        for job in self._jobs:
+            self._next_id = max(self._next_id, job.get("id", 0) + 1)
+            if job["status"] in (PENDING, RUNNING):
+                self.logger.info(f"Resuming export job {job['id']}: {job['input']}")
+                job["status"] = PENDING
+                job["progress"] = 0
+                self._pending.put(job)
+
+    def _save(self):
+        """
+        Write the job list atomically. Caller must hold `self._lock`.
+        """
+        finished = [j for j in self._jobs if j["status"] in (DONE, FAILED)]
+        if len(finished) > self.keep_finished:
+            drop = {id(j) for j in finished[:len(finished) - self.keep_finished]}
+            self._jobs = [j for j in self._jobs if id(j) not in drop]
+
+        tmp_file = self.queue_file + ".tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self._jobs, f, indent=2)
+            os.replace(tmp_file, self.queue_file)
+        except OSError as e:
+            self.logger.error(f"Could not save export queue {self.queue_file}: {e}")
+
+    def _update(self, job, persist=True, **changes):
+        """
+        Apply changes to a job, persist them and notify the listener.
+        """
+        with self._lock:
+            job.update(changes)
+            if persist:
+                self._save()
+            snapshot = dict(job)
+        self._notify(snapshot)
+
+    def _notify(self, snapshot):
+        """
+        Call the listener, never letting its errors reach a worker.
+        """
+        if self.on_update:
+            try:
+                self.on_update(snapshot)
+            except Exception as e:
+                self.logger.error(f"Error in export queue listener: {e}", exc_info=True)
+
+    def submit(self, input_filename, output_filename, delete_source=True, normalize=None, loudness=None,
+               chapters=None):
+        """
+        Queue a conversion. Returns immediately.
+
+        Args:
+            input_filename (str): WAV file to convert.
+            output_filename (str): Destination file; its extension selects
+                the format (see encoders.encoder_for()).
+            delete_source (bool): Remove the WAV once the conversion succeeds.
+            normalize (float, optional): Target loudness in LUFS; None
+                exports the samples unchanged.
+            loudness (dict, optional): Loudness of the WAV measured while
+                recording (see dsp.LoudnessMeter), saves the measuring pass.
+            chapters (dict, optional): {"cues": [(frame, label), ...],
+                "rate", "frames"}: only add these markers as chapters to
+                `output_filename`, which must already exist.
+
+        Returns:
+            dict: Copy of the new job.
+        """
+        with self._lock:
+            job = {
+                "id": self._next_id,
+                "input": input_filename,
+                "output": output_filename,
+                "delete_source": delete_source,
+                "normalize": normalize,
+                "loudness": loudness,
+                "chapters": chapters,
+                "status": PENDING,
+                "progress": 0,
+                "error": "",
+                "created": datetime.datetime.now().isoformat(timespec='seconds'),
+            }
+            self._next_id += 1
+            self._jobs.append(job)
+            self._save()
+            snapshot = dict(job)
+
+        self.logger.info(f"Queued export job {job['id']}: {input_filename} -> {output_filename}")
+        self._pending.put(job)
+        self._notify(snapshot)
+        return snapshot
+
+    def _worker(self):
+        """
+        Worker thread body: run queued jobs one after the other.
+        """
+        while True:
+            job = self._pending.get()
+            if job is None or self._stopping:
+                break
+            try:
+                self._run_job(job)
+            except Exception as e:
+                self.logger.error(f"Error in export job {job['id']}: {e}", exc_info=True)
+                self._update(job, status=FAILED, error=str(e))
+
+    def _run_job(self, job):
+        """
+        Convert one job with ffmpeg, reporting progress as it goes.
+        """
+        if not os.path.exists(job["input"]):
+            self._update(job, status=FAILED, error="source file not found")
+            return
+
+        self._update(job, status=RUNNING, progress=0)
+        t0 = time.monotonic()
+
+        def on_progress(percent):
+            # Progress is not persisted: an interrupted job restarts from 0
+            self._update(job, persist=False, progress=percent)
+
+        if job.get("chapters"):
+            chapters = job["chapters"]
+            cues = [(frame, label) for frame, label in chapters["cues"]]
+            ok = add_chapters(job["output"], cues, chapters["rate"], chapters["frames"])
+        elif job.get("normalize") is not None:
+            ok = export_normalized(job["input"], job["output"], job["normalize"], job.get("loudness"), on_progress)
+        else:
+            ok = export_wav(job["input"], job["output"], on_progress)
+        if not ok:
+            self._update(job, status=FAILED, error="ffmpeg failed")
+            return
+
+        if job["delete_source"]:
+            if not verify_export(job["input"], job["output"]):
+                # Keep the WAV: the next batch conversion (batch.py) retries it
+                self._update(job, status=FAILED, error="output failed the integrity check")
+                return
+            self.logger.info(f"delete wave {job['input']}")
+            os.remove(job["input"])
+
+        self.logger.info(f"Export job {job['id']} done in {time.monotonic() - t0:.1f} s")
+        self._update(job, status=DONE, progress=100)
+
+    def snapshot(self):
+        """
+        Returns:
+            list: Copies of all known jobs, oldest first.
+        """
+        with self._lock:
+            return [dict(job) for job in self._jobs]
+
+    def active_jobs(self):
+        """
+        Returns:
+            list: Copies of pending and running jobs, oldest first.
+        """
+        return [job for job in self.snapshot() if job["status"] in (PENDING, RUNNING)]
+
+    def shutdown(self, wait=False):
+        """
+        Stop the worker threads once the jobs already taken are finished.
+        Jobs still pending stay in the persistence file for the next launch.
+
+        Args:
+            wait (bool): Block until the workers have exited.
+        """
+        self._stopping = True
+        for _ in self._threads:
+            self._pending.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
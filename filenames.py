@@ -0,0 +1,89 @@
+"""
+File Names
+==========
+
+Description:
+    Recording folder and file name helpers shared by the GUI, the command
+    line and the engine. Kept free of numpy/PortAudio imports so the GUI
+    can use them before the engine is loaded.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import re
+import datetime
+from pathlib import Path
+
+
+def default_audio_dir():
+    """
+    Default folder for recordings: "CdS Audio" on the user's desktop.
+
+    Falls back to the home directory when USERPROFILE is not set
+    (e.g. headless Linux servers).
+
+    Returns:
+        Path: The recordings folder (not created).
+    """
+    profile = os.environ.get('USERPROFILE', str(Path.home()))
+    return Path(profile) / 'Desktop' / "CdS Audio"
+
+
+def timestamp_filename():
+    """
+    Unique WAV filename based on the current date and time.
+
+    Returns:
+        str: e.g. "audio_24-08-2024_17-05-33.wav"
+    """
+    now = datetime.datetime.now()
+    return f"audio_{now.strftime('%d-%m-%Y_%H-%M-%S')}.wav"
+
+
+def is_valid_windows_filename(filename):
+    """
+    Check if a filename is valid for Windows OS.
+
+    Args:
+        filename: The filename to validate (without path)
+
+    Returns:
+        tuple: (bool, str) - (is_valid, error_message)
+    """
+    # Check if empty
+    if not filename or filename.strip() == "":
+        return False, "El nombre de archivo no puede estar vacío"
+
+    # Check length (Windows has 255 char limit for filename)
+    if len(filename) > 255:
+        return False, "El nombre de archivo es demasiado largo (máximo 255 caracteres)"
+
+    # Invalid characters in Windows: < > : " / \ | ? *
+    invalid_chars = r'[<>:"/\\|?*]'
+    if re.search(invalid_chars, filename):
+        return False, "El nombre contiene caracteres inválidos: < > : \" / \\ | ? *"
+
+    # Check for reserved names in Windows
+    reserved_names = [
+        "CON", "PRN", "AUX", "NUL",
+        "COM1", "COM2", "COM3", "COM4", "COM5", "COM6", "COM7", "COM8", "COM9",
+        "LPT1", "LPT2", "LPT3", "LPT4", "LPT5", "LPT6", "LPT7", "LPT8", "LPT9"
+    ]
+
+    # Get filename without extension
+    name_without_ext = filename.split('.')[0].upper()
+    if name_without_ext in reserved_names:
+        return False, f"'{filename}' es un nombre reservado del sistema"
+
+    # Check if ends with space or period (not allowed in Windows)
+    if filename.endswith(' ') or filename.endswith('.'):
+        return False, "El nombre no puede terminar con espacio o punto"
+
+    # Check for control characters (ASCII 0-31)
+    if any(ord(char) < 32 for char in filename):
+        return False, "El nombre contiene caracteres de control inválidos"
+
+    return True, ""
@@ -0,0 +1,206 @@
+"""
+File Writer Thread
+==================
+
+Description:
+    Background thread that drains an AudioRingBuffer into an output sink
+    (a `wave.Wave_write` or any object with a `writeframes(bytes)` method).
+
+    Keeping disk I/O on this thread means a slow flush can never make the
+    PortAudio callback miss its deadline; the callback only copies the
+    processed block into the ring buffer. Conversion from the capture
+    format to the file format (dsp.FormatConverter) and the silence gate
+    of the automatic pause (dsp.VoiceGate) run here too.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import time
+import logging
+import threading
+
+
+class FileWriterThread(threading.Thread):
+    """
+    Drains a ring buffer to a sink until stopped.
+
+    Attributes:
+        ring (AudioRingBuffer): Buffer filled by the audio callback.
+        sink: Object with a `writeframes(bytes)` method.
+        converter (FormatConverter | None): Capture -> file format stage.
+        gate (VoiceGate | None): Drops silent parts, after the conversion.
+        head (np.ndarray | None): Frames written before the ring contents
+            (e.g. the pre-roll), in the capture format.
+        frames_read (int): Total frames taken from the head and the ring (capture format).
+        frames_written (int): Total frames handed to the sink (file format).
+        writes (int): Number of `writeframes` calls.
+        max_write_time (float): Slowest single write, in seconds.
+        error (Exception | None): Exception that stopped the thread, if any.
+    """
+    def __init__(self, ring, sink, poll_interval=0.01, max_block=16384, name="FileWriter", converter=None,
+                 head=None, gate=None):
+        """
+        Initialize the writer thread.
+
+        Args:
+            ring (AudioRingBuffer): Source of audio frames.
+            sink: Destination with a `writeframes(bytes)` method.
+            poll_interval (float): Sleep time in seconds when the ring is empty.
+            max_block (int): Maximum frames per `writeframes` call.
+            name (str): Thread name, shown in logs.
+            converter (FormatConverter, optional): Converts each block (and
+                the filter tail at the end) before it reaches the sink.
+            head (np.ndarray, optional): (frames, channels) block written
+                first, ahead of the ring contents.
+            gate (VoiceGate, optional): Silence gate applied to the
+                converted blocks.
+        """
+        super().__init__(name=name, daemon=True)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.ring = ring
+        self.sink = sink
+        self.poll_interval = poll_interval
+        self.max_block = max_block
+        self.converter = converter
+        self.head = head
+        self.gate = gate
+
+        self.frames_read = 0
+        self.frames_written = 0
+        self.writes = 0
+        self.max_write_time = 0.0
+        self.error = None
+
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """
+        Thread body: write whatever is available, sleep when the ring is
+        empty, and drain everything left once a stop is requested.
+        """
+        self.logger.info("Writer thread started")
+        try:
+            if self.head is not None:
+                for start in range(0, self.head.shape[0], self.max_block):
+                    self._convert_and_write(self.head[start:start + self.max_block])
+                self.head = None
+
+            while True:
+                block = self.ring.read(self.max_block)
+                if block.shape[0]:
+                    self._convert_and_write(block)
+                    continue
+
+                if self._stop_event.is_set():
+                    break
+                self._stop_event.wait(self.poll_interval)
+
+            if self.converter is not None:
+                self._write(self._gated(self.converter.flush()))
+            if self.gate is not None:
+                self._write(self.gate.flush())
+
+        except Exception as e:
+            self.error = e
+            self.logger.error(f"Error in writer thread: {e}", exc_info=True)
+
+        self.logger.info(f"Writer thread finished: {self.stats()}")
+
+    def _convert_and_write(self, block):
+        """
+        Convert one capture-format block (if needed) and write it.
+        """
+        self.frames_read += block.shape[0]
+        if self.converter is not None:
+            block = self.converter.process(block)
+        self._write(self._gated(block))
+
+    def _gated(self, block):
+        return self.gate.process(block) if self.gate is not None else block
+
+    def _write(self, block):
+        """
+        Hand one block to the sink and time it.
+        """
+        if not block.shape[0]:
+            return
+        t0 = time.perf_counter()
+        self.sink.writeframes(block.tobytes())
+        elapsed = time.perf_counter() - t0
+        if elapsed > self.max_write_time:
+            self.max_write_time = elapsed
+        self.frames_written += block.shape[0]
+        self.writes += 1
+
+    def stop(self, timeout=None):
+        """
+        Ask the thread to drain the ring buffer and exit, then wait for it.
+
+        The audio stream feeding the ring must already be stopped, otherwise
+        frames arriving after the drain are left in the buffer.
+
+        Args:
+            timeout (float, optional): Maximum seconds to wait for the join.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self):
+        """
+        Snapshot of the writer and ring buffer counters.
+
+        Returns:
+            dict: Frames read and written, write count, slowest write (ms) plus the
+                ring buffer overrun counters.
+        """
+        stats = self.ring.stats()
+        stats.update({
+            "frames_read": self.frames_read,
+            "frames_written": self.frames_written,
+            "writes": self.writes,
+            "max_write_ms": round(self.max_write_time * 1000, 3),
+        })
+        if self.gate is not None:
+            stats["gate"] = self.gate.stats()
+        return stats
+
+
+class TeeSink:
+    """
+    Sink that forwards every block to several sinks.
+
+    A sink that raises is logged and dropped, so a failing encoder never
+    takes the WAV safety copy down with it (and vice versa).
+    """
+    def __init__(self, sinks):
+        """
+        Args:
+            sinks (list): Objects with a `writeframes(bytes)` method.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.sinks = list(sinks)
+        self.failed = []
+
+    def writeframes(self, data):
+        """
+        Write a block to every healthy sink.
+
+        Args:
+            data (bytes): Interleaved PCM samples.
+
+        Raises:
+            RuntimeError: When no healthy sink is left.
+        """
+        for sink in list(self.sinks):
+            try:
+                sink.writeframes(data)
+            except Exception as e:
+                self.logger.error(f"Sink {sink!r} failed, dropping it: {e}")
+                self.sinks.remove(sink)
+                self.failed.append(sink)
+
+        if not self.sinks:
+            raise RuntimeError("All output sinks failed")
@@ -20,7 +20,6 @@ Dependencies:
     - wxPython
     - PyAudio
     - NumPy
-    - pydub
     - gevent
     - FFmpeg (optional, for MP3 export)
 
@@ -52,32 +51,24 @@ SOFTWARE.
 
 """
 
+
 import time
-import wave
-import datetime
+STARTUP_T0 = time.perf_counter()  # Reference for the startup timings
+
 import os
-import re
 import wx
+import json
 import logging
-import subprocess
-import pyaudio
-import threading
-from pydub import AudioSegment
-import numpy as np
-from pathlib import Path
 
 import GrabadoraGUIFrame
+# The engine (numpy, PortAudio) is imported after the first paint, see GUI.on_first_paint()
+from filenames import default_audio_dir, is_valid_windows_filename, timestamp_filename
 
-# pyaudio constants
-FORMAT = pyaudio.paInt16
-CHANNELS = 1
-RATE = 44100
-CHUNK = 1024
-GAIN = 2.0
+# Launches kept in startup_timings.json
+STARTUP_HISTORY = 50
 
 # Desktop path setting out of main class to initialize log file in working directory
-desktop_path = Path(os.path.join(os.environ['USERPROFILE'], 'Desktop'))
-cds_audio_path = desktop_path / "CdS Audio"
+cds_audio_path = default_audio_dir()
 if not cds_audio_path.exists():
     cds_audio_path.mkdir(parents=True)
 
@@ -90,24 +81,6 @@ logging.basicConfig(
     level=logging.INFO,             # Log level
     format='%(asctime)s - %(levelname)s - %(name)s.%(funcName)s - %(message)s'
 )
-def check_ffmpeg_installed():
-    """
-    Check whether FFmpeg is installed and accessible in the system PATH.
-
-    Attempts to run `ffmpeg -version` using subprocess. If the command executes
-    successfully, FFmpeg is considered installed.
-
-    Returns:
-        bool: True if FFmpeg is installed and executable, False otherwise.
-    """
-    try:
-        # Try to run 'ffmpeg -version' to check if it's installed
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        logging.info("ffmpeg instalado correctamente")
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        # Return False if ffmpeg is either not installed or fails to run
-        return False
 
 def notify_ffmpeg_missing():
     """
@@ -127,50 +100,26 @@ def notify_ffmpeg_missing():
     )
 
 
-def is_valid_windows_filename(filename):
+def save_startup_timings(timings):
     """
-    Check if a filename is valid for Windows OS.
+    Append the startup timings of this launch to startup_timings.json in the
+    recordings folder, keeping the last STARTUP_HISTORY launches.
 
     Args:
-        filename: The filename to validate (without path)
-
-    Returns:
-        tuple: (bool, str) - (is_valid, error_message)
+        timings (dict): Milliseconds per startup step.
     """
-    # Check if empty
-    if not filename or filename.strip() == "":
-        return False, "El nombre de archivo no puede estar vacío"
-
-    # Check length (Windows has 255 char limit for filename)
-    if len(filename) > 255:
-        return False, "El nombre de archivo es demasiado largo (máximo 255 caracteres)"
-
-    # Invalid characters in Windows: < > : " / \ | ? *
-    invalid_chars = r'[<>:"/\\|?*]'
-    if re.search(invalid_chars, filename):
-        return False, "El nombre contiene caracteres inválidos: < > : \" / \\ | ? *"
-
-    # Check for reserved names in Windows
-    reserved_names = [
-        "CON", "PRN", "AUX", "NUL",
-        "COM1", "COM2", "COM3", "COM4", "COM5", "COM6", "COM7", "COM8", "COM9",
-        "LPT1", "LPT2", "LPT3", "LPT4", "LPT5", "LPT6", "LPT7", "LPT8", "LPT9"
-    ]
-
-    # Get filename without extension
-    name_without_ext = filename.split('.')[0].upper()
-    if name_without_ext in reserved_names:
-        return False, f"'{filename}' es un nombre reservado del sistema"
-
-    # Check if ends with space or period (not allowed in Windows)
-    if filename.endswith(' ') or filename.endswith('.'):
-        return False, "El nombre no puede terminar con espacio o punto"
-
-    # Check for control characters (ASCII 0-31)
-    if any(ord(char) < 32 for char in filename):
-        return False, "El nombre contiene caracteres de control inválidos"
-
-    return True, ""
+    filename = os.path.join(cds_audio_path, 'startup_timings.json')
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = []
+    history.append(timings)
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(history[-STARTUP_HISTORY:], f, indent=1)
+    except OSError as e:
+        logging.error(f"Could not save startup timings: {e}")
 
 
 class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
@@ -182,13 +131,13 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
 
     Responsibilities:
         - Manage user interface events for monitoring and recording.
-        - Control audio input/output streams with PyAudio.
-        - Handle WAV recording and optional MP3 export (via FFmpeg).
-        - Track recording time, audio gain, and microphone peak levels.
+        - Drive the RecorderEngine (streams, files, export) from those events.
+        - Display recording time, audio gain, microphone levels and the
+          background conversions.
     """
     def __init__(self, parent):
         """
-        Initialize the GUI frame and application state.
+        Initialize the GUI frame and the recorder engine.
 
         Args:
             parent: Parent window for this frame.
@@ -198,37 +147,15 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         self.logger.info("Starting GrabadoraGUIFrame")
         GrabadoraGUIFrame.GrabadoraGUIFrame.__init__(self, parent)
 
-        self.audioCallback = MyAudioCallback(self)
-        self.pya = pyaudio.PyAudio()
-
-        # Streams
-        self.monitor_stream = None
-        self.record_stream = None
-
-        # File handling
-        self.output_wavefile = None
-        self.output_filename = ""
-
-        # FSM and levels
-        self.state_fsm = "idle"
-        self.peak_level_db = None
-        self.current_gain = 2.0
-
-        # Devices info
-        self.input_channels = None
-        self.output_channels = None
-        self.input_rate = None
-        self.output_rate = None
+        # Levels display
+        self.peak_level_db = None   # Last peak shown on the gauge (dB, with decay)
+        self.meter_label = ""
 
         # Timer
         self.timer = None
-        self.start_time = None  # When the timer was last started
-        self.rec_elapsed = 0.0  # Total elapsed time before last pause
-        self.timer_running = False
-
-        # Conversion thread
-        self.thread = None
+        self.timer_ticks = 0
 
+        self.output_filename = ""
         self.cds_audio_path = cds_audio_path
 
         self.m_textCtrlFilename.SetValue("      Iniciar monitoreo para fijar el nombre del audio!")
@@ -242,32 +169,159 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         # disable ability to edit
         self.m_textCtrlFilename.SetEditable(False)
 
-
-        self.export = True
-        if not check_ffmpeg_installed():
+        # All capture, state machine and file logic lives in the engine. It is
+        # created once the frame is on screen; monitoring waits for its probe.
+        self.engine = None
+        self.startup_timings = {"import_ms": round((IMPORT_DONE - STARTUP_T0) * 1000, 1)}
+        self.m_buttonMonitor.Disable()
+        self.m_choiceInput.Disable()
+        self.m_choiceOutput.Disable()
+        self.m_checkBoxAutoPause.Disable()
+        self.m_checkBoxNormalize.Disable()
+        self.rec_label = None       # Label shown on the record button while recording
+        self.last_peaks = None      # Peak index of the last take, offered by onWaveform()
+        self.input_keys = [None]    # Device key of each entry of m_choiceInput (None = default)
+        self.output_keys = [None]
+        self.m_staticTextStats.SetLabel("Buscando dispositivos de audio...")
+        wx.CallAfter(self.on_first_paint)
+
+    def on_first_paint(self):
+        """
+        First idle of the main loop, right after the frame was painted: load
+        the engine and let it probe ffmpeg and the audio devices on a
+        background thread.
+        """
+        self.startup_timings["first_paint_ms"] = round((time.perf_counter() - STARTUP_T0) * 1000, 1)
+
+        t0 = time.perf_counter()
+        from engine import RecorderEngine
+        self.startup_timings["engine_import_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        self.engine = RecorderEngine(
+            self.cds_audio_path,
+            on_export_update=self.on_export_update,
+            background_probe=True,
+            on_ready=lambda engine: wx.CallAfter(self.on_engine_ready)
+        )
+
+        if self.engine.live_view:
+            from live_view import LiveScopePanel
+            self.scope = LiveScopePanel(self.m_panelScope, self.engine.live_snapshot)
+            sizer = wx.BoxSizer(wx.VERTICAL)
+            sizer.Add(self.scope, 1, wx.EXPAND)
+            self.m_panelScope.SetSizer(sizer)
+            self.m_panelScope.Layout()
+
+    def on_engine_ready(self):
+        """
+        The engine finished probing: enable monitoring, or report why the
+        audio could not be initialized.
+        """
+        if not self:
+            return  # Frame already destroyed
+
+        self.startup_timings["ready_ms"] = round((time.perf_counter() - STARTUP_T0) * 1000, 1)
+        self.startup_timings.update(self.engine.startup_timings)
+        self.logger.info(f"Startup timings: {self.startup_timings}")
+        save_startup_timings(self.startup_timings)
+        self.m_staticTextStats.SetLabel("")
+
+        if self.engine.probe_error is not None:
+            wx.MessageBox(f"No se pudo inicializar el audio:\n\n{self.engine.probe_error}",
+                          "Error de audio", wx.ICON_ERROR | wx.OK)
+            return
+
+        self.m_buttonMonitor.Enable()
+        self.m_checkBoxAutoPause.SetValue(self.engine.auto_pause)
+        self.m_checkBoxAutoPause.Enable()
+        self.m_checkBoxNormalize.SetValue(self.engine.normalize_lufs is not None)
+        self.m_checkBoxNormalize.Enable(bool(self.engine.export))
+        self.engine.on_devices_changed = lambda added, removed: wx.CallAfter(self.update_device_choices)
+        self.update_device_choices()
+        if not self.engine.export:
             notify_ffmpeg_missing()
-            self.export = False
-
-        # Get default devices
-        self.logger.info("Start pyaudio.PyAudio()")
-        self.pya = pyaudio.PyAudio()
-
-        input_device = self.pya.get_default_input_device_info()
-        output_device = self.pya.get_default_output_device_info()
-        self.input_channels = input_device['maxInputChannels']
-        self.output_channels = output_device['maxOutputChannels']
-        self.input_rate = int(input_device['defaultSampleRate'])
-        self.output_rate = int(output_device['defaultSampleRate'])
-        self.logger.info(f"Default Input: {self.input_channels} channels at {self.input_rate} Hz")
-        self.logger.info(f"Default Output: {self.output_channels} channels at {self.output_rate} Hz")
-
-        # List all audio devices and their information
-        for i in range(self.pya.get_device_count()):
-            info = self.pya.get_device_info_by_index(i)
-            logging.debug(f"Device {i}: {info['name']}")
-            logging.debug(f"  Input Channels: {info['maxInputChannels']}")
-            logging.debug(f"  Output Channels: {info['maxOutputChannels']}")
-        self.logger.info("")
+        self.update_export_status()
+
+    def update_device_choices(self):
+        """
+        Fill the input/output device lists from the engine's device manager
+        (at startup and whenever a device is plugged in or removed).
+        """
+        if not self:
+            return  # Frame already destroyed
+
+        devices = self.engine.devices
+        lists = (
+            (self.m_choiceInput, devices.inputs(), self.engine.input_device, "input_keys"),
+            (self.m_choiceOutput, devices.outputs(), self.engine.output_device, "output_keys"),
+        )
+        for choice, device_list, selected, keys_attr in lists:
+            keys = [None] + [device["key"] for device in device_list]
+            choice.Set(["Predeterminado"] + [f"{device['name']} ({device['host_api']})" for device in device_list])
+            if selected in keys:
+                choice.SetSelection(keys.index(selected))
+            else:
+                # Selected device unplugged: show it as missing, monitoring will report it
+                choice.Append(f"(desconectado) {selected.split('|')[1]}")
+                keys.append(selected)
+                choice.SetSelection(len(keys) - 1)
+            setattr(self, keys_attr, keys)
+            choice.Enable(self.state_fsm == "idle")
+
+    def onDeviceSelect(self, event):
+        """
+        Use the devices chosen in the lists for the next monitoring session.
+
+        Args:
+            event: wx.Event triggered by either device list.
+        """
+        input_key = self.input_keys[self.m_choiceInput.GetSelection()]
+        output_key = self.output_keys[self.m_choiceOutput.GetSelection()]
+        try:
+            self.engine.select_devices(input_key, output_key)
+        except (ValueError, OSError) as e:
+            self.logger.error(f"Device selection failed: {e}")
+            wx.MessageBox(str(e), "Dispositivo de audio", wx.ICON_ERROR | wx.OK)
+            self.update_device_choices()
+
+        event.Skip()
+
+    def onAutoPause(self, event):
+        """
+        Turn the automatic pause on silence on or off for the next take.
+
+        Args:
+            event: wx.Event triggered by the checkbox.
+        """
+        self.engine.auto_pause = self.m_checkBoxAutoPause.GetValue()
+        self.logger.info(f"Auto pause: {self.engine.auto_pause}")
+        event.Skip()
+
+    def onNormalize(self, event):
+        """
+        Turn the loudness normalization of the exported files on or off
+        for the next take.
+
+        Args:
+            event: wx.Event triggered by the checkbox.
+        """
+        from normalize import TARGET_LUFS
+        self.engine.normalize_lufs = TARGET_LUFS if self.m_checkBoxNormalize.GetValue() else None
+        self.logger.info(f"Normalize: {self.engine.normalize_lufs} LUFS")
+        event.Skip()
+
+    @property
+    def state_fsm(self):
+        """
+        Current state of the engine's state machine.
+        """
+        if self.engine is None:
+            return "idle"
+        return self.engine.state_fsm
+
+    @state_fsm.setter
+    def state_fsm(self, value):
+        self.engine.state_fsm = value
 
     def onAudioNameUpdate(self, event):
         """
@@ -290,8 +344,8 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         """
         Toggle audio monitoring mode.
 
-        - If idle: opens a PyAudio stream, initializes default devices,
-          and starts monitoring microphone input/output without recording.
+        - If idle: opens the engine's capture stream and starts monitoring
+          microphone input/output without recording.
         - If monitoring: stops and closes the audio stream, returning to idle.
 
         Args:
@@ -305,11 +359,15 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
             if self.state_fsm == "idle":
                 self.logger.info("Start monitoring")
 
-                # Create a WAV file with a unique filename based on date and time
-                now = datetime.datetime.now()
+                # An unplugged device is a user problem, not an engine error
+                for key in (self.engine.input_device, self.engine.output_device):
+                    if key is not None and self.engine.devices.find(key) is None:
+                        wx.MessageBox(f"El dispositivo seleccionado no está conectado:\n\n{key.split('|')[1]}",
+                                      "Dispositivo de audio", wx.ICON_WARNING | wx.OK)
+                        return
 
                 self.logger.info("Set output filename")
-                self.output_filename = f"audio_{now.strftime('%d-%m-%Y_%H-%M-%S')}.wav"
+                self.output_filename = timestamp_filename()
                 base, extension = self.output_filename.rsplit('.', 1)
                 self.m_textCtrlFilename.SetForegroundColour(wx.Colour(wx.BLACK))
                 self.m_textCtrlFilename.SetBackgroundColour(wx.Colour(wx.WHITE))
@@ -326,20 +384,11 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
                 self.m_buttonStopRec.Disable()
                 self.m_textCtrlFilename.Enable()
                 self.m_textCtrlFilename.SetEditable(True)
+                self.m_choiceInput.Disable()
+                self.m_choiceOutput.Disable()
 
-                self.logger.info("Open pyaudio.PyAudio() for monitor streaming")
-                # Open monitoring stream only (input->output)
-                self.monitor_stream = self.pya.open(
-                    format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    output=True,
-                    frames_per_buffer=CHUNK,
-                    stream_callback=self.audioCallback.monitor_callback
-                )
-
-                self.monitor_stream.start_stream()
+                # Open monitoring stream (input->output); also resets the gain
+                self.engine.start_monitor()
 
                 # Initialize variables for the time count
                 self.logger.info("Create timer")
@@ -349,25 +398,17 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
                 # Start the timer to trigger every 100ms
                 self.timer.Start(100)
 
-                self.current_gain = 2.0 # reset the gain
                 self.m_gain_slider.SetValue(20)
                 self.m_slider_label.SetLabel(f"Amplificación: {20}")
-                self.state_fsm = "monitoring"
 
             elif self.state_fsm == "monitoring":
-                self.logger.info("Stop monitoring")
-
-                if self.monitor_stream:
-                    self.monitor_stream.stop_stream()
-                    self.monitor_stream.close()
-                    self.monitor_stream = None
+                self.engine.stop_monitor()
 
                 # stop the timer
                 self.logger.info("stop timer")
                 if self.timer:
                     self.timer.Stop()  # Stop the timer
                     self.timer = None
-                    self.start_time = None
 
                 self.logger.info("Reset buttons")
                 self.m_buttonMonitor.SetLabel("Iniciar monitor")
@@ -375,6 +416,8 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
                 self.m_buttonStopRec.SetLabel("Finalizar grabacion")
                 self.m_buttonStartRec.Disable()
                 self.m_buttonStopRec.Disable()
+                self.m_choiceInput.Enable()
+                self.m_choiceOutput.Enable()
 
                 self.m_textCtrlFilename.SetValue("      Iniciar monitoreo para fijar el nombre del audio!")
 
@@ -387,8 +430,6 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
                 # disable ability to edit
                 self.m_textCtrlFilename.SetEditable(False)
 
-                self.state_fsm = "idle"
-
             event.Skip()
 
         except ValueError as e:
@@ -411,10 +452,11 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
 
     def onStartRec(self, event):
         """
-        Start or resume audio recording.
+        Start, pause or resume audio recording.
 
-        - From 'init': creates output WAV file, starts timer, and
-          begins writing audio frames.
+        - From 'monitoring': validates the filename and starts a new take.
+        - From 'recording': pauses (the stream keeps running).
+        - From 'pause_rec': resumes.
 
         Args:
             event: wx.Event triggered by record button.
@@ -425,8 +467,6 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
 
         try:
             if self.state_fsm == "monitoring":
-                self.logger.info("Start recording")
-
                 # check the filename
                 # repeat until valid filename
                 self.output_filename = self.m_textCtrlFilename.GetValue()
@@ -440,81 +480,43 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
                 self.logger.info("Lock filename")
                 self.m_textCtrlFilename.SetEditable(False)
                 self.m_textCtrlFilename.Disable()
-                if not self.output_filename.endswith('.wav'):
-                    self.output_filename += '.wav'
-                self.output_filename = os.path.join(self.cds_audio_path, self.output_filename)
-
-                self.logger.info("Open output_wavefile")
-                self.output_wavefile = wave.open(self.output_filename, 'wb')
-                self.output_wavefile.setnchannels(CHANNELS)
-                self.output_wavefile.setsampwidth(self.pya.get_sample_size(FORMAT))
-                self.output_wavefile.setframerate(RATE)
-
-                # Open input-only recording stream
-                self.logger.info("Open Audio stream for output file.")
-                self.record_stream = self.pya.open(
-                    format=FORMAT,
-                    channels=CHANNELS,
-                    rate=RATE,
-                    input=True,
-                    output=False,
-                    frames_per_buffer=CHUNK,
-                    stream_callback=self.audioCallback.record_callback
-                )
-                self.record_stream.start_stream()
-
-                # start elapsed time counter
-                self.rec_elapsed = 0
-                self.start_time = time.monotonic()
-                self.timer_running = True
-
-                frame.m_buttonStartRec.SetLabel("Grabando...")
-
-                self.state_fsm = "recording"
 
-            elif self.state_fsm == "recording":
-                self.logger.info("Pause recording")
-                self.record_stream.stop_stream()
+                self.output_filename = self.engine.start_recording(self.output_filename)
 
-                frame.m_buttonStartRec.SetLabel("Pausado...")
-                frame.m_buttonStartRec.SetBackgroundColour(wx.Colour(255, 255, 0))  # Yellow
-                frame.m_buttonStartRec.Refresh()
+                self.m_buttonStartRec.SetLabel("Grabando...")
+                self.rec_label = "Grabando..."
+                self.m_checkBoxAutoPause.Disable()
+                self.m_checkBoxNormalize.Disable()
 
-                if self.timer_running:
-                    # Add the time from last start to now
-                    self.rec_elapsed += time.monotonic() - self.start_time
-                    self.timer_running = False
+            elif self.state_fsm == "recording":
+                self.engine.pause_recording()
 
-                self.state_fsm = "pause_rec"
+                self.m_buttonStartRec.SetLabel("Pausado...")
+                self.m_buttonStartRec.SetBackgroundColour(wx.Colour(255, 255, 0))  # Yellow
+                self.m_buttonStartRec.Refresh()
 
             elif self.state_fsm == "pause_rec":
-                self.logger.info("Resume recording")
-                self.record_stream.start_stream()
-
-                # start elapsed time counter
-                self.start_time = time.monotonic()
-                self.timer_running = True
+                self.engine.resume_recording()
 
-                frame.m_buttonStartRec.SetLabel("Grabando...")
-                frame.m_buttonStartRec.SetBackgroundColour(wx.Colour(63, 239, 21))
-                frame.m_buttonStartRec.Refresh()
-
-                self.state_fsm = "recording"
+                self.m_buttonStartRec.SetLabel("Grabando...")
+                self.rec_label = "Grabando..."
+                self.m_buttonStartRec.SetBackgroundColour(wx.Colour(63, 239, 21))
+                self.m_buttonStartRec.Refresh()
 
 
         except OSError as e:
             logging.error(f"Failed to open audio stream: {str(e)}")
-            frame.m_buttonStartRec.SetLabel("ERROR!")
+            self.m_buttonStartRec.SetLabel("ERROR!")
             self.state_fsm = "error"
 
         except Exception as e:
             logging.error(f"An unexpected error occurred: {str(e)}")
-            frame.m_buttonStartRec.SetLabel("ERROR!")
+            self.m_buttonStartRec.SetLabel("ERROR!")
             self.state_fsm = "error"
 
-        frame.m_buttonMonitor.Disable()
-        frame.m_buttonStartRec.Enable()
-        frame.m_buttonStopRec.Enable()
+        self.m_buttonMonitor.Disable()
+        self.m_buttonStartRec.Enable()
+        self.m_buttonStopRec.Enable()
         event.Skip()
 
     def onStopRec(self, event):
@@ -522,10 +524,8 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         Stop audio recording and close audio file.
         Monitoring is ON, state FSM moves to "monitoring"
 
-        - Stops timer .
-        - Finalizes WAV file and closes it.
-        - If export is enabled, converts the WAV file to MP3 via FFmpeg
-          and deletes the original WAV file.
+        - Finalizes the take in the engine (WAV closed, MP3 finished or
+          queued for background conversion).
         - Updates UI buttons to indicate completion.
 
         Args:
@@ -536,106 +536,13 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
 
         self.logger.info("onStopRec")
         try:
-
-            self.logger.info("close wavefile")
-            # Stop recording stream
-            if self.record_stream:
-                self.record_stream.stop_stream()
-                self.record_stream.close()
-                self.record_stream = None
-
-            # Close WAV file
-            if self.output_wavefile:
-                self.output_wavefile.close()
-                self.output_wavefile = None
-
-            # Close the elapsed time counter
-            if self.timer_running:
-                # Add the time from last start to now
-                self.rec_elapsed += time.monotonic() - self.start_time
-                self.timer_running = False
-
-            if self.export:
-                self.m_buttonMonitor.Disable()
-                self.m_buttonMonitor.Refresh()
-                self.m_buttonMonitor.Update()
-                self.m_buttonStartRec.Disable()
-                self.m_buttonStartRec.Refresh()
-                self.m_buttonStartRec.Update()
-                self.m_buttonStopRec.Disable()
-                self.m_buttonStopRec.Refresh()
-                self.m_buttonStopRec.Update()
-                self.m_textCtrlFilename.Disable()
-                self.m_textCtrlFilename.SetEditable(False)
-                self.m_textCtrlFilename.Refresh()
-                self.m_textCtrlFilename.Update()
-
-                # Show non-modal progress dialog
-                progress_dlg = wx.ProgressDialog(
-                    "Conversion en curso...",
-                    "Convirtiendo de formato WAV a MP3. Paciencia por favor...",
-                    maximum=100,
-                    parent=self,
-                    style=wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME
-                )
-
-                def export_task():
-                    try:
-                        self.logger.info("read wave")
-                        sound = AudioSegment.from_wav(frame.output_filename)
-
-                        base, _ = self.output_filename.rsplit('.', 1)
-                        mp3_filename = f"{base}.mp3"
-
-                        # Fake progress simulation
-                        for i in range(1, 101):
-                            time.sleep(0.02)  # simulate work
-                            # Check if dialog still exists
-                            if progress_dlg and not progress_dlg.IsBeingDeleted():
-                                wx.CallAfter(progress_dlg.Update, i)
-
-                        self.logger.info(f"export wave {frame.output_filename} to {mp3_filename}")
-                        # Export – no built-in progress, so we just simulate steps
-                        sound.export(mp3_filename, format="mp3", bitrate="192k")
-
-                        self.logger.info("delete wave")
-                        os.remove(self.output_filename)
-                    except Exception as e:
-                        self.logger.error(f"Error in export thread: {e}", exc_info=True)
-
-                    # finally:
-                    #    try:
-                    #        wx.CallAfter(progress_dlg.Destroy)
-                    #        self.logger.info("Closed dialog box")
-                    #    except Exception as e:
-                    #        self.logger.error(f"Error closing dialog: {e}", exc_info=True)
-
-
-                # Run export in a thread so UI remains responsive
-                self.logger.info("Start conversion thread")
-                self.thread = threading.Thread(target=export_task, daemon=False)
-                # Start the thread
-                self.thread.start()
-
-                self.logger.info("Wait for conversion thread to complete")
-                self.thread.join()
-                self.logger.info("Thread completed")
-
-                # NOW destroy the dialog on the main thread
-                try:
-                    progress_dlg.Destroy()
-                    self.logger.info("Closed dialog box")
-                except Exception as e:
-                    self.logger.error(f"Error closing dialog: {e}", exc_info=True)
-
-            else:
-                self.logger.info("Thread was not started")
+            result = self.engine.stop_recording()
+            self.last_peaks = result["peaks"] or self.last_peaks
 
             self.logger.info("Set output filename")
 
             # Create a new unique WAV filename based on date and time
-            now = datetime.datetime.now()
-            self.output_filename = f"audio_{now.strftime('%d-%m-%Y_%H-%M-%S')}.wav"
+            self.output_filename = timestamp_filename()
             base, extension = self.output_filename.rsplit('.', 1)
             self.m_textCtrlFilename.SetValue(base)
             self.m_textCtrlFilename.SetEditable(True)
@@ -660,7 +567,8 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
             self.m_textCtrlFilename.SetEditable(True)
             self.m_textCtrlFilename.Refresh()
             self.m_textCtrlFilename.Update()
-            self.state_fsm = "monitoring"
+            self.m_checkBoxAutoPause.Enable()
+            self.m_checkBoxNormalize.Enable(bool(self.engine.export))
 
         except OSError as e:
             logging.error(f"Failed to close audio stream: {str(e)}")
@@ -677,33 +585,56 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         except:
             pass
 
-
-    def elapsed(self):
+    def on_export_update(self, job):
         """
-        Calculates recording elpased time
-
-        Updates `self.rec_elapsed` based on the accumulated value and current time
+        Export queue listener. Runs on a worker thread, so the display
+        update is handed over to the GUI thread.
 
         Args:
-            None
+            job (dict): Copy of the job that changed.
+        """
+        wx.CallAfter(self.update_export_status)
+
+    def update_export_status(self):
+        """
+        Show the state and progress of every pending conversion.
         """
-        if self.timer_running:
-            return self.rec_elapsed + (time.monotonic() - self.start_time)
-        else:
-            return self.rec_elapsed
+        if not self:
+            return  # Frame already destroyed
+
+        if self.engine is None or self.engine.export_queue is None:
+            self.m_staticTextExport.SetLabel("")
+            return
+
+        jobs = self.engine.export_queue.active_jobs()
+        if not jobs:
+            self.m_staticTextExport.SetLabel("Conversiones: ninguna pendiente")
+            return
+
+        from export_queue import RUNNING  # Already loaded by the engine
+
+        parts = []
+        for job in jobs:
+            name = os.path.splitext(os.path.basename(job["input"]))[0]
+            if job["status"] == RUNNING:
+                parts.append(f"{name} {job['progress']}%")
+            else:
+                parts.append(f"{name} en espera")
+        self.m_staticTextExport.SetLabel("Conversiones: " + " | ".join(parts))
 
     def onGainChange(self, event):
         """
         Handle changes to the gain slider.
 
-        Updates `self.current_gain` based on the slider value and
+        Updates the engine's `current_gain` based on the slider value and
         reflects the value in the UI label.
 
         Args:
             event: wx.Event triggered by slider adjustment.
         """
         slider_value = self.m_gain_slider.GetValue()
-        self.current_gain = slider_value / 10.0  # Adjust gain based on slider position
+        if self.engine is not None:
+            self.engine.current_gain = slider_value / 10.0  # Adjust gain based on slider position
 
         self.m_slider_label.SetLabel(f"Amplificación: {slider_value}")
 
@@ -727,11 +658,12 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
 
         - Converts internal counter into a formatted time string (HH:MM:SS.mmm).
         - Updates the text control with elapsed time.
-        - Updates microphone input level gauge if peak level is available.
+        - Reads the level meter once per frame (dB conversion happens here,
+          not in the audio callback) and updates the gauge and level label.
         """
 
         # Convert counter to hours:minutes:seconds:milliseconds format
-        elapsed = self.elapsed()
+        elapsed = self.engine.elapsed() if self.engine is not None else 0.0
         hours = int(elapsed // 3600)
         minutes = int((elapsed % 3600) // 60)
         seconds = int(elapsed % 60)
@@ -741,9 +673,51 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         time_str = f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
         self.m_textCtrlRecTime.SetValue(time_str)
 
-        if self.peak_level_db is not None:
-            gauge_value = self.map_db_to_gauge()
-            self.m_gaugeMicLevel.SetValue(gauge_value)
+        if self.engine is None:
+            return
+
+        # Everything the callback measured since the last frame, peaks included
+        levels = self.engine.read_levels()
+        self.peak_level_db = levels["display_db"]
+        self.m_gaugeMicLevel.SetValue(self.map_db_to_gauge())
+
+        # Automatic pause: show whether the silence is being left out
+        if self.state_fsm == "recording":
+            rec_label = "En silencio..." if self.engine.is_auto_paused() else "Grabando..."
+            if rec_label != self.rec_label:
+                self.rec_label = rec_label
+                self.m_buttonStartRec.SetLabel(rec_label)
+
+        meter_label = (f"      Nivel del microfono   (pico {levels['hold_db']:.1f} dB, "
+                       f"RMS {levels['rms_db']:.1f} dB, recortes {levels['clips']})")
+        if meter_label != self.meter_label:
+            self.meter_label = meter_label
+            self.m_staticText11.SetLabel(meter_label)
+
+        # Callback statistics change slowly: refresh them once per second
+        self.timer_ticks += 1
+        if self.timer_ticks % 10 == 1:
+            self.update_stats_display()
+
+    def update_stats_display(self):
+        """
+        Show a live snapshot of the audio callback instrumentation, to tell
+        driver problems (overflows, latency) from CPU problems (slow callbacks).
+        """
+        if self.state_fsm == "idle":
+            self.m_staticTextStats.SetLabel("")
+            return
+
+        stats = self.engine.get_callback_stats()
+        if not stats["blocks"]:
+            return
+        latency = stats["latency_ms_mean"]
+        latency_str = f"{latency:.1f} ms" if latency is not None else "n/d"
+        self.m_staticTextStats.SetLabel(
+            f"Callback: p99 {stats['callback_ms_p99']} ms, max {stats['callback_ms_max']:.2f} ms | "
+            f"latencia {latency_str} | overflows {stats['input_overflows']} | "
+            f"underflows {stats['output_underflows']}"
+        )
 
     def map_db_to_gauge(self):
         """
@@ -770,129 +744,53 @@ class GUI(GrabadoraGUIFrame.GrabadoraGUIFrame):
         # Linear scaling between db_min and db_max
         return int((self.peak_level_db - db_min) / (db_max - db_min) * 100)
 
-    def onFrameExit(self, event):
-        """
-        Exit the application when the frame is closed.
-
-        Args:
-            event: wx.Event triggered by window close action.
-        """
-        self.logger.info("onFrameExit")
-        wx.Exit()  # This will close the entire application
-
-class MyAudioCallback(wx.EvtHandler):
-    """
-    Helper class that wraps the PyAudio callback function.
-
-    Stores a reference to the main GUI instance so that the
-    callback can update state such as gain and peak levels.
-    """
-    def __init__(self, instance):
+    def onWaveform(self, event):
         """
-        Initialize the callback handler.
+        Show the waveform of a recording from its peak index. A WAV file
+        without index gets one first (this reads the audio once).
 
         Args:
-            instance (GUI): Reference to the GUI class that owns
-                            the recording state and output file.
+            event: wx.Event triggered by the waveform button.
         """
-        super().__init__()
-        self.instance = instance  # Store the instance reference
-        self.logger = logging.getLogger(self.__class__.__name__)
-        self.logger.info("Audio callback handler initialized")
-
-
-    def monitor_callback(self, in_data, frame_count, time_info, status):
-        """
-        PyAudio stream callback for monitoring audio data.
-
-        Workflow:
-            - Converts input bytes to NumPy array of int16 samples.
-            - Applies gain from `instance.current_gain`.
-            - Clips values to int16 range.
-            - Updates peak decibel level for UI gauge.
-            - Writes amplified samples to WAV file if in 'start' state.
-            - Returns processed audio as bytes for playback.
-
-        Args:
-            in_data (bytes): Raw input audio data.
-            frame_count (int): Number of audio frames in this buffer.
-            time_info (dict): Timing information from PyAudio.
-            status (int): Status flag from PyAudio.
-
-        Returns:
-            tuple: (out_data, pyaudio.paContinue)
-        """
-        # Convert audio data to NumPy array
-        audio_data = np.frombuffer(in_data, dtype=np.int16)
-
-        # Apply gain dynamically
-        adjusted_gain = self.instance.current_gain  # Use the current gain from the instance
-        amplified_data = np.clip(audio_data * adjusted_gain, -32768, 32767).astype(np.int16)  # Apply gain and clip
-        # amplified_data = np.clip(audio_data * adjusted_gain, np.iinfo(np.int16).min, np.iinfo(np.int16).max).astype(np.int16)
-
-        # Calculate the peak level (maximum absolute value)
-        peak_level = np.max(np.abs(amplified_data))
-
-        # Avoid divide by zero issue by checking if peak_level is 0
-        if peak_level > 0:
-            self.instance.peak_level_db = 20 * np.log10(peak_level / np.iinfo(np.int16).max)
-        else:
-            self.instance.peak_level_db = -100  # Set to a very low dB value for silence
-
-        # Convert back to bytes
-        out_data = amplified_data.tobytes()
-
-        return out_data, pyaudio.paContinue
-
+        default_dir, default_file = str(self.cds_audio_path), ""
+        if self.last_peaks:
+            default_dir, default_file = os.path.split(self.last_peaks)
+
+        with wx.FileDialog(self, "Ver forma de onda", defaultDir=default_dir, defaultFile=default_file,
+                           wildcard="Índice de forma de onda (*.peaks)|*.peaks|Archivos WAV (*.wav)|*.wav",
+                           style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST) as dialog:
+            if dialog.ShowModal() != wx.ID_OK:
+                return
+            filename = dialog.GetPath()
+
+        from peaks import build_peak_index, peaks_filename
+        from waveform_view import WaveformFrame
+        try:
+            if filename.lower().endswith('.wav'):
+                index_filename = peaks_filename(filename)
+                if not os.path.exists(index_filename):
+                    with wx.BusyCursor():
+                        build_peak_index(filename, index_filename)
+                filename = index_filename
+            WaveformFrame(self, filename).Show()
+        except (ValueError, OSError) as e:
+            self.logger.error(f"Could not show waveform of {filename}: {e}")
+            wx.MessageBox(str(e), "Forma de onda", wx.ICON_ERROR | wx.OK)
 
-    def record_callback(self, in_data, frame_count, time_info, status):
+    def onFrameExit(self, event):
         """
-        PyAudio stream callback for writing audio data to a file.
-
-        Workflow:
-            - Converts input bytes to NumPy array of int16 samples.
-            - Applies gain from `instance.current_gain`.
-            - Clips values to int16 range.
-            - Updates peak decibel level for UI gauge.
-            - Writes amplified samples to WAV file if in 'start' state.
-            - Returns processed audio as bytes for playback.
+        Exit the application when the frame is closed.
 
         Args:
-            in_data (bytes): Raw input audio data.
-            frame_count (int): Number of audio frames in this buffer.
-            time_info (dict): Timing information from PyAudio.
-            status (int): Status flag from PyAudio.
-
-        Returns:
-            tuple: (None, pyaudio.paContinue)
+            event: wx.Event triggered by window close action.
         """
-        # Convert audio data to NumPy array
-        audio_data = np.frombuffer(in_data, dtype=np.int16)
-
-        # Apply gain dynamically
-        adjusted_gain = self.instance.current_gain  # Use the current gain from the instance
-        amplified_data = np.clip(audio_data * adjusted_gain, -32768, 32767).astype(np.int16)  # Apply gain and clip
-        # amplified_data = np.clip(audio_data * adjusted_gain, np.iinfo(np.int16).min, np.iinfo(np.int16).max).astype(np.int16)
-
-        # Calculate the peak level (maximum absolute value)
-        peak_level = np.max(np.abs(amplified_data))
-
-        # Avoid divide by zero issue by checking if peak_level is 0
-        if peak_level > 0:
-            self.instance.peak_level_db = 20 * np.log10(peak_level / np.iinfo(np.int16).max)
-        else:
-            self.instance.peak_level_db = -100  # Set to a very low dB value for silence
-
-        # Process audio data for recording (e.g., write to a buffer)
-        while self.instance.output_wavefile is None:
-            time.sleep(1)
-
-        # only write to output file if in start mode; if pause, don't
-        if self.instance.output_wavefile is not None:
-            self.instance.output_wavefile.writeframes(amplified_data)  # Write data to the WAV file
-
-        return None, pyaudio.paContinue
+        self.logger.info("onFrameExit")
+        # Pending conversions stay in the queue file and resume on next launch
+        if self.engine is not None:
+            self.engine.shutdown()
+        wx.Exit()  # This will close the entire application
 
+IMPORT_DONE = time.perf_counter()
 
 if __name__ == "__main__":
     logging.info("Start app.")
@@ -901,8 +799,8 @@ if __name__ == "__main__":
     frame = GUI(None)
     logging.info("Start frame.update_display()")
     frame.update_display()  # Show initial time in the text control
-    logging.info("Disable all buttons")
-    frame.m_buttonMonitor.Enable()
+    logging.info("Disable all buttons (monitor is enabled once the engine is ready)")
+    frame.m_buttonMonitor.Disable()
     frame.m_buttonStartRec.Disable()
     frame.m_buttonStopRec.Disable()
     logging.info("Start main loop")
@@ -0,0 +1,476 @@
+"""
+Grabadora Command Line
+======================
+
+Description:
+    Headless front end for the RecorderEngine, for unattended recorders on
+    machines without a display. Uses the same state machine as the GUI and
+    never imports wx.
+
+Usage:
+    python grabadora_cli.py record [--name NAME] [--duration SECONDS] [--gain GAIN]
+                                   [--output-dir DIR] [--no-export] [--playback]
+                                   [--segment-minutes MINUTES] [--input DEVICE] [--output DEVICE]
+                                   [--auto-pause] [--vad-threshold DB] [--format {flac,mp3,opus}]
+                                   [--normalize LUFS]
+
+    The recording stops after --duration seconds, or on Ctrl+C / SIGTERM.
+    With --segment-minutes the take is cut into WAV segments that are
+    converted to MP3 while the recording goes on. With --auto-pause the
+    silent parts are left out of the file. With --normalize the exported
+    file is brought to that integrated loudness (e.g. -16 LUFS for speech).
+
+    python grabadora_cli.py multitrack --device DEVICE --device DEVICE [...] [--poly]
+                                       [--name NAME] [--duration SECONDS] [--output-dir DIR]
+                                       [--no-export] [--format {flac,mp3,opus}] [--normalize LUFS]
+
+    Records several input devices at once, aligned on a shared clock: one
+    WAV file per device, or one polyphonic WAV file with --poly.
+
+    python grabadora_cli.py devices
+
+    Lists the audio devices; --input/--output take a device key or part of
+    its name.
+
+    python grabadora_cli.py recover [--dry-run] PATH [PATH ...]
+
+    Repairs the header of WAV files left by a crash (PATH may be a folder).
+
+    python grabadora_cli.py peaks [--force] PATH [PATH ...]
+
+    Builds the waveform peak index (<name>.peaks) of WAV files recorded
+    without one (PATH may be a folder).
+
+    python grabadora_cli.py convert [--output-dir DIR] [--workers N] [--recursive] [--keep-wav]
+                                    [--format {flac,mp3,opus}] [--normalize LUFS]
+
+    Converts every WAV left in the audio folder (to MP3 by default), one
+    file per CPU core. Files already converted are skipped from a
+    content-hash cache; a WAV is deleted only once its output passed an
+    integrity check. --normalize brings every file to that loudness.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+
+from filenames import default_audio_dir, timestamp_filename
+from wavio import repair_wav
+
+STATUS_INTERVAL = 1.0  # Seconds between two status lines
+
+
+def format_elapsed(elapsed):
+    """
+    Format seconds as HH:MM:SS.mmm, like the GUI time display.
+    """
+    hours = int(elapsed // 3600)
+    minutes = int((elapsed % 3600) // 60)
+    seconds = int(elapsed % 60)
+    milliseconds = int((elapsed - int(elapsed)) * 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
+
+
+def find_device(engine, text, inputs):
+    """
+    Find a device by exact key or by (case insensitive) part of its name.
+
+    Args:
+        engine (RecorderEngine): Ready engine.
+        text (str): Device key or name fragment.
+        inputs (bool): Search input devices, else output devices.
+
+    Returns:
+        str: Device key.
+
+    Raises:
+        ValueError: If no device, or more than one, matches.
+    """
+    devices = engine.devices.inputs() if inputs else engine.devices.outputs()
+    for device in devices:
+        if device["key"] == text:
+            return device["key"]
+    matches = [device for device in devices if text.lower() in device["name"].lower()]
+    if len(matches) != 1:
+        kind = "entrada" if inputs else "salida"
+        raise ValueError(f"{len(matches)} dispositivos de {kind} coinciden con '{text}'")
+    return matches[0]["key"]
+
+
+def cmd_devices(args):
+    """
+    List the audio devices with their cached capabilities.
+
+    Returns:
+        int: Process exit code.
+    """
+    from engine import RecorderEngine
+
+    engine = RecorderEngine(args.output_dir, export=False)
+    try:
+        for device in engine.devices.devices:
+            print(f"[{device['index']:2}] {device['name']} ({device['host_api']})  "
+                  f"entrada {device['max_input_channels']} can. {device['input_rates']}  "
+                  f"salida {device['max_output_channels']} can. {device['output_rates']}")
+            print(f"     {device['key']}")
+    finally:
+        engine.shutdown()
+    return 0
+
+
+def cmd_record(args):
+    """
+    Record one take: monitor -> record -> stop, then wait for a queued
+    conversion (if any) to finish.
+
+    Returns:
+        int: Process exit code.
+    """
+    from engine import RecorderEngine  # numpy and the audio stack are only needed to record
+
+    logger = logging.getLogger("cmd_record")
+    stop_requested = []
+
+    def request_stop(signum, frame):
+        stop_requested.append(signum)
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    export = False if args.no_export else None
+    engine = RecorderEngine(args.output_dir, export=export)
+    if not engine.export:
+        logger.warning("ffmpeg not available: recording to WAV only")
+
+    try:
+        engine.export_format = args.format
+        engine.normalize_lufs = args.normalize
+        engine.segment_minutes = args.segment_minutes
+        engine.auto_pause = args.auto_pause
+        if args.vad_threshold is not None:
+            engine.vad_threshold_db = args.vad_threshold
+        engine.select_devices(
+            find_device(engine, args.input, True) if args.input else None,
+            find_device(engine, args.output, False) if args.output else None
+        )
+        engine.start_monitor(playback=args.playback)
+        engine.current_gain = args.gain
+        filename = engine.start_recording(args.name or timestamp_filename())
+        print(f"Grabando en {filename}", flush=True)
+
+        next_status = time.monotonic() + STATUS_INTERVAL
+        while not stop_requested:
+            if args.duration and engine.elapsed() >= args.duration:
+                break
+            time.sleep(0.05)
+
+            if time.monotonic() >= next_status:
+                next_status += STATUS_INTERVAL
+                levels = engine.read_levels()
+                stats = engine.get_writer_stats() or {}
+                silence = "  (silencio)" if engine.is_auto_paused() else ""
+                print(f"{format_elapsed(engine.elapsed())}  pico {levels['hold_db']:6.1f} dB  "
+                      f"RMS {levels['rms_db']:6.1f} dB  recortes {levels['clips']}  "
+                      f"overruns {stats.get('overruns', 0)}{silence}", flush=True)
+
+        result = engine.stop_recording()
+        print(f"Grabacion finalizada: {result['export'] or result['wav'] or result['segments']}", flush=True)
+
+        job_ids = set(result["jobs"])
+        if job_ids:
+            if result["streamed"]:
+                print("Agregando marcadores...", flush=True)
+            else:
+                print(f"Convirtiendo a {args.format.upper()}...", flush=True)
+            while any(j["id"] in job_ids for j in engine.export_queue.active_jobs()):
+                time.sleep(0.2)
+
+        engine.stop_monitor()
+
+    except (ValueError, OSError) as e:
+        logger.error(f"Recording failed: {e}")
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    finally:
+        engine.shutdown()
+
+    return 0
+
+
+def cmd_multitrack(args):
+    """
+    Record several input devices at once until --duration or Ctrl+C, then
+    wait for the queued conversions.
+
+    Returns:
+        int: Process exit code.
+    """
+    from engine import RecorderEngine
+
+    logger = logging.getLogger("cmd_multitrack")
+    stop_requested = []
+
+    def request_stop(signum, frame):
+        stop_requested.append(signum)
+
+    signal.signal(signal.SIGINT, request_stop)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, request_stop)
+
+    export = False if args.no_export else None
+    engine = RecorderEngine(args.output_dir, export=export)
+    try:
+        engine.export_format = args.format
+        engine.normalize_lufs = args.normalize
+        keys = [find_device(engine, text, True) for text in args.device]
+        files = engine.start_multitrack(args.name or timestamp_filename(), keys, polyphonic=args.poly)
+        for filename in files:
+            print(f"Grabando en {filename}", flush=True)
+
+        next_status = time.monotonic() + STATUS_INTERVAL
+        while not stop_requested:
+            if args.duration and engine.elapsed() >= args.duration:
+                break
+            time.sleep(0.05)
+
+            if time.monotonic() >= next_status:
+                next_status += STATUS_INTERVAL
+                stats = engine.multitrack.stats()
+                drops = sum(track["ring_dropped_frames"] for track in stats["tracks"])
+                drift = "  ".join(f"{track['drift_ppm']:+.1f}" for track in stats["tracks"])
+                print(f"{format_elapsed(engine.elapsed())}  escrito {format_elapsed(engine.multitrack.elapsed())}  "
+                      f"deriva ppm {drift}  perdidos {drops}", flush=True)
+
+        result = engine.stop_multitrack()
+        for track in result["tracks"]:
+            print(f"{track['device']}: {track['measured_rate']} Hz ({track['drift_ppm']:+.1f} ppm), "
+                  f"inicio {track['start_offset_ms']} ms", flush=True)
+        print(f"Grabacion finalizada: {result['summary']}", flush=True)
+
+        job_ids = set(result["jobs"])
+        if job_ids:
+            print(f"Convirtiendo a {args.format.upper()}...", flush=True)
+            while any(j["id"] in job_ids for j in engine.export_queue.active_jobs()):
+                time.sleep(0.2)
+
+    except (ValueError, OSError) as e:
+        logger.error(f"Multi-track recording failed: {e}")
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    finally:
+        engine.shutdown()
+
+    return 0
+
+
+def wav_paths(paths):
+    """
+    Expand folders into their *.wav files (not recursively).
+
+    Returns:
+        list: WAV file paths.
+    """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                    if name.lower().endswith('.wav')))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def cmd_peaks(args):
+    """
+    Build the missing peak index of WAV files.
+
+    Returns:
+        int: Process exit code (1 if any file could not be read).
+    """
+    from peaks import build_peak_index, peaks_filename, PeakIndex
+
+    logger = logging.getLogger("cmd_peaks")
+    failed = 0
+    for filename in wav_paths(args.paths):
+        index_filename = peaks_filename(filename)
+        try:
+            if args.force or not os.path.exists(index_filename):
+                build_peak_index(filename, index_filename)
+                status = "CREADO"
+            else:
+                status = "OK"
+            index = PeakIndex(index_filename)
+        except (ValueError, OSError) as e:
+            logger.error(f"Could not index {filename}: {e}")
+            print(f"ERROR {filename}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(f"{status:7} {index_filename}  {format_elapsed(index.duration)}", flush=True)
+
+    return 1 if failed else 0
+
+
+def cmd_recover(args):
+    """
+    Repair the header of WAV files whose sizes do not match the data on
+    disk. Folders are scanned for *.wav files (not recursively).
+
+    Returns:
+        int: Process exit code (1 if any file could not be read).
+    """
+    logger = logging.getLogger("cmd_recover")
+    failed = 0
+    for filename in wav_paths(args.paths):
+        try:
+            report = repair_wav(filename, dry_run=args.dry_run)
+        except (ValueError, OSError) as e:
+            logger.error(f"Could not repair {filename}: {e}")
+            print(f"ERROR {filename}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+
+        if report["declared_bytes"] == report["actual_bytes"]:
+            status = "OK"
+        elif args.dry_run:
+            status = "DANADO"
+        else:
+            status = "REPARADO"
+        kind = " (RF64)" if report["rf64"] else ""
+        print(f"{status:9} {filename}  {format_elapsed(report['duration_s'])}{kind}", flush=True)
+
+    return 1 if failed else 0
+
+
+def cmd_convert(args):
+    """
+    Convert the pending WAV files of the audio folder (to MP3 by default).
+
+    Returns:
+        int: Process exit code (1 if any file failed, 2 without ffmpeg).
+    """
+    import shutil
+    from batch import BatchTranscoder, pending_wavs, CONVERTED, SKIPPED
+    from encoders import FFMPEG
+
+    if shutil.which(FFMPEG) is None:
+        print("FFmpeg no esta instalado o no se lo encuentra en el PATH", file=sys.stderr)
+        return 2
+
+    labels = {CONVERTED: "CONVERTIDO", SKIPPED: "OMITIDO"}
+
+    def on_result(result):
+        status = labels.get(result["status"], "ERROR")
+        deleted = "  (WAV borrado)" if result["deleted"] else ""
+        error = f"  {result['error']}" if result["error"] else ""
+        print(f"{status:10} {result['input']}  {result['seconds']:.1f} s{deleted}{error}", flush=True)
+
+    filenames = pending_wavs(args.output_dir, recursive=args.recursive)
+    transcoder = BatchTranscoder(args.output_dir, workers=args.workers, delete_source=not args.keep_wav,
+                                 encoder=args.format, on_result=on_result, normalize=args.normalize)
+    print(f"{len(filenames)} archivos WAV, {transcoder.workers} conversiones simultaneas", flush=True)
+    t0 = time.monotonic()
+    results = transcoder.run(filenames)
+
+    counts = {status: sum(1 for result in results if result["status"] == status) for status in labels}
+    failed = len(results) - sum(counts.values())
+    print(f"{counts[CONVERTED]} convertidos, {counts[SKIPPED]} omitidos, {failed} con error "
+          f"en {format_elapsed(time.monotonic() - t0)}")
+    return 1 if failed else 0
+
+
+def build_parser():
+    """
+    Returns:
+        argparse.ArgumentParser: Parser with one sub-command per action.
+    """
+    from encoders import ENCODERS, DEFAULT_FORMAT
+
+    parser = argparse.ArgumentParser(prog="grabadora_cli", description="Grabadora sin interfaz grafica")
+    format_help = "Formato comprimido: mp3, opus (voz, el mas liviano) o flac (sin perdida)"
+    normalize_help = "Normalizar el volumen exportado a esta sonoridad integrada (p. ej. -16 LUFS para voz)"
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log at DEBUG level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="Grabar una toma")
+    record.add_argument("--name", help="Nombre del archivo (por defecto audio_<fecha>)")
+    record.add_argument("--duration", type=float, default=0.0,
+                        help="Duracion en segundos (0 = hasta Ctrl+C)")
+    record.add_argument("--gain", type=float, default=2.0, help="Amplificacion lineal")
+    record.add_argument("--output-dir", default=str(default_audio_dir()), help="Carpeta de salida")
+    record.add_argument("--no-export", action="store_true", help="Solo WAV, sin archivo comprimido")
+    record.add_argument("--playback", action="store_true", help="Escuchar la entrada por la salida por defecto")
+    record.add_argument("--segment-minutes", type=float, default=0.0,
+                        help="Cortar la grabacion en segmentos de N minutos (0 = un solo archivo)")
+    record.add_argument("--input", help="Dispositivo de entrada (clave o parte del nombre)")
+    record.add_argument("--output", help="Dispositivo de salida para --playback (clave o parte del nombre)")
+    record.add_argument("--auto-pause", action="store_true",
+                        help="No grabar los silencios (pausa y reanudacion automaticas)")
+    record.add_argument("--vad-threshold", type=float,
+                        help="Nivel RMS en dBFS que cuenta como voz (por defecto -45)")
+    record.add_argument("--format", choices=sorted(ENCODERS), default=DEFAULT_FORMAT, help=format_help)
+    record.add_argument("--normalize", type=float, metavar="LUFS", help=normalize_help)
+    record.set_defaults(func=cmd_record)
+
+    multitrack = subparsers.add_parser("multitrack", help="Grabar varios dispositivos a la vez")
+    multitrack.add_argument("--device", action="append", required=True,
+                            help="Dispositivo de entrada (clave o parte del nombre); repetir por pista")
+    multitrack.add_argument("--poly", action="store_true",
+                            help="Un solo WAV con un canal por dispositivo")
+    multitrack.add_argument("--name", help="Nombre base de los archivos (por defecto audio_<fecha>)")
+    multitrack.add_argument("--duration", type=float, default=0.0,
+                            help="Duracion en segundos (0 = hasta Ctrl+C)")
+    multitrack.add_argument("--output-dir", default=str(default_audio_dir()), help="Carpeta de salida")
+    multitrack.add_argument("--no-export", action="store_true", help="Solo WAV, sin archivo comprimido")
+    multitrack.add_argument("--format", choices=sorted(ENCODERS), default=DEFAULT_FORMAT, help=format_help)
+    multitrack.add_argument("--normalize", type=float, metavar="LUFS", help=normalize_help)
+    multitrack.set_defaults(func=cmd_multitrack)
+
+    devices = subparsers.add_parser("devices", help="Listar los dispositivos de audio")
+    devices.add_argument("--output-dir", default=str(default_audio_dir()),
+                         help="Carpeta de salida (donde se guarda el cache de dispositivos)")
+    devices.set_defaults(func=cmd_devices)
+
+    recover = subparsers.add_parser("recover", help="Reparar archivos WAV de una grabacion interrumpida")
+    recover.add_argument("paths", nargs="+", help="Archivos WAV o carpetas")
+    recover.add_argument("--dry-run", action="store_true", help="Solo informar, sin modificar")
+    recover.set_defaults(func=cmd_recover)
+
+    peaks = subparsers.add_parser("peaks", help="Crear el indice de forma de onda de archivos WAV")
+    peaks.add_argument("paths", nargs="+", help="Archivos WAV o carpetas")
+    peaks.add_argument("--force", action="store_true", help="Rehacer los indices existentes")
+    peaks.set_defaults(func=cmd_peaks)
+
+    convert = subparsers.add_parser("convert", help="Convertir los WAV pendientes de la carpeta (MP3, Opus o FLAC)")
+    convert.add_argument("--output-dir", default=str(default_audio_dir()), help="Carpeta de las grabaciones")
+    convert.add_argument("--workers", type=int, help="Conversiones simultaneas (por defecto, una por nucleo)")
+    convert.add_argument("--recursive", action="store_true", help="Incluir las subcarpetas")
+    convert.add_argument("--keep-wav", action="store_true", help="No borrar los WAV convertidos")
+    convert.add_argument("--format", choices=sorted(ENCODERS), default=DEFAULT_FORMAT, help=format_help)
+    convert.add_argument("--normalize", type=float, metavar="LUFS", help=normalize_help)
+    convert.set_defaults(func=cmd_convert)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(name)s.%(funcName)s - %(message)s'
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
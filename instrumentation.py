@@ -0,0 +1,186 @@
+"""
+Callback Instrumentation
+========================
+
+Description:
+    Lightweight statistics of the audio callback hot path:
+        - callback duration histogram
+        - input overflow / underflow and output underflow / overflow
+          counters, from the PortAudio `status` flags
+        - ADC-to-callback latency, from the PortAudio `time_info`
+
+    Recording a block only increments preallocated counters (no locks, no
+    allocation of sample-sized arrays), so it can run inside the callback.
+    Snapshots are computed on demand from another thread, for the live
+    display and for the per-session JSON summary saved next to the
+    recording. Together they tell a driver problem (overflows, latency)
+    from a CPU problem (slow callbacks).
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import json
+import bisect
+import logging
+
+import numpy as np
+
+from backends import INPUT_UNDERFLOW, INPUT_OVERFLOW, OUTPUT_UNDERFLOW, OUTPUT_OVERFLOW
+
+# Histogram bin upper edges in milliseconds (last bin catches everything above)
+DURATION_EDGES_MS = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0]
+LATENCY_EDGES_MS = [1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 150.0, 200.0, 500.0, 1000.0]
+
+
+def _histogram_percentile(counts, edges_ms, fraction, max_ms):
+    """
+    Upper edge of the bin where the cumulative count reaches `fraction`,
+    capped by the exact maximum.
+
+    Returns:
+        float | None: Estimated percentile in ms; None without data.
+    """
+    total = int(counts.sum())
+    if total == 0:
+        return None
+    target = fraction * total
+    cumulative = np.cumsum(counts)
+    index = int(np.searchsorted(cumulative, target))
+    if index >= len(edges_ms):
+        return round(max_ms, 4)  # Open-ended last bin
+    return min(edges_ms[index], round(max_ms, 4))
+
+
+class CallbackStats:
+    """
+    Counters and histograms filled by the audio callback.
+
+    Single writer (the callback thread); readers only take snapshots.
+    """
+    def __init__(self, block_period):
+        """
+        Args:
+            block_period (float): Duration of one block in seconds
+                (CHUNK / RATE), the callback's real-time budget.
+        """
+        self.block_period = block_period
+        self._duration_edges = [edge / 1000.0 for edge in DURATION_EDGES_MS]
+        self._latency_edges = [edge / 1000.0 for edge in LATENCY_EDGES_MS]
+        self.duration_hist = np.zeros(len(DURATION_EDGES_MS) + 1, dtype=np.int64)
+        self.latency_hist = np.zeros(len(LATENCY_EDGES_MS) + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all counters. Safe to call while the stream runs: at worst one
+        block is counted in the old period.
+        """
+        self.duration_hist[:] = 0
+        self.latency_hist[:] = 0
+        self.blocks = 0
+        self.duration_sum = 0.0
+        self.duration_max = 0.0
+        self.over_budget = 0        # Callbacks that took longer than a block period
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_samples = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.output_underflows = 0
+        self.output_overflows = 0
+
+    def record(self, duration, status, time_info):
+        """
+        Account one callback (audio callback side).
+
+        Args:
+            duration (float): Seconds spent processing the block.
+            status (int): PortAudio status flags of the block.
+            time_info (dict): PortAudio time info of the block.
+        """
+        self.blocks += 1
+        self.duration_hist[bisect.bisect_left(self._duration_edges, duration)] += 1
+        self.duration_sum += duration
+        if duration > self.duration_max:
+            self.duration_max = duration
+        if duration > self.block_period:
+            self.over_budget += 1
+
+        if status:
+            if status & INPUT_OVERFLOW:
+                self.input_overflows += 1
+            if status & INPUT_UNDERFLOW:
+                self.input_underflows += 1
+            if status & OUTPUT_UNDERFLOW:
+                self.output_underflows += 1
+            if status & OUTPUT_OVERFLOW:
+                self.output_overflows += 1
+
+        # Some host APIs report 0 for the ADC time: no latency then
+        adc_time = time_info.get("input_buffer_adc_time", 0.0) if time_info else 0.0
+        if adc_time > 0:
+            latency = time_info["current_time"] - adc_time
+            if latency >= 0:
+                self.latency_hist[bisect.bisect_left(self._latency_edges, latency)] += 1
+                self.latency_sum += latency
+                self.latency_samples += 1
+                if latency > self.latency_max:
+                    self.latency_max = latency
+
+    def snapshot(self):
+        """
+        Current statistics, for the live display or the session summary.
+
+        Returns:
+            dict: Block count, callback duration (mean/p50/p99/max ms and
+                histogram), over-budget callbacks, status counters and
+                latency (mean/p99/max ms and histogram).
+        """
+        blocks = self.blocks
+        duration_hist = self.duration_hist.copy()
+        latency_hist = self.latency_hist.copy()
+        duration_max_ms = self.duration_max * 1000
+        latency_max_ms = self.latency_max * 1000
+        return {
+            "blocks": blocks,
+            "block_period_ms": round(self.block_period * 1000, 3),
+            "callback_ms_mean": round(self.duration_sum / blocks * 1000, 4) if blocks else None,
+            "callback_ms_p50": _histogram_percentile(duration_hist, DURATION_EDGES_MS, 0.50, duration_max_ms),
+            "callback_ms_p99": _histogram_percentile(duration_hist, DURATION_EDGES_MS, 0.99, duration_max_ms),
+            "callback_ms_max": round(duration_max_ms, 4),
+            "callback_over_budget": self.over_budget,
+            "callback_hist_edges_ms": DURATION_EDGES_MS,
+            "callback_hist": duration_hist.tolist(),
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+            "output_underflows": self.output_underflows,
+            "output_overflows": self.output_overflows,
+            "latency_ms_mean": (round(self.latency_sum / self.latency_samples * 1000, 3)
+                                if self.latency_samples else None),
+            "latency_ms_p99": _histogram_percentile(latency_hist, LATENCY_EDGES_MS, 0.99, latency_max_ms),
+            "latency_ms_max": round(latency_max_ms, 3),
+            "latency_hist_edges_ms": LATENCY_EDGES_MS,
+            "latency_hist": latency_hist.tolist(),
+        }
+
+
+def write_session_summary(filename, summary):
+    """
+    Save a session summary as JSON.
+
+    Args:
+        filename (str): Destination, usually `<recording>.stats.json`.
+        summary (dict): JSON-serializable statistics.
+
+    Returns:
+        bool: True if the file was written.
+    """
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        logging.getLogger("write_session_summary").error(f"Could not write {filename}: {e}")
+        return False
@@ -0,0 +1,154 @@
+"""
+Live Scope Panel
+================
+
+Description:
+    Scrolling waveform and spectrum of the monitored input, drawn from the
+    snapshots published by the LiveAnalyzer thread (analyzer.py).
+
+    The panel never analyzes audio: a wx.Timer polls for a new snapshot at
+    most `fps` times per second and only then asks for a repaint. If a
+    repaint takes more than half of the frame budget (slow machine, remote
+    desktop) the frame rate is halved, down to MIN_FPS, so the event loop
+    always keeps time for the buttons.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import time
+
+import numpy as np
+import wx
+
+MIN_FPS = 5.0
+SPECTRUM_MIN_HZ = 50.0
+SPECTRUM_FLOOR_DB = -90.0
+WAVEFORM_SHARE = 0.6        # Width fraction of the waveform, the spectrum gets the rest
+WAVEFORM_COLOUR = wx.Colour(63, 200, 21)
+SPECTRUM_COLOUR = wx.Colour(90, 160, 255)
+GRID_COLOUR = wx.Colour(60, 60, 60)
+
+
+class LiveScopePanel(wx.Panel):
+    """
+    Panel with the live waveform (left) and spectrum (right).
+    """
+    def __init__(self, parent, source, fps=25.0):
+        """
+        Args:
+            parent (wx.Window): Parent window.
+            source (callable): Returns the latest analyzer snapshot or None
+                (e.g. RecorderEngine.live_snapshot).
+            fps (float): Maximum frame rate.
+        """
+        super().__init__(parent, style=wx.FULL_REPAINT_ON_RESIZE)
+        self.source = source
+        self.max_fps = fps
+        self.fps = fps
+        self.frames_drawn = 0
+        self._sequence = None
+        self._snapshot = None
+        self._bins = None       # Spectrum bin edges per pixel column, cached per width
+
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.SetBackgroundColour(wx.Colour(20, 20, 20))
+        self.SetMinSize(wx.Size(-1, 120))
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_SIZE, self.on_size)
+        self.Bind(wx.EVT_WINDOW_DESTROY, self.on_destroy)
+
+        self.timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.on_timer, self.timer)
+        self.timer.Start(int(1000 / self.fps))
+
+    def on_timer(self, event):
+        """
+        Repaint only when the analyzer published something new.
+        """
+        snapshot = self.source()
+        sequence = snapshot["sequence"] if snapshot is not None else None
+        if sequence != self._sequence:
+            self._sequence = sequence
+            self._snapshot = snapshot
+            self.Refresh(False)
+
+    def on_size(self, event):
+        self._bins = None
+        event.Skip()
+
+    def _throttle(self, paint_seconds):
+        """
+        Halve the frame rate when painting eats more than half the budget;
+        recover slowly when it is cheap again.
+        """
+        budget = 1.0 / self.fps
+        fps = self.fps
+        if paint_seconds > budget / 2 and fps > MIN_FPS:
+            fps = max(MIN_FPS, fps / 2)
+        elif paint_seconds < budget / 8 and fps < self.max_fps:
+            fps = min(self.max_fps, fps + 1)
+        if fps != self.fps:
+            self.fps = fps
+            self.timer.Start(int(1000 / fps))
+
+    def on_paint(self, event):
+        t0 = time.perf_counter()
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        width, height = self.GetClientSize()
+        snapshot = self._snapshot
+        if snapshot is None or width < 20 or height < 20:
+            return
+
+        split = int(width * WAVEFORM_SHARE)
+        self.draw_waveform(dc, snapshot, 0, split - 4, height)
+        self.draw_spectrum(dc, snapshot, split, width - split, height)
+        self.frames_drawn += 1
+        self._throttle(time.perf_counter() - t0)
+
+    def draw_waveform(self, dc, snapshot, left, width, height):
+        """
+        One min/max line per pixel column, newest audio on the right.
+        """
+        mins, maxs = snapshot["waveform_min"], snapshot["waveform_max"]
+        # Reduce (or stretch) the analyzer columns to the pixel columns
+        index = (np.arange(width) * mins.size // width)
+        middle = height / 2.0
+        scale = middle / 32768.0
+        top = (middle - maxs[index] * scale).astype(int)
+        bottom = (middle - mins[index] * scale).astype(int) + 1
+
+        dc.SetPen(wx.Pen(GRID_COLOUR))
+        dc.DrawLine(left, int(middle), left + width, int(middle))
+        dc.SetPen(wx.Pen(WAVEFORM_COLOUR))
+        dc.DrawLineList([(left + x, int(top[x]), left + x, int(bottom[x])) for x in range(width)])
+
+    def draw_spectrum(self, dc, snapshot, left, width, height):
+        """
+        Spectrum on a logarithmic frequency axis, loudest bin per column.
+        """
+        freqs, spectrum = snapshot["freqs"], snapshot["spectrum_db"]
+        if self._bins is None or self._bins.size != width:
+            top_hz = freqs[-1]
+            edges = SPECTRUM_MIN_HZ * (top_hz / SPECTRUM_MIN_HZ) ** (np.arange(width) / float(width))
+            self._bins = np.minimum(np.searchsorted(freqs, edges), freqs.size - 1)
+        columns = np.maximum.reduceat(spectrum, self._bins)
+        columns = np.clip(columns, SPECTRUM_FLOOR_DB, 0.0)
+        y = ((columns / SPECTRUM_FLOOR_DB) * (height - 1)).astype(int)
+
+        dc.SetPen(wx.Pen(GRID_COLOUR))
+        for hz in (100, 1000, 10000):
+            if SPECTRUM_MIN_HZ < hz < freqs[-1]:
+                x = left + int(np.log(hz / SPECTRUM_MIN_HZ) / np.log(freqs[-1] / SPECTRUM_MIN_HZ) * width)
+                dc.DrawLine(x, 0, x, height)
+        # Columns clipped to the floor would be zero-length lines: skip them
+        dc.SetPen(wx.Pen(SPECTRUM_COLOUR))
+        dc.DrawLineList([(left + x, height, left + x, int(y[x])) for x in range(width)
+                         if columns[x] > SPECTRUM_FLOOR_DB])
+
+    def on_destroy(self, event):
+        self.timer.Stop()
+        event.Skip()
@@ -0,0 +1,506 @@
+"""
+Multi-Track Recording
+=====================
+
+Description:
+    Records several input devices at once (e.g. one USB microphone per
+    panelist), either as one WAV file per device or as one polyphonic WAV
+    file with a channel per device.
+
+    Every sound card runs on its own crystal, so two devices nominally at
+    48 kHz drift apart by a few samples per minute, and each stream starts
+    at a different instant. The tracks are put on a shared clock, the
+    PortAudio stream time reported in `time_info`:
+        - each callback stores the ADC time of its first frame next to the
+          device's frame counter;
+        - a least-squares fit of frames against time gives each device's
+          true rate and start offset;
+        - each track is converted to RATE (FormatConverter) and then read
+          at a step of true_rate / nominal_rate (DriftResampler), with a
+          slow correction that keeps it locked to the fitted time line.
+    Output frame n of every track is therefore the sound at time T0 + n / RATE,
+    where T0 is the moment the last device started.
+
+    Threads: one PortAudio callback per device (copy into a ring buffer),
+    one aligner thread per device (conversion and drift compensation, the
+    CPU-heavy part) and one writer thread that takes the frames available
+    on every track and writes them, so all files have the same length.
+
+    A device that stops delivering audio (unplugged, stalled driver) does
+    not hold the others back: once its track has been empty for
+    STALL_SECONDS while the others have audio, the writer fills it with
+    silence, and skips the same number of frames if the device catches up
+    later, so the track stays on the shared clock.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import json
+import time
+import logging
+import threading
+from time import perf_counter
+
+import numpy as np
+
+from backends import CONTINUE, INPUT_OVERFLOW
+from ringbuffer import AudioRingBuffer
+from dsp import FormatConverter, DriftResampler
+from wavio import CrashSafeWavWriter
+
+TIMESTAMP_SLOTS = 4096      # Block timestamps kept per device between two aligner passes
+MIN_FIT_SECONDS = 2.0       # Timestamps collected before a track starts producing output
+LOCK_SECONDS = 10.0         # Time constant of the correction toward the fitted time line
+MAX_TRACK_CHANNELS = 8
+STALL_SECONDS = 2.0         # A track empty this long while the others have audio is padded with silence
+
+
+class TrackCapture:
+    """
+    Input stream of one device. The callback copies the block into a ring
+    buffer and stores (frame counter, ADC time); nothing else.
+    """
+    def __init__(self, device, chunk, ring_seconds):
+        """
+        Args:
+            device (dict): Device from DeviceManager.
+            chunk (int): Frames per callback.
+            ring_seconds (int): Audio the aligner may fall behind.
+        """
+        self.device = device
+        self.rate = device["default_rate"]
+        self.channels = max(1, min(device["max_input_channels"], MAX_TRACK_CHANNELS))
+        self.chunk = chunk
+        self.ring = AudioRingBuffer(self.rate * ring_seconds, self.channels)
+        self.stream = None
+
+        self.frames_captured = 0
+        self.overflows = 0
+        self.first_time = None
+        self.ts_count = 0
+        self.ts_frames = np.zeros(TIMESTAMP_SLOTS, dtype=np.int64)
+        self.ts_times = np.zeros(TIMESTAMP_SLOTS, dtype=np.float64)
+
+    def callback(self, in_data, frame_count, time_info, status):
+        """
+        PyAudio callback of the device stream (its own PortAudio thread).
+        """
+        # Prefer the ADC time; some host APIs only fill current_time
+        t = time_info.get("input_buffer_adc_time", 0.0) if time_info else 0.0
+        if t <= 0:
+            t = time_info.get("current_time", 0.0) if time_info else 0.0
+        if t <= 0:
+            t = perf_counter()
+
+        slot = self.ts_count % TIMESTAMP_SLOTS
+        self.ts_frames[slot] = self.frames_captured
+        self.ts_times[slot] = t
+        if self.first_time is None:
+            self.first_time = t
+        self.ts_count += 1  # Publish after the slot is filled
+
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        self.frames_captured += frame_count
+        if status & INPUT_OVERFLOW:
+            self.overflows += 1
+        return None, CONTINUE
+
+
+class ClockFit:
+    """
+    Running least-squares fit of a device's frame counter against time:
+        frames = intercept + rate * (t - first_time)
+    """
+    def __init__(self, nominal_rate):
+        self.nominal_rate = nominal_rate
+        self.n = 0
+        self.sum_t = self.sum_f = self.sum_tt = self.sum_tf = 0.0
+        self.span = 0.0
+
+    def add(self, t, frames):
+        self.n += 1
+        self.sum_t += t
+        self.sum_f += frames
+        self.sum_tt += t * t
+        self.sum_tf += t * frames
+        self.span = max(self.span, t)
+
+    def solve(self):
+        """
+        Returns:
+            tuple: (intercept in frames, rate in frames per second); the
+                nominal rate until there is enough data.
+        """
+        denominator = self.n * self.sum_tt - self.sum_t * self.sum_t
+        if self.n < 3 or denominator <= 0:
+            return 0.0, float(self.nominal_rate)
+        rate = (self.n * self.sum_tf - self.sum_t * self.sum_f) / denominator
+        intercept = (self.sum_f - rate * self.sum_t) / self.n
+        return intercept, rate
+
+
+class TrackAligner(threading.Thread):
+    """
+    Converts one device's audio to the session format and clock, into an
+    output ring buffer read by the session writer.
+
+    Attributes:
+        dropped_frames (int): Aligned frames thrown away because the
+            writer had no room for them when the session stopped.
+        padded_frames (int): Silence written by the session in place of
+            this track (device stalled).
+        skipped_frames (int): Late frames discarded to make up for that
+            silence.
+    """
+    def __init__(self, session, capture, index, max_block=8192):
+        super().__init__(name=f"TrackAligner-{index}", daemon=True)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.session = session
+        self.capture = capture
+        self.index = index
+        self.max_block = max_block
+        self.out_ring = AudioRingBuffer(session.rate * session.ring_seconds, session.channels)
+        self.converter = FormatConverter(capture.rate, capture.channels, session.rate, session.channels)
+        self.fit = ClockFit(capture.rate)
+        self.resampler = None
+        self.error = None
+        self.dropped_frames = 0
+        self.padded_frames = 0
+        self.skipped_frames = 0
+        self._ts_read = 0
+        self._stop_event = threading.Event()
+
+    def _update_fit(self):
+        capture = self.capture
+        count = capture.ts_count
+        first = max(self._ts_read, count - TIMESTAMP_SLOTS)
+        for k in range(first, count):
+            slot = k % TIMESTAMP_SLOTS
+            self.fit.add(capture.ts_times[slot] - capture.first_time, int(capture.ts_frames[slot]))
+        self._ts_read = count
+
+    def model_position(self, output_frame):
+        """
+        Position in the converted track (session rate) of output frame n,
+        from the current clock fit.
+        """
+        intercept, rate = self.fit.solve()
+        t = self.session.t0 - self.capture.first_time + output_frame / float(self.session.rate)
+        return (intercept + rate * t) * self.session.rate / self.capture.rate
+
+    def ratio(self):
+        """
+        Returns:
+            float: Converted frames to read per output frame.
+        """
+        _, rate = self.fit.solve()
+        return rate / self.capture.rate
+
+    def run(self):
+        capture = self.capture
+        try:
+            while True:
+                self._update_fit()
+                ready = self.session.t0 is not None and self.fit.span >= MIN_FIT_SECONDS
+                if self.resampler is None and ready:
+                    self.resampler = DriftResampler(self.session.channels, self.model_position(0))
+                    self.logger.info(f"Track {self.index}: start at {self.resampler.position:.2f}, "
+                                     f"{self.fit.solve()[1]:.3f} Hz")
+
+                block = capture.ring.read(self.max_block) if self.resampler is not None else None
+                if block is not None and block.shape[0]:
+                    self._push(self.converter.process(block))
+                    continue
+
+                if self._stop_event.is_set() and (self.resampler is None or not capture.ring.available()):
+                    break
+                self._stop_event.wait(0.01)
+
+            if self.resampler is not None:
+                self._push(self.converter.flush())
+        except Exception as e:
+            self.error = e
+            self.logger.error(f"Track {self.index} failed: {e}", exc_info=True)
+
+    def _push(self, converted):
+        """
+        Drift-compensate converted frames into the output ring, waiting for
+        room when the writer is behind. Once the session is stopping, a
+        full ring drops the frames instead: the writer may be waiting for
+        a track that will never catch up.
+        """
+        resampler = self.resampler
+        # Step from the fitted rate, plus a slow pull toward the fitted time line
+        error = self.model_position(resampler.frames_out) - resampler.position
+        ratio = self.ratio() + error / (LOCK_SECONDS * self.session.rate)
+        out = resampler.process(converted, ratio)
+        while out.shape[0] and not self.out_ring.write(out):
+            # The overrun counters of out_ring count these retries, not lost audio
+            if self.session.error is not None:
+                raise OSError("The multi-track writer stopped")
+            if self._stop_event.is_set():
+                self.dropped_frames += out.shape[0]
+                return
+            time.sleep(0.005)
+
+    def request_stop(self):
+        """
+        Ask the thread to drain its input and exit, without waiting.
+        """
+        self._stop_event.set()
+
+    def stop(self):
+        self.request_stop()
+        self.join()
+
+    def stats(self):
+        intercept, rate = self.fit.solve()
+        capture = self.capture
+        return {
+            "device": capture.device["name"],
+            "key": capture.device["key"],
+            "nominal_rate": capture.rate,
+            "channels": capture.channels,
+            "measured_rate": round(rate, 4),
+            "drift_ppm": round((rate / capture.rate - 1.0) * 1e6, 2),
+            "start_offset_ms": (round((self.session.t0 - capture.first_time) * 1000, 3)
+                                if self.session.t0 is not None else None),
+            "frames_captured": capture.frames_captured,
+            "frames_aligned": self.resampler.frames_out if self.resampler else 0,
+            "ring_dropped_frames": capture.ring.dropped_frames,
+            "overflows": capture.overflows,
+            "dropped_frames": self.dropped_frames,
+            "padded_frames": self.padded_frames,
+            "skipped_frames": self.skipped_frames,
+        }
+
+
+class MultiTrackSession:
+    """
+    Parallel recording of N input devices on a shared clock.
+
+    Attributes:
+        files (list): Output WAV files (one per track, or one polyphonic).
+        t0 (float | None): Shared start time (stream time of the last
+            device to start).
+    """
+    def __init__(self, backend, devices, base, polyphonic=False, rate=44100, channels=1,
+                 chunk=1024, ring_seconds=10, lock=None, commit_interval=5.0):
+        """
+        Args:
+            backend (AudioBackend): Audio I/O.
+            devices (list): Devices from DeviceManager, one per track.
+            base (str): Output path without extension.
+            polyphonic (bool): One file with a channel group per device
+                instead of one file per device.
+            rate (int): Output sample rate.
+            channels (int): Output channels per track.
+            chunk (int): Frames per callback.
+            ring_seconds (int): Buffering per stage.
+            lock (threading.Lock, optional): Held while opening the streams
+                (DeviceManager.lock).
+            commit_interval (float): WAV header commit interval.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.backend = backend
+        self.base = base
+        self.polyphonic = polyphonic
+        self.rate = rate
+        self.channels = channels
+        self.chunk = chunk
+        self.ring_seconds = ring_seconds
+        self.lock = lock if lock is not None else threading.Lock()
+        self.commit_interval = commit_interval
+
+        self.captures = [TrackCapture(device, chunk, ring_seconds) for device in devices]
+        self.aligners = [TrackAligner(self, capture, i + 1) for i, capture in enumerate(self.captures)]
+        if polyphonic:
+            self.files = [f"{base}.wav"]
+        else:
+            self.files = [f"{base}_track{i + 1:02}.wav" for i in range(len(devices))]
+        self.sinks = []
+        self.frames_written = 0
+        self.error = None
+        self._t0 = None
+        self._writer = None
+        self._stop_event = threading.Event()
+
+    @property
+    def t0(self):
+        """
+        Shared start time, known once every device delivered a block.
+        """
+        if self._t0 is None:
+            firsts = [capture.first_time for capture in self.captures]
+            if all(first is not None for first in firsts):
+                self._t0 = max(firsts)
+        return self._t0
+
+    def start(self):
+        """
+        Create the files and start the writer, the aligners and the streams.
+
+        Raises:
+            OSError: If a file or a stream cannot be opened (everything
+                opened so far is closed again).
+        """
+        try:
+            if self.polyphonic:
+                self.sinks = [CrashSafeWavWriter(self.files[0], self.channels * len(self.captures), 2, self.rate,
+                                                 commit_interval=self.commit_interval)]
+            else:
+                self.sinks = [CrashSafeWavWriter(filename, self.channels, 2, self.rate,
+                                                 commit_interval=self.commit_interval)
+                              for filename in self.files]
+
+            with self.lock:
+                for capture in self.captures:
+                    capture.stream = self.backend.open_stream(
+                        rate=capture.rate,
+                        channels=capture.channels,
+                        frames_per_buffer=self.chunk,
+                        input=True,
+                        output=False,
+                        callback=capture.callback,
+                        input_device_index=capture.device["index"]
+                    )
+        except Exception:
+            self._close_all()
+            raise
+
+        self._writer = threading.Thread(target=self._write_loop, name="MultiTrackWriter", daemon=True)
+        self._writer.start()
+        for aligner in self.aligners:
+            aligner.start()
+        # Start the streams back to back so T0 is close to every first block
+        for capture in self.captures:
+            capture.stream.start_stream()
+        self.logger.info(f"Multi-track session started: {len(self.captures)} devices -> {self.files}")
+
+    def _write_loop(self):
+        """
+        Writer thread: write the frames available on every track, so the
+        files stay the same length. An empty track is filled with silence
+        when it stalled for STALL_SECONDS (or half the ring, if shorter)
+        or, while stopping, when its aligner has finished.
+        """
+        rings = [aligner.out_ring for aligner in self.aligners]
+        stall_seconds = min(STALL_SECONDS, self.ring_seconds / 2.0)
+        owed = [0] * len(rings)     # Silence written per track, to skip when its audio comes back
+        lagging_since = None
+        try:
+            while True:
+                for i, ring in enumerate(rings):
+                    if owed[i] and ring.available():
+                        skipped = ring.read(owed[i]).shape[0]
+                        owed[i] -= skipped
+                        self.aligners[i].skipped_frames += skipped
+
+                stopping = self._stop_event.is_set()
+                available = [ring.available() for ring in rings]
+                silent = set()
+                if max(available) and not min(available):
+                    now = time.monotonic()
+                    lagging_since = lagging_since if lagging_since is not None else now
+                    stalled = now - lagging_since >= stall_seconds
+                    silent = {i for i, count in enumerate(available)
+                              if not count and (stalled or (stopping and not self.aligners[i].is_alive()))}
+                else:
+                    lagging_since = None
+
+                frames = min(count for i, count in enumerate(available) if i not in silent)
+                if frames:
+                    frames = min(frames, 16384)
+                    blocks = []
+                    for i, ring in enumerate(rings):
+                        if i in silent:
+                            blocks.append(np.zeros((frames, self.channels), dtype=np.int16))
+                            owed[i] += frames
+                            self.aligners[i].padded_frames += frames
+                        else:
+                            blocks.append(ring.read(frames))
+                    if self.polyphonic:
+                        self.sinks[0].writeframes(np.concatenate(blocks, axis=1).tobytes())
+                    else:
+                        for sink, block in zip(self.sinks, blocks):
+                            sink.writeframes(block.tobytes())
+                    self.frames_written += frames
+                    continue
+
+                if stopping:
+                    if not any(aligner.is_alive() for aligner in self.aligners) and not max(available):
+                        break
+                    time.sleep(0.005)
+                else:
+                    self._stop_event.wait(0.01)
+        except Exception as e:
+            self.error = e
+            self.logger.error(f"Multi-track writer failed: {e}", exc_info=True)
+
+    def _close_all(self):
+        for capture in self.captures:
+            if capture.stream is not None:
+                capture.stream.stop_stream()
+                capture.stream.close()
+                capture.stream = None
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+    def elapsed(self):
+        """
+        Returns:
+            float: Seconds written to every track.
+        """
+        return self.frames_written / float(self.rate)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Files, frames written and per-track clock statistics.
+        """
+        return {
+            "files": self.files,
+            "polyphonic": self.polyphonic,
+            "rate": self.rate,
+            "channels_per_track": self.channels,
+            "frames": self.frames_written,
+            "tracks": [aligner.stats() for aligner in self.aligners],
+        }
+
+    def stop(self):
+        """
+        Stop the streams, drain every stage and close the files. The
+        writer is told to stop before the aligners are joined, so a track
+        that stopped delivering audio is padded with silence instead of
+        blocking the others; the files keep the same length.
+
+        Returns:
+            dict: See stats(); also saved as `<base>.tracks.json`.
+        """
+        for capture in self.captures:
+            if capture.stream is not None:
+                capture.stream.stop_stream()
+        for aligner in self.aligners:
+            aligner.request_stop()
+        self._stop_event.set()
+        for aligner in self.aligners:
+            if aligner.is_alive():
+                aligner.join()
+        if self._writer is not None:
+            self._writer.join()
+        self._close_all()
+
+        stats = self.stats()
+        errors = [str(a.error) for a in self.aligners if a.error] + ([str(self.error)] if self.error else [])
+        if errors:
+            stats["errors"] = errors
+        self.logger.info(f"Multi-track session finished: {stats}")
+        try:
+            with open(f"{self.base}.tracks.json", 'w', encoding='utf-8') as f:
+                json.dump(stats, f, indent=2)
+        except OSError as e:
+            self.logger.error(f"Could not write track summary: {e}")
+        return stats
@@ -0,0 +1,159 @@
+"""
+Loudness Normalization
+======================
+
+Description:
+    Two-pass normalization of a recording to a target integrated loudness
+    (EBU R128 / ITU-R BS.1770, in LUFS) while it is exported.
+
+    Pass 1 measures the WAV file with a LoudnessMeter (dsp.py), reading it
+    through WavReader in fixed blocks. The recorder measures each take
+    while writing it (the meter is one more sink of the writer thread), so
+    for a normal take this pass is skipped and its result is handed over
+    with the export job.
+
+    Pass 2 reads the file again in the same blocks, applies the gain with
+    one vectorized multiply per block and pipes the PCM into ffmpeg
+    (FfmpegStreamEncoder). The gain is limited so the sample peak stays
+    under PEAK_CEILING_DB: a quiet take with a few loud peaks ends up below
+    the target rather than clipped.
+
+    Memory depends on the block size only, never on the recording length.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import logging
+
+import numpy as np
+
+from dsp import LoudnessMeter, INT16_MIN, INT16_MAX
+from encoders import FfmpegStreamEncoder, get_encoder, encoder_for, wav_chapters
+from wavreader import WavReader
+
+TARGET_LUFS = -16.0     # Spoken word (podcast and streaming platforms)
+PEAK_CEILING_DB = -1.0  # Highest sample peak after the gain (dBFS)
+BLOCK_FRAMES = LoudnessMeter.BLOCK_FRAMES
+
+
+def measure_loudness(wav_filename, block_frames=BLOCK_FRAMES, progress_callback=None):
+    """
+    Pass 1: integrated loudness and peak of a WAV file.
+
+    Args:
+        wav_filename (str): 16-bit WAV/RF64 file.
+        block_frames (int): Frames read and filtered per step.
+        progress_callback (callable, optional): Called with an int 0-100.
+
+    Returns:
+        dict: See LoudnessMeter.result().
+
+    Raises:
+        ValueError: If the file is not 16-bit PCM.
+    """
+    with WavReader(wav_filename) as wav:
+        if wav.sample_width != 2:
+            raise ValueError(f"{wav_filename}: loudness normalization only supports 16-bit audio")
+        meter = LoudnessMeter(wav.rate, wav.channels, block_frames)
+        last_percent = -1
+        for first, block in wav.blocks(block_frames):
+            meter.add(block)
+            percent = (first + block.shape[0]) * 100 // wav.frames
+            if progress_callback and percent != last_percent:
+                progress_callback(percent)
+            last_percent = percent
+        return meter.close()
+
+
+def normalization_gain(loudness, target_lufs=TARGET_LUFS, ceiling_db=PEAK_CEILING_DB):
+    """
+    Gain that brings a measured recording to the target loudness without
+    pushing its peak over the ceiling.
+
+    Args:
+        loudness (dict): Measurement (see LoudnessMeter.result()).
+        target_lufs (float): Wanted integrated loudness.
+        ceiling_db (float): Highest sample peak allowed (dBFS).
+
+    Returns:
+        float: Gain in dB (0.0 for silence).
+    """
+    if loudness.get("integrated_lufs") is None:
+        return 0.0
+    gain_db = target_lufs - loudness["integrated_lufs"]
+    if loudness.get("peak_dbfs") is not None:
+        gain_db = min(gain_db, ceiling_db - loudness["peak_dbfs"])
+    return gain_db
+
+
+def export_normalized(input_filename, output_filename, target_lufs=TARGET_LUFS, loudness=None,
+                      progress_callback=None, encoder=None, block_frames=BLOCK_FRAMES):
+    """
+    Convert a WAV file like encoders.export_wav, normalizing its loudness.
+
+    Args:
+        input_filename (str): Source 16-bit WAV file.
+        output_filename (str): Destination file (overwritten if present).
+        target_lufs (float): Wanted integrated loudness.
+        loudness (dict, optional): Measurement of the file taken while
+            recording; pass 1 runs only without it.
+        progress_callback (callable, optional): Called with an int 0-100.
+        encoder (str | AudioEncoder, optional): Output format; defaults to
+            the registered format of the output's extension.
+        block_frames (int): Frames per read/gain/write step.
+
+    Returns:
+        bool: True if ffmpeg finished successfully.
+
+    Raises:
+        ValueError: If the format is unknown or the file is not 16-bit PCM.
+    """
+    logger = logging.getLogger("export_normalized")
+    encoder = get_encoder(encoder) if encoder is not None else encoder_for(output_filename)
+
+    # Progress: pass 1 (if needed) is the first half, pass 2 the rest
+    offset, span = 0, 100
+    if loudness is None:
+        offset, span = 50, 50
+        report = (lambda percent: progress_callback(percent // 2)) if progress_callback else None
+        loudness = measure_loudness(input_filename, block_frames, report)
+    gain_db = normalization_gain(loudness, target_lufs)
+    scale = np.float32(10 ** (gain_db / 20.0))
+    logger.info(f"{input_filename}: {loudness['integrated_lufs']} LUFS, peak {loudness['peak_dbfs']} dBFS, "
+                f"gain {gain_db:+.2f} dB (target {target_lufs} LUFS)")
+
+    with WavReader(input_filename) as wav:
+        if wav.sample_width != 2:
+            raise ValueError(f"{input_filename}: loudness normalization only supports 16-bit audio")
+        try:
+            sink = FfmpegStreamEncoder(output_filename, wav.rate, wav.channels, 2, encoder=encoder,
+                                       metadata=wav_chapters(input_filename))
+        except OSError as e:
+            logger.error(f"Could not start ffmpeg: {e}")
+            return False
+
+        last_percent = -1
+        for first, block in wav.blocks(block_frames):
+            out = block.astype(np.float32)
+            out *= scale
+            np.rint(out, out=out)
+            np.clip(out, INT16_MIN, INT16_MAX, out=out)
+            try:
+                sink.writeframes(out.astype(np.int16).tobytes())
+            except OSError as e:
+                # ffmpeg died; close() reports why
+                logger.error(f"Encoder pipe error: {e}")
+                break
+            percent = offset + min(span - 1, (first + block.shape[0]) * span // wav.frames)
+            if progress_callback and percent != last_percent:
+                progress_callback(percent)
+            last_percent = percent
+
+    if not sink.close():
+        return False
+    if progress_callback:
+        progress_callback(100)
+    logger.info(f"Exported {input_filename} to {output_filename} at {target_lufs} LUFS")
+    return True
@@ -0,0 +1,332 @@
+"""
+Waveform Peak Index
+===================
+
+Description:
+    Multi-resolution min/max/RMS summary of a recording, built while it is
+    recorded and saved next to it as `<name>.peaks`, so a waveform of any
+    zoom level of a multi-hour take can be drawn without reading the audio.
+
+    Level 0 has one entry per BASE_BLOCK frames; each level above merges
+    FACTOR entries of the level below. Drawing W pixel columns reads at most
+    about W * FACTOR entries of the one level whose resolution matches the
+    zoom, whatever the length of the take.
+
+    File layout (little endian):
+        header  "GRPK", version u16, channels u16, rate u32, base_block u32,
+                factor u32, levels u32, frames u64
+        counts  levels x u64 (entries per level)
+        data    per level, int16 (entries, channels, 3): min, max, rms
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import struct
+import logging
+
+import numpy as np
+
+from wavreader import WavReader
+
+MAGIC = b'GRPK'
+VERSION = 1
+BASE_BLOCK = 256    # Frames per level-0 entry (5.8 ms at 44.1 kHz)
+FACTOR = 8          # Entries merged per level
+LEVELS = 7          # Top level: BASE_BLOCK * FACTOR**6 frames (~11 min at 44.1 kHz) per entry
+HEADER = struct.Struct('<4sHHIIIIQ')
+
+# Index of each statistic in the last axis of the entries
+MIN, MAX, RMS = 0, 1, 2
+
+
+def peaks_filename(audio_filename):
+    """
+    Args:
+        audio_filename (str): Recording (WAV or MP3) or take path.
+
+    Returns:
+        str: Sidecar path, e.g. "entrevista.peaks" for "entrevista.wav".
+    """
+    base, ext = os.path.splitext(audio_filename)
+    return f"{base}.peaks" if ext else f"{audio_filename}.peaks"
+
+
+def _merge(entries, count):
+    """
+    Merge groups of `count` consecutive entries (the last group may be
+    shorter). RMS is merged through the mean of the squares.
+
+    Args:
+        entries (np.ndarray): int16 (n, channels, 3).
+        count (int): Entries per group.
+
+    Returns:
+        np.ndarray: int16 (ceil(n / count), channels, 3).
+    """
+    starts = np.arange(0, entries.shape[0], count)
+    sizes = np.diff(np.append(starts, entries.shape[0]))[:, None]
+    merged = np.empty((starts.size,) + entries.shape[1:], dtype=np.int16)
+    merged[..., MIN] = np.minimum.reduceat(entries[..., MIN], starts, axis=0)
+    merged[..., MAX] = np.maximum.reduceat(entries[..., MAX], starts, axis=0)
+    squares = entries[..., RMS].astype(np.float64) ** 2
+    merged[..., RMS] = np.rint(np.sqrt(np.add.reduceat(squares, starts, axis=0) / sizes))
+    return merged
+
+
+class PeakIndexWriter:
+    """
+    Builds the peak index incrementally from the recorded audio.
+
+    Implements the `writeframes(bytes)` / `close()` sink interface, so it
+    sits next to the WAV writer in the writer thread; the index is saved
+    on close().
+
+    Attributes:
+        frames (int): Frames summarized so far.
+    """
+    def __init__(self, filename, channels, rate, sample_width=2):
+        """
+        Args:
+            filename (str): Sidecar to write on close().
+            channels (int): Interleaved channels.
+            rate (int): Sample rate.
+            sample_width (int): Bytes per sample (only 2 is supported).
+
+        Raises:
+            ValueError: If the samples are not 16-bit.
+        """
+        if sample_width != 2:
+            raise ValueError("The peak index only supports 16-bit audio")
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.filename = filename
+        self.channels = channels
+        self.rate = rate
+        self.frames = 0
+        self._rest = np.empty((0, channels), dtype=np.int16)   # Partial level-0 block
+        self._levels = [[] for _ in range(LEVELS)]              # Finished entries (array chunks)
+        self._pending = [np.empty((0, channels, 3), dtype=np.int16) for _ in range(LEVELS)]
+        self._closed = False
+
+    def writeframes(self, data):
+        """
+        Summarize a block.
+
+        Args:
+            data (bytes): Interleaved int16 samples (whole frames).
+        """
+        self.add(np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels))
+
+    def add(self, block):
+        """
+        Summarize a block given as samples.
+
+        Args:
+            block (np.ndarray): int16 (frames, channels), e.g. a WavReader view.
+        """
+        self.frames += block.shape[0]
+        if self._rest.shape[0]:
+            block = np.concatenate((self._rest, block))
+        count = block.shape[0] // BASE_BLOCK
+        self._rest = block[count * BASE_BLOCK:].copy()
+        if count:
+            self._add(0, self._summarize(block[:count * BASE_BLOCK].reshape(count, BASE_BLOCK, self.channels)))
+
+    @staticmethod
+    def _summarize(blocks):
+        """
+        Args:
+            blocks (np.ndarray): int16 (n, frames, channels).
+
+        Returns:
+            np.ndarray: int16 (n, channels, 3) level-0 entries.
+        """
+        entries = np.empty((blocks.shape[0], blocks.shape[2], 3), dtype=np.int16)
+        entries[..., MIN] = blocks.min(axis=1)
+        entries[..., MAX] = blocks.max(axis=1)
+        x = blocks.astype(np.float32)
+        entries[..., RMS] = np.rint(np.sqrt(np.einsum('ijk,ijk->ik', x, x) / blocks.shape[1]))
+        return entries
+
+    def _add(self, level, entries):
+        """
+        Store finished entries of a level and merge every complete group of
+        FACTOR of them into the level above.
+        """
+        self._levels[level].append(entries)
+        if level + 1 >= LEVELS:
+            return
+        pending = np.concatenate((self._pending[level], entries))
+        complete = pending.shape[0] // FACTOR * FACTOR
+        self._pending[level] = pending[complete:]
+        if complete:
+            self._add(level + 1, _merge(pending[:complete], FACTOR))
+
+    def close(self):
+        """
+        Summarize the partial blocks at the end and save the index
+        (atomically, so a crash never leaves a truncated sidecar).
+        """
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._rest.shape[0]:
+            self._add(0, self._summarize(self._rest[None]))
+            self._rest = self._rest[:0]
+        # Partial groups become one shorter entry on each level above
+        for level in range(LEVELS - 1):
+            pending = self._pending[level]
+            self._pending[level] = pending[:0]
+            if pending.shape[0]:
+                # May leave a partial group on the level above, flushed next
+                self._add(level + 1, _merge(pending, FACTOR))
+        levels = [np.concatenate(chunks) if chunks else np.empty((0, self.channels, 3), dtype=np.int16)
+                  for chunks in self._levels]
+
+        tmp_filename = self.filename + '.tmp'
+        try:
+            with open(tmp_filename, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, VERSION, self.channels, self.rate, BASE_BLOCK, FACTOR,
+                                    LEVELS, self.frames))
+                f.write(struct.pack(f'<{LEVELS}Q', *(level.shape[0] for level in levels)))
+                for level in levels:
+                    f.write(level.astype('<i2').tobytes())
+            os.replace(tmp_filename, self.filename)
+        except OSError as e:
+            self.logger.error(f"Could not save peak index {self.filename}: {e}")
+            return
+        self.logger.info(f"Peak index saved: {self.filename} ({self.frames} frames)")
+
+
+class PeakIndex:
+    """
+    Read-only, memory-mapped peak index.
+
+    Attributes:
+        channels, rate, frames (int): Format and length of the recording.
+        levels (list): np.memmap int16 (entries, channels, 3) per level.
+        block_frames (list): Frames per entry of each level.
+    """
+    def __init__(self, filename):
+        """
+        Map the sidecar. Only the header is read; entries are paged in when
+        a view touches them.
+
+        Args:
+            filename (str): `.peaks` file.
+
+        Raises:
+            ValueError: If the file is not a peak index.
+        """
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError(f"{filename} is not a peak index")
+            magic, version, self.channels, self.rate, base_block, factor, levels, self.frames = \
+                HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{filename} is not a peak index")
+            counts = struct.unpack(f'<{levels}Q', f.read(8 * levels))
+
+        self.block_frames = [base_block * factor ** level for level in range(levels)]
+        self.levels = []
+        offset = HEADER.size + 8 * levels
+        for count in counts:
+            if count:
+                self.levels.append(np.memmap(filename, dtype='<i2', mode='r', offset=offset,
+                                             shape=(count, self.channels, 3)))
+            else:
+                self.levels.append(np.empty((0, self.channels, 3), dtype=np.int16))
+            offset += count * self.channels * 3 * 2
+
+    @property
+    def duration(self):
+        return self.frames / float(self.rate) if self.rate else 0.0
+
+    def columns(self, start, end, width):
+        """
+        Min/max/RMS of `width` equal slices of the frames [start, end), for
+        drawing one pixel column each.
+
+        The coarsest level with entries no longer than a column is used, so
+        the work depends on `width`, not on the span. Below the resolution
+        of level 0 entries repeat.
+
+        Args:
+            start (int): First frame of the view.
+            end (int): Frame after the view.
+            width (int): Number of columns.
+
+        Returns:
+            np.ndarray: int16 (width, channels, 3) with MIN, MAX, RMS; zeros
+                past the end of the recording.
+        """
+        out = np.zeros((width, self.channels, 3), dtype=np.int16)
+        start = max(0, int(start))
+        end = min(int(end), self.frames)
+        if width <= 0 or end <= start:
+            return out
+
+        per_column = (end - start) / float(width)
+        level = 0
+        while level + 1 < len(self.levels) and self.block_frames[level + 1] <= per_column \
+                and self.levels[level + 1].shape[0]:
+            level += 1
+        entries = self.levels[level]
+        block = self.block_frames[level]
+        if not entries.shape[0]:
+            return out
+
+        # Entry range of each column (at least one entry per column)
+        edges = (start + np.arange(width + 1) * per_column) / block
+        first = np.minimum(np.floor(edges[:-1]).astype(np.int64), entries.shape[0] - 1)
+        last = np.maximum(np.ceil(edges[1:]).astype(np.int64), first + 1)
+        last = np.minimum(last, entries.shape[0])
+
+        lo, hi = int(first[0]), int(last.max())
+        window = np.asarray(entries[lo:hi])
+        offsets = first - lo
+        sizes = (last - first)[:, None]
+        # reduceat takes [first[i], first[i + 1]); a column also owns its last entry when
+        # that entry is shared with the next column (last[i] - 1 == first[i + 1])
+        tail = last - 1 - lo
+        out[..., MIN] = np.minimum(np.minimum.reduceat(window[..., MIN], offsets, axis=0), window[tail, :, MIN])
+        out[..., MAX] = np.maximum(np.maximum.reduceat(window[..., MAX], offsets, axis=0), window[tail, :, MAX])
+        squares = np.cumsum(np.concatenate((np.zeros((1, self.channels)),
+                                            window[..., RMS].astype(np.float64) ** 2)), axis=0)
+        out[..., RMS] = np.rint(np.sqrt((squares[last - lo] - squares[offsets]) / sizes))
+
+        # Columns past the end of the recording stay empty
+        past = edges[:-1] * block >= self.frames
+        out[past] = 0
+        return out
+
+
+def build_peak_index(wav_filename, filename=None, block_frames=1 << 20):
+    """
+    Build the peak index of an existing 16-bit WAV file (recordings made
+    before the index existed, or recovered after a crash). Reads the whole
+    file once, through a memory map.
+
+    Args:
+        wav_filename (str): WAV or RF64 file.
+        filename (str, optional): Sidecar path. Defaults to peaks_filename().
+        block_frames (int): Frames read per step.
+
+    Returns:
+        str: The sidecar path.
+
+    Raises:
+        ValueError: If the file is not a 16-bit PCM WAV file.
+    """
+    filename = filename or peaks_filename(wav_filename)
+    with WavReader(wav_filename) as wav:
+        writer = PeakIndexWriter(filename, wav.channels, wav.rate, wav.sample_width)
+        for _, block in wav.blocks(block_frames):
+            writer.add(block)
+    writer.close()
+    return filename
@@ -0,0 +1,264 @@
+"""
+Audio Ring Buffer
+=================
+
+Description:
+    Preallocated single-producer / single-consumer ring buffer for audio
+    samples. The producer is the PortAudio callback thread, the consumer is
+    a writer thread that drains the samples to disk (or to an encoder).
+
+    The buffer never allocates after construction and never blocks: the
+    producer only advances the write position and the consumer only
+    advances the read position, so no lock is needed between them. When
+    the consumer falls behind and there is no room for a block, the block
+    is dropped and the overrun counters are incremented.
+
+    PrerollBuffer is the opposite policy for the monitoring history: it
+    always keeps the newest audio and lets the oldest be overwritten.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Lock-free SPSC ring buffer of interleaved audio frames.
+
+    Positions are monotonically increasing frame counters; the physical
+    index is the counter modulo the capacity. Only the producer writes
+    `_write_pos` and only the consumer writes `_read_pos`.
+
+    Attributes:
+        capacity (int): Size of the buffer in frames.
+        channels (int): Number of interleaved channels per frame.
+        overruns (int): Number of blocks dropped because the buffer was full.
+        dropped_frames (int): Total frames lost due to overruns.
+        high_water (int): Highest fill level observed, in frames.
+    """
+    def __init__(self, capacity, channels=1, dtype=np.int16):
+        """
+        Allocate the ring storage.
+
+        Args:
+            capacity (int): Buffer size in frames.
+            channels (int): Interleaved channels per frame.
+            dtype: NumPy sample type stored in the buffer.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+
+        self.capacity = int(capacity)
+        self.channels = int(channels)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros((self.capacity, self.channels), dtype=self.dtype)
+
+        self._write_pos = 0
+        self._read_pos = 0
+
+        self.overruns = 0
+        self.dropped_frames = 0
+        self.high_water = 0
+
+    def available(self):
+        """
+        Returns:
+            int: Number of frames ready to be read.
+        """
+        return self._write_pos - self._read_pos
+
+    def free(self):
+        """
+        Returns:
+            int: Number of frames that can be written without overrun.
+        """
+        return self.capacity - (self._write_pos - self._read_pos)
+
+    def write(self, samples):
+        """
+        Copy a block of samples into the buffer (producer side).
+
+        Safe to call from the audio callback: no allocation, no locks.
+        If the whole block does not fit it is dropped and counted as an
+        overrun, so the file never contains a partial block.
+
+        Args:
+            samples (np.ndarray): Interleaved samples, 1-D or (frames, channels).
+
+        Returns:
+            bool: True if the block was stored, False on overrun.
+        """
+        block = samples.reshape(-1, self.channels)
+        frames = block.shape[0]
+
+        used = self._write_pos - self._read_pos
+        if frames > self.capacity - used:
+            self.overruns += 1
+            self.dropped_frames += frames
+            return False
+
+        start = self._write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < frames:
+            self._data[:frames - first] = block[first:]
+
+        # Publish only after the data is in place
+        self._write_pos += frames
+
+        used += frames
+        if used > self.high_water:
+            self.high_water = used
+        return True
+
+    def read(self, max_frames=None):
+        """
+        Remove up to `max_frames` frames from the buffer (consumer side).
+
+        Args:
+            max_frames (int, optional): Upper bound of frames to read.
+                Defaults to everything available.
+
+        Returns:
+            np.ndarray: A (frames, channels) copy of the samples read.
+                Empty when nothing is available.
+        """
+        frames = self._write_pos - self._read_pos
+        if max_frames is not None:
+            frames = min(frames, max_frames)
+        if frames <= 0:
+            return self._data[:0].copy()
+
+        start = self._read_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        if first == frames:
+            out = self._data[start:start + frames].copy()
+        else:
+            out = np.concatenate((self._data[start:], self._data[:frames - first]))
+
+        # Release the space only after the data has been copied out
+        self._read_pos += frames
+        return out
+
+    def reset(self):
+        """
+        Discard buffered data and clear the counters. Only call this while
+        neither the producer nor the consumer is running.
+        """
+        self._write_pos = 0
+        self._read_pos = 0
+        self.overruns = 0
+        self.dropped_frames = 0
+        self.high_water = 0
+
+    def stats(self):
+        """
+        Snapshot of the buffer counters.
+
+        Returns:
+            dict: capacity, fill level, high-water mark and overrun counters.
+        """
+        return {
+            "capacity": self.capacity,
+            "available": self.available(),
+            "high_water": self.high_water,
+            "overruns": self.overruns,
+            "dropped_frames": self.dropped_frames,
+        }
+
+
+class PrerollBuffer:
+    """
+    Fixed-size history of the most recent frames: the producer always
+    writes and overwrites the oldest audio, it never drops the new block.
+
+    The consumer reads by absolute frame position while the producer keeps
+    writing; frames overwritten during the copy are cut from the result.
+    A block being written is not published yet, so the capacity should
+    exceed the history actually read by at least one block.
+
+    Attributes:
+        capacity (int): Frames of history kept.
+        channels (int): Number of interleaved channels per frame.
+        frames_written (int): Total frames written (absolute position of
+            the next frame).
+    """
+    def __init__(self, capacity, channels=1, dtype=np.int16):
+        """
+        Preallocate the storage.
+
+        Args:
+            capacity (int): Frames of history to keep.
+            channels (int): Interleaved channels per frame.
+            dtype: Sample type.
+        """
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = int(capacity)
+        self.channels = int(channels)
+        self._data = np.zeros((self.capacity, self.channels), dtype=dtype)
+        self.frames_written = 0
+
+    def write(self, samples):
+        """
+        Append a block, overwriting the oldest frames (producer side).
+
+        Safe to call from the audio callback: no allocation, no locks.
+
+        Args:
+            samples (np.ndarray): Interleaved samples, 1-D or (frames, channels).
+        """
+        block = samples.reshape(-1, self.channels)
+        total = block.shape[0]
+        if total > self.capacity:
+            block = block[-self.capacity:]
+        frames = block.shape[0]
+
+        start = (self.frames_written + total - frames) % self.capacity
+        first = min(frames, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < frames:
+            self._data[:frames - first] = block[first:]
+
+        # Publish only after the data is in place
+        self.frames_written += total
+
+    def read_range(self, start, end):
+        """
+        Copy the frames [start, end) that are still held (consumer side).
+
+        Args:
+            start (int): Absolute position of the first frame wanted.
+            end (int): Absolute position after the last frame wanted
+                (at most `frames_written`).
+
+        Returns:
+            tuple: (np.ndarray (frames, channels) copy, absolute position of
+                its first frame). Frames already overwritten are missing
+                from the start of the result.
+        """
+        end = min(end, self.frames_written)
+        start = max(start, end - self.capacity, 0)
+        if start >= end:
+            return self._data[:0].copy(), end
+
+        first_index = start % self.capacity
+        frames = end - start
+        first = min(frames, self.capacity - first_index)
+        out = np.concatenate((self._data[first_index:first_index + first], self._data[:frames - first]))
+
+        # The producer may have lapped the oldest frames while they were copied
+        valid_from = self.frames_written - self.capacity
+        if valid_from > start:
+            out = out[valid_from - start:]
+            start = valid_from
+        return out, start
+
+    def reset(self):
+        """
+        Forget the history. Only call this while the producer is stopped.
+        """
+        self.frames_written = 0
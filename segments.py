@@ -0,0 +1,226 @@
+"""
+Segmented Recording
+===================
+
+Description:
+    Sink that cuts a take into consecutive WAV files of a fixed number of
+    frames ("rollover"), for all-day sessions.
+
+    The cut is made in the writer thread on the frame count, so segments
+    are gapless and sample exact: concatenating them gives back the take.
+    Each finished segment is announced through a callback (the engine hands
+    it to the export queue while recording continues) and recorded in a
+    JSON manifest next to the files:
+
+        <base>.segments.json
+            {"name", "rate", "channels", "sample_width", "segment_frames",
+             "complete", "segments": [{"index", "wav", "export", "start_frame",
+             "frames", "started", "job", "cues"}, ...]}
+
+    Markers (pause points) that fall inside a segment are written into it
+    when it is closed, at their position relative to the segment start, so
+    every segment and its export keep their own markers.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import json
+import logging
+import datetime
+
+from wavio import CrashSafeWavWriter
+
+
+def segment_filename(base, index):
+    """
+    Args:
+        base (str): Take path without extension.
+        index (int): Segment number, starting at 1.
+
+    Returns:
+        str: e.g. "audio_24-08-2024_17-05-33_001.wav"
+    """
+    return f"{base}_{index:03}.wav"
+
+
+class SegmentedWavSink:
+    """
+    Writer-thread sink that rolls over to a new WAV file every
+    `segment_frames` frames.
+
+    Attributes:
+        manifest (dict): Current manifest, saved after every rollover.
+        manifest_filename (str): Where the manifest is saved.
+        current (CrashSafeWavWriter | None): Segment being written.
+    """
+    def __init__(self, base, rate, channels, sample_width, segment_frames,
+                 on_segment=None, commit_interval=5.0, export_extension=".mp3", cue_source=None):
+        """
+        Open the first segment.
+
+        Args:
+            base (str): Take path without extension.
+            rate (int): Sample rate.
+            channels (int): Interleaved channels.
+            sample_width (int): Bytes per sample.
+            segment_frames (int): Frames per segment.
+            on_segment (callable, optional): Called with the manifest entry
+                of each finished segment, on the writer thread; may return
+                an export job dict whose id is stored in the manifest.
+            commit_interval (float): Header commit interval of each segment.
+            export_extension (str): Extension of the compressed file each
+                segment is exported to (recorded in the manifest).
+            cue_source (callable, optional): Returns the (take frame, label)
+                markers of the take so far; called on the writer thread
+                when a segment is closed.
+        """
+        if segment_frames <= 0:
+            raise ValueError("segment_frames must be positive")
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.base = base
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.segment_frames = segment_frames
+        self.frame_bytes = channels * sample_width
+        self.on_segment = on_segment
+        self.commit_interval = commit_interval
+        self.export_extension = export_extension
+        self.cue_source = cue_source
+
+        self.manifest_filename = f"{base}.segments.json"
+        self.manifest = {
+            "name": os.path.basename(base),
+            "rate": rate,
+            "channels": channels,
+            "sample_width": sample_width,
+            "segment_frames": segment_frames,
+            "complete": False,
+            "segments": [],
+        }
+        self.current = None
+        self._entry = None
+        self._frames_total = 0
+        self._open_segment()
+
+    def _open_segment(self):
+        index = len(self.manifest["segments"]) + 1
+        wav_filename = segment_filename(self.base, index)
+        base, _ = wav_filename.rsplit('.', 1)
+        self._entry = {
+            "index": index,
+            "wav": os.path.basename(wav_filename),
+            "export": os.path.basename(f"{base}{self.export_extension}"),
+            "start_frame": self._frames_total,
+            "frames": 0,
+            "started": datetime.datetime.now().isoformat(timespec='seconds'),
+            "job": None,
+            "cues": [],
+        }
+        self.manifest["segments"].append(self._entry)
+        self.current = CrashSafeWavWriter(wav_filename, self.channels, self.sample_width, self.rate,
+                                          commit_interval=self.commit_interval)
+        self._save_manifest()
+        self.logger.info(f"Segment {index} started: {wav_filename}")
+
+    def _close_segment(self):
+        """
+        Close the current segment and announce it.
+        """
+        entry = self._entry
+        if self.cue_source is not None:
+            start = entry["start_frame"]
+            try:
+                cues = [(frame - start, label) for frame, label in self.cue_source()
+                        if start <= frame < start + entry["frames"]]
+            except Exception as e:
+                self.logger.error(f"Could not get the segment markers: {e}", exc_info=True)
+                cues = []
+            for frame, label in cues:
+                self.current.add_cue(frame, label)
+            entry["cues"] = [{"frame": frame, "label": label} for frame, label in cues]
+        self.current.close()
+        self.current = None
+        self._entry = None
+        self.logger.info(f"Segment {entry['index']} finished: {entry['frames']} frames")
+
+        if self.on_segment is not None:
+            try:
+                job = self.on_segment(entry)
+                if job is not None:
+                    entry["job"] = job["id"]
+            except Exception as e:
+                # The WAV is safe on disk; only the early export is lost
+                self.logger.error(f"Segment callback failed: {e}", exc_info=True)
+
+    def _save_manifest(self):
+        """
+        Write the manifest atomically.
+        """
+        tmp_filename = self.manifest_filename + '.tmp'
+        try:
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(tmp_filename, self.manifest_filename)
+        except OSError as e:
+            self.logger.error(f"Could not save manifest {self.manifest_filename}: {e}")
+
+    def writeframes(self, data):
+        """
+        Append a block, rolling over exactly at the segment boundary.
+
+        Args:
+            data (bytes): Interleaved PCM samples (whole frames).
+        """
+        view = memoryview(data)
+        while len(view):
+            if self.current is None:
+                self._open_segment()
+            room = (self.segment_frames - self._entry["frames"]) * self.frame_bytes
+            part = view[:room]
+            self.current.writeframes(part)
+            frames = len(part) // self.frame_bytes
+            self._entry["frames"] += frames
+            self._frames_total += frames
+            view = view[len(part):]
+
+            if self._entry["frames"] >= self.segment_frames:
+                self._close_segment()
+                self._save_manifest()
+
+    def close(self):
+        """
+        Close the last segment (announcing it like the others) and mark the
+        manifest complete. An empty last segment, left by a rollover on the
+        final block, is never created since segments open lazily.
+        """
+        if self.current is not None:
+            self._close_segment()
+        self.manifest["complete"] = True
+        self._save_manifest()
+
+    def abort(self):
+        """
+        Discard a take that never started: close and delete the segment
+        files and the manifest without announcing anything.
+        """
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        for filename in self.segment_paths() + [self.manifest_filename]:
+            if os.path.exists(filename):
+                try:
+                    os.remove(filename)
+                except OSError as e:
+                    self.logger.error(f"Could not delete {filename}: {e}")
+
+    def segment_paths(self):
+        """
+        Returns:
+            list: Full WAV paths of all segments, in order.
+        """
+        folder = os.path.dirname(self.base)
+        return [os.path.join(folder, entry["wav"]) for entry in self.manifest["segments"]]
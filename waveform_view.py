@@ -0,0 +1,229 @@
+"""
+Waveform View
+=============
+
+Description:
+    Window that draws the waveform of a recording from its peak index
+    (`<name>.peaks`, see peaks.py), without reading the audio. Any zoom
+    level of a multi-hour take draws in about the same time, because each
+    repaint asks the index for one min/max/RMS entry per pixel column.
+
+    Mouse wheel: zoom around the pointer. Drag: scroll. Double click or
+    Home: whole recording.
+
+Usage:
+    python waveform_view.py RECORDING.peaks
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import sys
+import logging
+
+import wx
+
+from peaks import PeakIndex, MIN, MAX, RMS
+
+ZOOM_STEP = 1.5         # Zoom factor per wheel notch
+MIN_VIEW_FRAMES = 64    # Narrowest view
+RULER_HEIGHT = 18
+PEAK_COLOUR = wx.Colour(120, 170, 230)
+RMS_COLOUR = wx.Colour(20, 80, 160)
+
+
+def format_time(seconds):
+    """
+    Format seconds as H:MM:SS, or M:SS.mmm for short spans.
+    """
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
+    secs = seconds % 60
+    if hours:
+        return f"{hours}:{minutes:02}:{int(secs):02}"
+    return f"{minutes}:{secs:06.3f}"
+
+
+class WaveformPanel(wx.Panel):
+    """
+    Panel drawing a PeakIndex between `view_start` and `view_end` (frames).
+    """
+    def __init__(self, parent, index):
+        """
+        Args:
+            parent (wx.Window): Parent window.
+            index (PeakIndex): Peak index of the recording.
+        """
+        super().__init__(parent, style=wx.FULL_REPAINT_ON_RESIZE)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.index = index
+        self.view_start = 0
+        self.view_end = max(index.frames, 1)
+        self.on_view_change = None  # Optional callable(start, end)
+        self._drag_x = None
+
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.SetBackgroundColour(wx.Colour(250, 250, 250))
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_MOUSEWHEEL, self.on_wheel)
+        self.Bind(wx.EVT_LEFT_DOWN, self.on_left_down)
+        self.Bind(wx.EVT_LEFT_UP, self.on_left_up)
+        self.Bind(wx.EVT_MOTION, self.on_motion)
+        self.Bind(wx.EVT_LEFT_DCLICK, lambda event: self.show_all())
+        self.Bind(wx.EVT_CHAR_HOOK, self.on_key)
+
+    def set_view(self, start, end):
+        """
+        Show the frames [start, end), kept inside the recording.
+        """
+        total = max(self.index.frames, 1)
+        span = min(max(int(end - start), MIN_VIEW_FRAMES), total)
+        start = min(max(int(start), 0), total - span)
+        self.view_start, self.view_end = start, start + span
+        if self.on_view_change is not None:
+            self.on_view_change(self.view_start, self.view_end)
+        self.Refresh(False)
+
+    def show_all(self):
+        self.set_view(0, self.index.frames)
+
+    def frame_at(self, x):
+        """
+        Returns:
+            float: Frame under pixel column `x`.
+        """
+        width = max(self.GetClientSize().width, 1)
+        return self.view_start + (self.view_end - self.view_start) * x / float(width)
+
+    def on_wheel(self, event):
+        center = self.frame_at(event.GetX())
+        factor = 1 / ZOOM_STEP if event.GetWheelRotation() > 0 else ZOOM_STEP
+        self.set_view(center - (center - self.view_start) * factor,
+                      center + (self.view_end - center) * factor)
+
+    def on_left_down(self, event):
+        self._drag_x = event.GetX()
+        self.CaptureMouse()
+
+    def on_left_up(self, event):
+        self._drag_x = None
+        if self.HasCapture():
+            self.ReleaseMouse()
+
+    def on_motion(self, event):
+        if self._drag_x is None or not event.Dragging():
+            return
+        shift = self.frame_at(self._drag_x) - self.frame_at(event.GetX())
+        self._drag_x = event.GetX()
+        self.set_view(self.view_start + shift, self.view_end + shift)
+
+    def on_key(self, event):
+        span = self.view_end - self.view_start
+        key = event.GetKeyCode()
+        if key == wx.WXK_HOME:
+            self.show_all()
+        elif key == wx.WXK_LEFT:
+            self.set_view(self.view_start - span // 4, self.view_end - span // 4)
+        elif key == wx.WXK_RIGHT:
+            self.set_view(self.view_start + span // 4, self.view_end + span // 4)
+        else:
+            event.Skip()
+
+    def on_paint(self, event):
+        """
+        Draw the ruler and one min/max line plus one RMS line per pixel
+        column and channel, from the index only.
+        """
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.Brush(self.GetBackgroundColour()))
+        dc.Clear()
+        width, height = self.GetClientSize()
+        if width <= 0 or height <= RULER_HEIGHT:
+            return
+
+        columns = self.index.columns(self.view_start, self.view_end, width)
+        channels = self.index.channels
+        lane = (height - RULER_HEIGHT) / float(channels)
+        scale = lane / 2.0 / 32768.0
+
+        for channel in range(channels):
+            middle = RULER_HEIGHT + lane * (channel + 0.5)
+            lo = middle - columns[:, channel, MIN] * scale
+            hi = middle - columns[:, channel, MAX] * scale
+            rms = columns[:, channel, RMS] * scale
+            dc.SetPen(wx.Pen(PEAK_COLOUR))
+            dc.DrawLineList([(x, int(hi[x]), x, int(lo[x]) + 1) for x in range(width)])
+            dc.SetPen(wx.Pen(RMS_COLOUR))
+            dc.DrawLineList([(x, int(middle - rms[x]), x, int(middle + rms[x]) + 1) for x in range(width)])
+            dc.SetPen(wx.Pen(wx.Colour(200, 200, 200)))
+            dc.DrawLine(0, int(middle), width, int(middle))
+
+        self.draw_ruler(dc, width)
+
+    def draw_ruler(self, dc, width):
+        """
+        Time ticks at a round interval giving about one label per 100 px.
+        """
+        rate = float(self.index.rate)
+        span = (self.view_end - self.view_start) / rate
+        target = span * 100.0 / width
+        step = next((s for s in (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600)
+                     if s >= target), 7200)
+
+        dc.SetPen(wx.Pen(wx.Colour(90, 90, 90)))
+        dc.SetFont(wx.Font(8, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL))
+        dc.SetTextForeground(wx.Colour(90, 90, 90))
+        t = (int(self.view_start / rate / step) + 1) * step
+        while t < self.view_end / rate:
+            x = int((t * rate - self.view_start) / (self.view_end - self.view_start) * width)
+            dc.DrawLine(x, RULER_HEIGHT - 5, x, RULER_HEIGHT)
+            dc.DrawText(format_time(t), x + 2, 1)
+            t += step
+
+
+class WaveformFrame(wx.Frame):
+    """
+    Top-level window with a WaveformPanel and the visible range.
+    """
+    def __init__(self, parent, peaks_filename):
+        """
+        Args:
+            parent (wx.Window | None): Owner window.
+            peaks_filename (str): `.peaks` file to show.
+
+        Raises:
+            ValueError: If the file is not a peak index.
+        """
+        index = PeakIndex(peaks_filename)
+        name = os.path.splitext(os.path.basename(peaks_filename))[0]
+        super().__init__(parent, title=f"Forma de onda - {name}", size=wx.Size(900, 320))
+
+        self.panel = WaveformPanel(self, index)
+        self.m_staticTextRange = wx.StaticText(self, wx.ID_ANY, "")
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.panel, 1, wx.EXPAND)
+        sizer.Add(self.m_staticTextRange, 0, wx.ALL | wx.EXPAND, 5)
+        self.SetSizer(sizer)
+
+        self.panel.on_view_change = self.update_range
+        self.update_range(self.panel.view_start, self.panel.view_end)
+        self.Centre(wx.BOTH)
+
+    def update_range(self, start, end):
+        rate = float(self.panel.index.rate)
+        self.m_staticTextRange.SetLabel(
+            f"  {format_time(start / rate)} - {format_time(end / rate)}   "
+            f"(total {format_time(self.panel.index.duration)}, "
+            f"{self.panel.index.channels} can. a {self.panel.index.rate} Hz)"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Uso: python waveform_view.py GRABACION.peaks", file=sys.stderr)
+        sys.exit(2)
+    app = wx.App(False)
+    WaveformFrame(None, sys.argv[1]).Show()
+    app.MainLoop()
@@ -0,0 +1,402 @@
+"""
+WAV File I/O
+============
+
+Description:
+    Crash-safe WAV writing and header repair.
+
+    The stdlib `wave` module only writes the RIFF sizes on close(): if the
+    process dies during a take the header says the file is empty. Classic
+    WAV is also limited to 4 GB by its 32-bit sizes.
+
+    CrashSafeWavWriter reserves a 28-byte JUNK chunk right after the RIFF
+    header (EBU Tech 3306 layout) and rewrites only the size fields every
+    `commit_interval` seconds, never the audio data. When the take grows
+    past 4 GB the JUNK chunk is turned into a ds64 chunk and the file into
+    RF64, in place.
+
+    Markers (e.g. the pause points of a take) are written on close() as a
+    standard `cue ` chunk with a LIST/adtl chunk of labels after the audio,
+    which editors such as Audacity, Reaper or Sound Forge show as markers.
+
+    repair_wav() fixes a truncated file from the data length actually on
+    disk, touching only the header.
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import time
+import struct
+import logging
+
+MAX_32 = 0xFFFFFFFF
+WAVE_FORMAT_PCM = 1
+DS64_SIZE = 28  # riffSize(8) + dataSize(8) + sampleCount(8) + tableLength(4)
+
+# Header layout written by CrashSafeWavWriter
+RIFF_SIZE_OFFSET = 4
+DS64_OFFSET = 12          # "JUNK"/"ds64" chunk id
+FMT_OFFSET = DS64_OFFSET + 8 + DS64_SIZE
+DATA_OFFSET = FMT_OFFSET + 8 + 16
+DATA_SIZE_OFFSET = DATA_OFFSET + 4
+HEADER_SIZE = DATA_OFFSET + 8
+
+CUE_POINT = struct.Struct('<II4sIII')  # id, position, chunk 'data', chunk start, block start, sample offset
+
+
+class WavInfo:
+    """
+    Format and layout of a WAV/RF64 file, as read from its header.
+
+    Attributes:
+        channels, sample_width, rate (int): Audio format.
+        data_offset (int): File offset of the first sample.
+        data_size (int): Bytes of audio declared by the header.
+        rf64 (bool): File uses 64-bit sizes.
+        ds64_offset (int | None): Offset of a ds64 or JUNK chunk that can
+            hold 64-bit sizes, if present.
+    """
+    def __init__(self):
+        self.channels = 0
+        self.sample_width = 0
+        self.rate = 0
+        self.data_offset = 0
+        self.data_size = 0
+        self.rf64 = False
+        self.ds64_offset = None
+
+    @property
+    def frame_size(self):
+        return self.channels * self.sample_width
+
+    @property
+    def frames(self):
+        return self.data_size // self.frame_size if self.frame_size else 0
+
+    @property
+    def duration(self):
+        return self.frames / float(self.rate) if self.rate else 0.0
+
+
+def read_wav_info(filename):
+    """
+    Parse the chunks of a WAV or RF64 file up to the data chunk.
+
+    Args:
+        filename (str): File to inspect.
+
+    Returns:
+        WavInfo: Header information.
+
+    Raises:
+        ValueError: If the file is not a PCM WAV/RF64 file.
+    """
+    info = WavInfo()
+    with open(filename, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[8:12] != b'WAVE' or riff[:4] not in (b'RIFF', b'RF64'):
+            raise ValueError(f"{filename} is not a WAV file")
+        info.rf64 = riff[:4] == b'RF64'
+
+        ds64_data_size = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{filename} has no data chunk")
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            chunk_start = f.tell()
+
+            if chunk_id in (b'ds64', b'JUNK') and chunk_size >= DS64_SIZE and info.ds64_offset is None:
+                info.ds64_offset = chunk_start - 8
+                if chunk_id == b'ds64':
+                    _, ds64_data_size, _ = struct.unpack('<QQQ', f.read(24))
+            elif chunk_id == b'fmt ':
+                fmt = f.read(16)
+                audio_format, info.channels, info.rate, _, _, bits = struct.unpack('<HHIIHH', fmt)
+                if audio_format not in (WAVE_FORMAT_PCM, 0xFFFE):
+                    raise ValueError(f"{filename} is not PCM")
+                info.sample_width = (bits + 7) // 8
+            elif chunk_id == b'data':
+                info.data_offset = chunk_start
+                if info.rf64 and chunk_size == MAX_32 and ds64_data_size is not None:
+                    info.data_size = ds64_data_size
+                else:
+                    info.data_size = chunk_size
+                return info
+
+            # Chunks are word aligned
+            f.seek(chunk_start + chunk_size + (chunk_size & 1))
+
+
+def _cue_chunks(cues):
+    """
+    Build the `cue ` chunk and its LIST/adtl label chunk.
+
+    Args:
+        cues (list): (frame, label) pairs, in any order.
+
+    Returns:
+        bytes: Both chunks, word aligned.
+    """
+    points = []
+    labels = []
+    for cue_id, (frame, label) in enumerate(sorted(cues, key=lambda cue: cue[0]), 1):
+        points.append(CUE_POINT.pack(cue_id, frame, b'data', 0, 0, frame))
+        text = label.encode('utf-8') + b'\x00'
+        labl = struct.pack('<I', cue_id) + text
+        labels.append(b'labl' + struct.pack('<I', len(labl)) + labl + b'\x00' * (len(labl) & 1))
+
+    cue = struct.pack('<I', len(points)) + b''.join(points)
+    adtl = b'adtl' + b''.join(labels)
+    return b'cue ' + struct.pack('<I', len(cue)) + cue + b'LIST' + struct.pack('<I', len(adtl)) + adtl
+
+
+def read_cues(filename):
+    """
+    Read the markers of a WAV/RF64 file.
+
+    Args:
+        filename (str): File to inspect.
+
+    Returns:
+        list: (frame, label) pairs in file order; label is "" when the
+            file has no label for a cue.
+
+    Raises:
+        ValueError: If the file is not a PCM WAV/RF64 file.
+    """
+    info = read_wav_info(filename)
+    positions = {}
+    labels = {}
+    end = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        offset = info.data_offset + info.data_size + (info.data_size & 1)
+        while offset + 8 <= end:
+            f.seek(offset)
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            body = f.read(chunk_size)
+            if chunk_id == b'cue ' and len(body) >= 4:
+                count = struct.unpack_from('<I', body)[0]
+                for i in range(min(count, (len(body) - 4) // CUE_POINT.size)):
+                    cue_id, _, _, _, _, frame = CUE_POINT.unpack_from(body, 4 + i * CUE_POINT.size)
+                    positions[cue_id] = frame
+            elif chunk_id == b'LIST' and body[:4] == b'adtl':
+                pos = 4
+                while pos + 12 <= len(body):
+                    sub_id, sub_size = struct.unpack_from('<4sI', body, pos)
+                    if sub_id == b'labl':
+                        cue_id = struct.unpack_from('<I', body, pos + 8)[0]
+                        labels[cue_id] = body[pos + 12:pos + 8 + sub_size].split(b'\x00')[0].decode('utf-8', 'replace')
+                    pos += 8 + sub_size + (sub_size & 1)
+            offset += 8 + chunk_size + (chunk_size & 1)
+    return [(frame, labels.get(cue_id, "")) for cue_id, frame in positions.items()]
+
+
+def _write_sizes(f, info, data_size, trailer_size=0):
+    """
+    Write the RIFF/ds64/data size fields for `data_size` bytes of audio,
+    switching to RF64 when the 32-bit fields overflow.
+
+    Args:
+        f: File opened 'r+b'.
+        info (WavInfo): Layout of the file.
+        data_size (int): Bytes of audio in the data chunk.
+        trailer_size (int): Bytes of the chunks after the (padded) data chunk.
+
+    Returns:
+        bool: True if the file is RF64 after the update.
+    """
+    riff_size = info.data_offset + data_size + (data_size & 1) + trailer_size - 8
+    size_offset = info.data_offset - 4
+
+    if riff_size <= MAX_32 and not info.rf64:
+        f.seek(RIFF_SIZE_OFFSET)
+        f.write(struct.pack('<I', riff_size))
+        f.seek(size_offset)
+        f.write(struct.pack('<I', data_size))
+        return False
+
+    if info.ds64_offset is None:
+        raise ValueError("File exceeds 4 GB and has no room for a ds64 chunk")
+
+    frames = data_size // info.frame_size if info.frame_size else 0
+    f.seek(0)
+    f.write(b'RF64' + struct.pack('<I', MAX_32))
+    f.seek(info.ds64_offset)
+    f.write(b'ds64' + struct.pack('<IQQQI', DS64_SIZE, riff_size, data_size, frames, 0))
+    f.seek(size_offset)
+    f.write(struct.pack('<I', MAX_32))
+    info.rf64 = True
+    return True
+
+
+class CrashSafeWavWriter:
+    """
+    WAV writer whose header is valid at most `commit_interval` seconds
+    behind the data, and that switches to RF64 past 4 GB.
+
+    Implements the `writeframes(bytes)` / `close()` sink interface used by
+    FileWriterThread, like `wave.Wave_write`.
+    """
+    def __init__(self, filename, channels, sample_width, rate, commit_interval=5.0, fsync=True):
+        """
+        Create the file and write a header declaring zero samples.
+
+        Args:
+            filename (str): Output file (overwritten).
+            channels (int): Interleaved channels.
+            sample_width (int): Bytes per sample.
+            rate (int): Sample rate.
+            commit_interval (float): Seconds between header commits.
+            fsync (bool): Force data and header to disk at each commit.
+        """
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.filename = filename
+        self.commit_interval = commit_interval
+        self.fsync = fsync
+        self.data_size = 0
+        self.commits = 0
+        self.cues = []          # (frame, label) written as markers on close()
+        self._trailer_size = 0  # Bytes of the marker chunks after the data chunk
+
+        self.info = WavInfo()
+        self.info.channels = channels
+        self.info.sample_width = sample_width
+        self.info.rate = rate
+        self.info.data_offset = HEADER_SIZE
+        self.info.ds64_offset = DS64_OFFSET
+
+        block_align = channels * sample_width
+        self._file = open(filename, 'w+b')
+        self._file.write(b'RIFF' + struct.pack('<I', HEADER_SIZE - 8) + b'WAVE')
+        self._file.write(b'JUNK' + struct.pack('<I', DS64_SIZE) + bytes(DS64_SIZE))
+        self._file.write(b'fmt ' + struct.pack('<IHHIIHH', 16, WAVE_FORMAT_PCM, channels, rate,
+                                               rate * block_align, block_align, sample_width * 8))
+        self._file.write(b'data' + struct.pack('<I', 0))
+        self._last_commit = time.monotonic()
+
+    def writeframes(self, data):
+        """
+        Append audio and commit the header when the interval has elapsed.
+
+        Args:
+            data (bytes): Interleaved PCM samples.
+        """
+        self._file.write(data)
+        self.data_size += len(data)
+        if time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self):
+        """
+        Make the header describe all data written so far. Only the size
+        fields are rewritten; the file position is restored afterwards.
+        """
+        f = self._file
+        f.flush()
+        end = f.tell()
+        was_rf64 = self.info.rf64
+        if _write_sizes(f, self.info, self.data_size, self._trailer_size) and not was_rf64:
+            self.logger.info(f"{self.filename} exceeds 4 GB: switched to RF64")
+        f.seek(end)
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self._last_commit = time.monotonic()
+        self.commits += 1
+
+    def add_cue(self, frame, label):
+        """
+        Add a marker, written on close().
+
+        Args:
+            frame (int): Frame of the marker (clamped to the audio written).
+            label (str): Marker name.
+        """
+        self.cues.append((int(frame), label))
+
+    def close(self):
+        """
+        Pad the data chunk to an even size, append the markers, commit the
+        header and close.
+        """
+        if self._file is None:
+            return
+        if self.data_size & 1:
+            self._file.write(b'\x00')
+        if self.cues:
+            frames = self.data_size // self.info.frame_size
+            trailer = _cue_chunks([(min(max(frame, 0), frames), label) for frame, label in self.cues])
+            self._file.write(trailer)
+            self._trailer_size = len(trailer)
+        self.commit()
+        self._file.close()
+        self._file = None
+
+
+def _chunks_after_data(filename, info, file_size):
+    """
+    Returns:
+        bool: True if the bytes after the declared data chunk are whole
+            chunks (markers of a properly closed file), not more audio.
+    """
+    offset = info.data_offset + info.data_size + (info.data_size & 1)
+    with open(filename, 'rb') as f:
+        while offset + 8 <= file_size:
+            f.seek(offset)
+            chunk_id, chunk_size = struct.unpack('<4sI', f.read(8))
+            if not all(32 <= c < 127 for c in chunk_id):
+                return False
+            offset += 8 + chunk_size + (chunk_size & 1)
+    return offset == file_size
+
+
+def repair_wav(filename, dry_run=False):
+    """
+    Fix the header of a WAV/RF64 file whose sizes do not match its length
+    (e.g. after a crash). Only the size fields are rewritten; the audio data
+    is trimmed to whole frames.
+
+    Args:
+        filename (str): File to repair.
+        dry_run (bool): Only report what would change.
+
+    Returns:
+        dict: declared and actual data size, frames, duration, rf64 flag and
+            whether the header was changed.
+
+    Raises:
+        ValueError: If the file is not a PCM WAV file, or is bigger than
+            4 GB without room for a ds64 chunk.
+    """
+    logger = logging.getLogger("repair_wav")
+    info = read_wav_info(filename)
+    file_size = os.path.getsize(filename)
+
+    actual = max(0, file_size - info.data_offset)
+    if info.frame_size:
+        actual -= actual % info.frame_size
+    if 0 < info.data_size < actual and _chunks_after_data(filename, info, file_size):
+        actual = info.data_size  # Closed properly, with markers after the audio
+
+    report = {
+        "file": filename,
+        "declared_bytes": info.data_size,
+        "actual_bytes": actual,
+        "frames": actual // info.frame_size if info.frame_size else 0,
+        "duration_s": round(actual / float(info.frame_size * info.rate), 3) if info.rate and info.frame_size else 0.0,
+        "rf64": info.rf64,
+        "repaired": False,
+    }
+    if actual == info.data_size:
+        return report
+
+    if not dry_run:
+        with open(filename, 'r+b') as f:
+            report["rf64"] = _write_sizes(f, info, actual)
+        report["repaired"] = True
+        logger.info(f"Repaired {filename}: {info.data_size} -> {actual} data bytes")
+    return report
@@ -0,0 +1,166 @@
+"""
+Memory-Mapped WAV Reader
+========================
+
+Description:
+    Read access to WAV/RF64 recordings without loading them: the data chunk
+    is memory-mapped and exposed as a (frames, channels) numpy view, so a
+    slice of a multi-hour take costs only the pages it touches and memory
+    stays flat whatever the file length.
+
+    Post-processing stages (peak index, loudness analysis, simulated input)
+    read through WavReader instead of decoding whole files.
+
+        with WavReader("entrevista.wav") as wav:
+            for start, block in wav.blocks(65536):
+                ...                         # block is a zero-copy view
+            wav.seek(wav.rate * 60)
+            minute = wav.read(wav.rate)     # one minute from 1:00
+
+    Views point into the mapping: copy what must outlive close().
+
+License:
+MIT License - Copyright (c) 2024 Aaron Elberg, aka voltarex (see grabadora.py)
+
+"""
+
+import os
+import mmap
+
+import numpy as np
+
+from wavio import read_wav_info
+
+# Sample dtype by sample width in bytes (24-bit samples have no numpy view)
+SAMPLE_DTYPES = {1: np.uint8, 2: np.dtype('<i2'), 4: np.dtype('<i4')}
+
+
+class WavReader:
+    """
+    Memory-mapped, read-only WAV/RF64 file with a read position.
+
+    Attributes:
+        filename (str): The file.
+        info (WavInfo): Header information.
+        channels, rate, sample_width (int): Audio format.
+        frames (int): Frames available (a truncated file is read up to its
+            last whole frame).
+        samples (np.ndarray): Read-only (frames, channels) view of the whole
+            data chunk.
+    """
+    def __init__(self, filename):
+        """
+        Map the data chunk.
+
+        Args:
+            filename (str): WAV or RF64 file.
+
+        Raises:
+            ValueError: If the file is not PCM WAV or its sample width has
+                no numpy type (24-bit).
+        """
+        self.filename = filename
+        self.info = read_wav_info(filename)
+        self.channels = self.info.channels
+        self.rate = self.info.rate
+        self.sample_width = self.info.sample_width
+        if self.sample_width not in SAMPLE_DTYPES:
+            raise ValueError(f"{filename}: {8 * self.sample_width}-bit samples are not supported")
+
+        # Trust the file length over the header (crashed takes declare too little or too much)
+        on_disk = max(0, os.path.getsize(filename) - self.info.data_offset)
+        declared = self.info.data_size if self.info.data_size else on_disk
+        self.frames = min(declared, on_disk) // self.info.frame_size
+        self.position = 0
+
+        self._file = open(filename, 'rb')
+        self._mmap = None
+        if self.frames:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.samples = np.frombuffer(self._mmap, dtype=SAMPLE_DTYPES[self.sample_width],
+                                         count=self.frames * self.channels,
+                                         offset=self.info.data_offset).reshape(self.frames, self.channels)
+        else:
+            self.samples = np.empty((0, self.channels), dtype=SAMPLE_DTYPES[self.sample_width])
+
+    @property
+    def duration(self):
+        return self.frames / float(self.rate) if self.rate else 0.0
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, index):
+        return self.samples[index]
+
+    def seek(self, frame, whence=os.SEEK_SET):
+        """
+        Move the read position, clamped to the file.
+
+        Args:
+            frame (int): Offset in frames.
+            whence (int): os.SEEK_SET, os.SEEK_CUR or os.SEEK_END.
+
+        Returns:
+            int: The new position.
+        """
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self.position, os.SEEK_END: self.frames}[whence]
+        self.position = min(max(base + int(frame), 0), self.frames)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def read(self, frames=None):
+        """
+        Frames from the read position, which advances past them.
+
+        Args:
+            frames (int, optional): Frames wanted; all the rest if omitted.
+
+        Returns:
+            np.ndarray: (n, channels) view; shorter (or empty) at the end.
+        """
+        end = self.frames if frames is None else min(self.frames, self.position + max(0, int(frames)))
+        block = self.samples[self.position:end]
+        self.position = end
+        return block
+
+    def blocks(self, block_frames=65536, start=0, end=None):
+        """
+        Iterate over consecutive views, without moving the read position.
+
+        Args:
+            block_frames (int): Frames per block (the last one may be shorter).
+            start (int): First frame.
+            end (int, optional): Frame after the last one; defaults to the end.
+
+        Yields:
+            tuple: (first frame, (n, channels) view).
+        """
+        end = self.frames if end is None else min(int(end), self.frames)
+        for first in range(max(0, int(start)), end, block_frames):
+            yield first, self.samples[first:min(first + block_frames, end)]
+
+    def close(self):
+        """
+        Release the mapping and the file (needed before the file can be
+        deleted on Windows). Views still referenced elsewhere keep the
+        mapping alive until they are garbage collected.
+        """
+        self.samples = self.samples[:0].copy()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass    # A view escaped; the mapping goes away with it
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()